@@ -1,16 +1,29 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 import os
 from supabase_client import get_supabase_client
 from scanner import sync_markets_to_supabase
+from scanner_worker import read_status, request_scan
 from services.polymarket_service import PolymarketService
 from services.analysis_orchestrator import AnalysisOrchestrator
+from services.context_service import ContextService
+from services.inference_queue import INTERACTIVE, QueueFull
+from services.model_client import ModelUnavailable, readiness, serving_status, start_preload
+from services.model_service import FAST_SIGNAL, FULL_ANALYSIS
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="PolyEdge API", description="AI-Powered Trading Signal Engine for Polymarket")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and warm the model in the background; /ready reports when it is done
+    start_preload()
+    yield
+
+app = FastAPI(title="PolyEdge API", description="AI-Powered Trading Signal Engine for Polymarket", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -27,7 +40,20 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "gpu_access": "true" if os.environ.get("CUDA_VISIBLE_DEVICES") else "local"}
+    return {
+        "status": "healthy",
+        "gpu_access": "true" if os.environ.get("CUDA_VISIBLE_DEVICES") else "local",
+        "context_latency": ContextService.latency_stats(),
+        "model": serving_status(),
+    }
+
+@app.get("/ready")
+async def ready_check():
+    """Readiness probe: 200 only once the model is loaded and warmed up (load/warmup timings included)."""
+    status = readiness()
+    if status.get("state") != "ready":
+        raise HTTPException(status_code=503, detail=status)
+    return status
 
 @app.get("/markets")
 async def get_markets(limit: int = 50):
@@ -72,12 +98,24 @@ async def analyze_url(payload: Dict[str, Any], x_user_id: Optional[str] = Header
 
     # 2. Run God-Tier Orchestrator
     # Note: In production, we'd check if user is logged in via Clerk (x_user_id)
-    prediction = AnalysisOrchestrator.analyze_market_live(
-        market_id=market.get("conditionId"),
-        question=market.get("question"),
-        current_price=float(market.get("outcomePrices", [0.5, 0.5])[0]),
-        volume=float(market.get("volume", 0))
-    )
+    # Runs off the event loop; inference goes ahead of any queued scan work.
+    # Teasers drop the reasoning, so they only decode the fast signal fields.
+    try:
+        prediction = await run_in_threadpool(
+            AnalysisOrchestrator.analyze_market_live,
+            market_id=market.get("conditionId"),
+            question=market.get("question"),
+            current_price=float(market.get("outcomePrices", [0.5, 0.5])[0]),
+            volume=float(market.get("volume", 0)),
+            category=market.get("category"),
+            token_ids=PolymarketService.parse_token_ids(market.get("clobTokenIds")),
+            lane=INTERACTIVE,
+            mode=FULL_ANALYSIS if x_user_id else FAST_SIGNAL,
+        )
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Analysis queue is full, try again shortly")
+    except ModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Model unavailable: {e}")
 
     if not prediction:
         raise HTTPException(status_code=500, detail="Analysis failed")
@@ -87,7 +125,7 @@ async def analyze_url(payload: Dict[str, Any], x_user_id: Optional[str] = Header
         # Hide the good stuff to force login
         return {
             "question": market.get("question"),
-            "edge_detected": True if prediction.get("edge_percentage", 0) > 5 else False,
+            "edge_detected": True if (prediction.get("edge_percentage") or 0) > 5 else False,
             "action": "LOCKED",
             "reasoning": "Sign in with Clerk to unlock the God-Tier reasoning and fair value analysis.",
             "is_teaser": True
@@ -105,13 +143,19 @@ async def sync_markets():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/scan-all")
-async def trigger_scan(background_tasks: BackgroundTasks):
-    """Trigger a continuous scan of all tracked markets (Background Task)."""
-    from .scanner import run_automated_scan
-    
-    background_tasks.add_task(run_automated_scan, limit=20)
+async def trigger_scan(limit: int = 20):
+    """Ask the scanner worker (scanner_worker.py, its own process) for an immediate scan."""
+    status = read_status()
+    if status.get("state") == "offline":
+        raise HTTPException(status_code=503, detail="Scanner worker is not running (start backend/scanner_worker.py)")
+    request_scan(limit=limit)
     return {
-        "status": "scanning", 
-        "message": "Market analysis loop (Sentinel Agent) started in background.",
-        "limit": 20
+        "status": "queued",
+        "message": "Scan requested from the Sentinel Agent worker.",
+        "limit": limit
     }
+
+@app.get("/scan-status")
+async def scan_status():
+    """Scanner worker state and progress of the current/last scan."""
+    return read_status()
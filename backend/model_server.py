@@ -0,0 +1,149 @@
+"""
+Dedicated model server process.
+
+Loads the model once and serves predictions to API and scanner workers
+over a local Unix socket (see services/model_client.py for the protocol):
+
+    python backend/model_server.py [--backend unsloth|llama_cpp|fake] [--socket PATH]
+
+- The socket is listening before the model loads. Until loading and
+  warmup finish, health reports "loading" and predict answers
+  "not_ready". API workers can therefore start (and fail fast)
+  independently of the model. Load and warmup timings are part of health.
+- Every predict goes through an InferenceScheduler, so interactive
+  requests from any API worker go ahead of scan work from the scanner.
+  A predict's mode picks the full analysis or the fast signal.
+- Backends come from services/inference_backends.py: unsloth (CUDA),
+  llama_cpp (GGUF on CPU) or fake. The fake backend returns a simulated
+  prediction after an optional delay (FAKE_MODEL_LATENCY). It exercises
+  the whole path without a GPU.
+"""
+
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Connection, Listener
+from pathlib import Path
+from typing import Dict, Optional
+
+from services.inference_backends import BACKENDS, MODEL_BACKEND, InferenceBackend
+from services.inference_queue import BACKGROUND, InferenceScheduler, QueueFull
+from services.model_client import AUTHKEY, PROTOCOL_VERSION, SOCKET_PATH
+from services.model_service import FULL_ANALYSIS
+
+
+class ModelServer:
+    def __init__(
+        self,
+        backend: InferenceBackend,
+        socket_path: Path = SOCKET_PATH,
+        authkey: bytes = AUTHKEY,
+        scheduler: Optional[InferenceScheduler] = None,
+    ):
+        self.backend = backend
+        self.socket_path = Path(socket_path)
+        self.authkey = authkey
+        self.scheduler = scheduler or InferenceScheduler()
+        self.started_at = time.time()
+        self._listener: Optional[Listener] = None
+        self._stopped = threading.Event()
+
+    def health(self) -> Dict:
+        readiness = self.backend.readiness()
+        # "cold" only until the load thread has started
+        state = "loading" if readiness["state"] == "cold" else readiness["state"]
+        return {
+            "protocol": PROTOCOL_VERSION,
+            **readiness,
+            "state": state,
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+        }
+
+    def _respond(self, request: Dict) -> Dict:
+        op = request.get("op")
+        if op == "health":
+            return self.health()
+        if op == "stats":
+            return {**self.health(), "inference_queue": self.scheduler.stats()}
+        if op != "predict":
+            return {"error": "bad_request", "detail": f"unknown op {op!r}"}
+        state = self.health()["state"]
+        if state != "ready":
+            return {"error": "not_ready", "detail": f"model is {state}"}
+        try:
+            result = self.scheduler.run(
+                request.get("lane") or BACKGROUND,
+                self.backend.predict_mode,
+                request["input"],
+                request.get("mode") or FULL_ANALYSIS,
+            )
+        except QueueFull as e:
+            return {"error": "queue_full", "detail": str(e)}
+        except Exception as e:
+            print(f"Prediction error: {e}")
+            return {"error": "prediction_failed", "detail": str(e)}
+        return {"result": result}
+
+    def _serve_connection(self, conn: Connection):
+        with conn:
+            try:
+                while True:
+                    request = json.loads(conn.recv_bytes())
+                    conn.send_bytes(json.dumps(self._respond(request)).encode())
+            except (EOFError, OSError):
+                pass
+
+    def start(self) -> "ModelServer":
+        """Starts listening at once and loads the model in the background."""
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        self._listener = Listener(str(self.socket_path), family="AF_UNIX", authkey=self.authkey)
+        threading.Thread(target=self.backend.preload, name="model-load", daemon=True).start()
+        threading.Thread(target=self._accept, name="model-accept", daemon=True).start()
+        return self
+
+    def _accept(self):
+        while not self._stopped.is_set():
+            try:
+                conn = self._listener.accept()
+            except (OSError, AuthenticationError):
+                # Listener closed by stop(), or a client failed authentication
+                if self._stopped.is_set():
+                    return
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def stop(self, *_):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.close()
+        self.scheduler.shutdown()
+
+    def wait(self):
+        self._stopped.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PolyEdge model server")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=MODEL_BACKEND)
+    parser.add_argument("--socket", type=Path, default=SOCKET_PATH)
+    args = parser.parse_args()
+
+    server = ModelServer(BACKENDS[args.backend](), socket_path=args.socket)
+    signal.signal(signal.SIGTERM, server.stop)
+    signal.signal(signal.SIGINT, server.stop)
+    server.start()
+    print(f"Model server ({args.backend}) listening on {args.socket}")
+    server.wait()
+
+
+if __name__ == "__main__":
+    main()
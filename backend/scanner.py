@@ -1,7 +1,7 @@
 import os
-import pandas as pd
 from datetime import datetime
 from pathlib import Path
+from typing import Callable, Dict, Optional
 from supabase_client import get_supabase_client
 from services.polymarket_service import PolymarketService
 from services.analysis_orchestrator import AnalysisOrchestrator
@@ -29,16 +29,29 @@ def fetch_live_markets(limit: int = 100):
         
     return formatted_markets
 
-def run_automated_scan(limit: int = 20):
+def run_automated_scan(
+    limit: int = 20,
+    progress: Optional[Callable[[int, int, Optional[Dict]], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+):
     """
     The Master Scanning Loop.
     Fetches top markets and runs the God-Tier Analysis Orchestrator on each.
+    progress(done, total, market) is called before each market; should_stop()
+    is checked between markets so a shutdown never interrupts one mid-way.
     """
     print(f"--- STARTING AUTOMATED MARKET SCAN ({datetime.now()}) ---")
     markets = fetch_live_markets(limit=limit)
     
     results = []
+    done = 0
     for market in markets:
+        if should_stop and should_stop():
+            print(f"--- SCAN STOPPED after {done}/{len(markets)} markets. ---")
+            break
+        if progress:
+            progress(done, len(markets), market)
+        
         # Get real YES price
         current_price = PolymarketService.get_market_yes_price(market['id'])
         
@@ -47,11 +60,16 @@ def run_automated_scan(limit: int = 20):
             market_id=market['id'],
             question=market['question'],
             current_price=current_price,
-            volume=market['volume']
+            volume=market['volume'],
+            category=market.get('category'),
+            token_ids=PolymarketService.parse_token_ids(market.get('clob_token_ids'))
         )
         if prediction:
             results.append(prediction)
+        done += 1
             
+    if progress:
+        progress(done, len(markets), None)
     print(f"--- SCAN COMPLETE. Processed {len(results)} markets. ---")
     return results
 
@@ -68,17 +86,23 @@ def sync_markets_to_supabase(csv_path: str = None, use_live: bool = True):
         
     if not markets_data and csv_path and os.path.exists(csv_path):
         print(f"Fallback: Seeding database from {csv_path}...")
-        df = pd.read_csv(csv_path)
-        df['volume_num'] = pd.to_numeric(df['volume'], errors='coerce').fillna(0)
-        top_markets = df[df['volume_num'] > 10000].sort_values('volume_num', ascending=False).head(50)
+        # Lazy: only the CSV fallback needs pandas (and only these columns). The backend
+        # stays off pyarrow and scripts/, so this doesn't use datastore.load_markets
+        import pandas as pd
+        
+        wanted = {"id", "question", "event_slug", "category", "volume"}
+        df = pd.read_csv(csv_path, usecols=lambda column: column in wanted)
+        df['volume'] = pd.to_numeric(df['volume'], errors='coerce').fillna(0)
+        df = df.fillna("")
+        top_markets = df[df['volume'] > 10000].sort_values('volume', ascending=False).head(50)
         
-        for _, row in top_markets.iterrows():
+        for row in top_markets.to_dict("records"):
             markets_data.append({
                 "id": str(row['id']),
                 "question": row['question'],
-                "url": f"https://polymarket.com/event/{row.get('event_slug', '')}",
-                "category": row.get('category', 'General'),
-                "volume": float(row['volume_num']),
+                "url": f"https://polymarket.com/event/{row.get('event_slug') or ''}",
+                "category": row.get('category') or 'General',
+                "volume": float(row['volume']),
                 "last_scanned_at": datetime.now().isoformat()
             })
             
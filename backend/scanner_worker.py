@@ -0,0 +1,251 @@
+"""
+Standalone market scanner worker.
+
+Runs run_automated_scan on a schedule in its own process, so scans (and
+the model they load) never share an event loop with API traffic:
+
+    python backend/scanner_worker.py [--interval 900] [--limit 20] [--once]
+
+- Single instance: a lease in SCANNER_LOCK_PATH (owner, pid, expiry),
+  taken under flock and renewed by a heartbeat thread. A second worker
+  waits until the lease is released or expires.
+- Graceful shutdown: SIGTERM/SIGINT stop the loop after the market being
+  analyzed finishes, then the lease is released.
+- Status: progress goes to SCANNER_STATUS_PATH (written atomically), which
+  the API serves at /scan-status.
+- /scan-all drops a request file that makes the worker start a scan
+  without waiting for the next interval.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+DATA_DIR = Path(__file__).parent / "data"
+LOCK_PATH = Path(os.getenv("SCANNER_LOCK_PATH", DATA_DIR / "scanner.lock"))
+STATUS_PATH = Path(os.getenv("SCANNER_STATUS_PATH", DATA_DIR / "scanner_status.json"))
+REQUEST_PATH = Path(os.getenv("SCANNER_REQUEST_PATH", DATA_DIR / "scan_request.json"))
+
+SCAN_INTERVAL = float(os.getenv("SCAN_INTERVAL_SECONDS", "900"))
+SCAN_LIMIT = int(os.getenv("SCAN_LIMIT", "20"))
+LEASE_TTL = 60.0
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+
+def _write_json(path: Path, data: Dict):
+    """Atomic replace, so readers never see a half-written file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data, indent=2))
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path) -> Optional[Dict]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+class ScanLease:
+    """Single-instance lease stored in a lock file; the holder renews it before it expires."""
+
+    def __init__(self, path: Path = LOCK_PATH, ttl: float = LEASE_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+
+    def _update(self, take: bool) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    current = json.loads(f.read() or "{}")
+                except ValueError:
+                    current = {}
+                mine = current.get("owner") == self.owner
+                if not mine and current.get("expires_at", 0) > _now():
+                    return False
+                if not take and not mine:
+                    return False
+                f.seek(0)
+                f.truncate()
+                if take:
+                    json.dump({"owner": self.owner, "pid": os.getpid(), "expires_at": _now() + self.ttl}, f)
+                f.flush()
+                return True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self) -> bool:
+        """Takes the lease if it is free, expired or already ours."""
+        self.held = self._update(take=True)
+        return self.held
+
+    def renew(self) -> bool:
+        """Extends our lease; False if another worker took it over meanwhile."""
+        self.held = self._update(take=True) if self.held else False
+        return self.held
+
+    def release(self):
+        if self.held:
+            self._update(take=False)
+            self.held = False
+
+
+def read_status(path: Path = STATUS_PATH) -> Dict:
+    """Worker status for the API; 'offline' if no worker has heartbeated recently."""
+    status = _read_json(path) or {"state": "offline"}
+    if status.get("state") != "offline" and status.get("heartbeat_ts", 0) < _now() - 2 * LEASE_TTL:
+        status["state"] = "offline"
+    return status
+
+
+def request_scan(limit: Optional[int] = None, path: Path = REQUEST_PATH) -> Dict:
+    """Asks the running worker for an immediate scan."""
+    request = {"requested_at": _iso(_now()), "limit": limit}
+    _write_json(path, request)
+    return request
+
+
+class ScannerWorker:
+    def __init__(
+        self,
+        scan_fn: Optional[Callable] = None,
+        interval: float = SCAN_INTERVAL,
+        limit: int = SCAN_LIMIT,
+        lease: Optional[ScanLease] = None,
+        status_path: Path = STATUS_PATH,
+        request_path: Path = REQUEST_PATH,
+    ):
+        if scan_fn is None:
+            from scanner import run_automated_scan
+            scan_fn = run_automated_scan
+        self.scan_fn = scan_fn
+        self.interval = interval
+        self.limit = limit
+        self.lease = lease or ScanLease()
+        self.status_path = Path(status_path)
+        self.request_path = Path(request_path)
+        self.stop_event = threading.Event()
+        self.scans = 0
+        self._status: Dict = {"state": "starting", "pid": os.getpid(), "owner": self.lease.owner}
+        self._status_lock = threading.Lock()
+
+    def _set_status(self, **fields):
+        with self._status_lock:
+            self._status.update(fields, heartbeat_ts=_now(), heartbeat_at=_iso(_now()))
+            _write_json(self.status_path, self._status)
+
+    def _heartbeat(self):
+        while not self.stop_event.wait(self.lease.ttl / 3):
+            if not self.lease.renew():
+                print("Scanner lease lost; stopping after the current market.")
+                self.stop_event.set()
+            self._set_status()
+
+    def stop(self, *_):
+        self.stop_event.set()
+
+    def _progress(self, done: int, total: int, market: Optional[Dict] = None):
+        self._set_status(
+            markets_done=done,
+            markets_total=total,
+            current_market=market.get("question") if market else None,
+        )
+
+    def _take_request(self) -> Optional[Dict]:
+        request = _read_json(self.request_path)
+        if request is not None:
+            try:
+                self.request_path.unlink()
+            except OSError:
+                pass
+        return request
+
+    def run_scan(self, limit: int):
+        started = _now()
+        scan_id = uuid.uuid4().hex[:12]
+        self._set_status(state="scanning", scan_id=scan_id, started_at=_iso(started), markets_done=0, markets_total=None)
+        error = None
+        try:
+            results = self.scan_fn(limit=limit, progress=self._progress, should_stop=self.stop_event.is_set)
+        except Exception as e:
+            print(f"Scan {scan_id} failed: {e}")
+            results, error = [], str(e)
+        self.scans += 1
+        self._set_status(
+            state="idle",
+            current_market=None,
+            last_scan={
+                "scan_id": scan_id,
+                "started_at": _iso(started),
+                "finished_at": _iso(_now()),
+                "duration_seconds": round(_now() - started, 1),
+                "processed": len(results or []),
+                "interrupted": self.stop_event.is_set(),
+                "error": error,
+            },
+        )
+
+    def run(self, max_scans: Optional[int] = None):
+        """Holds the lease and scans every `interval` seconds (or on request) until stopped."""
+        self._set_status(state="waiting_for_lease")
+        while not self.lease.acquire():
+            if self.stop_event.wait(self.lease.ttl / 3):
+                return
+        heartbeat = threading.Thread(target=self._heartbeat, name="scanner-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            next_scan = _now()
+            while not self.stop_event.is_set():
+                request = self._take_request()
+                if request is not None or _now() >= next_scan:
+                    self.run_scan((request or {}).get("limit") or self.limit)
+                    next_scan = _now() + self.interval
+                    if max_scans is not None and self.scans >= max_scans:
+                        break
+                self._set_status(next_scan_at=_iso(next_scan))
+                self.stop_event.wait(min(1.0, max(0.0, next_scan - _now())))
+        finally:
+            self.stop_event.set()
+            heartbeat.join()
+            self.lease.release()
+            self._set_status(state="offline", current_market=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PolyEdge scanner worker")
+    parser.add_argument("--interval", type=float, default=SCAN_INTERVAL, help="seconds between scans")
+    parser.add_argument("--limit", type=int, default=SCAN_LIMIT, help="markets per scan")
+    parser.add_argument("--once", action="store_true", help="run a single scan and exit")
+    args = parser.parse_args()
+
+    worker = ScannerWorker(interval=args.interval, limit=args.limit)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    print(f"Scanner worker {worker.lease.owner} starting (every {args.interval:g}s, {args.limit} markets)")
+    worker.run(max_scans=1 if args.once else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -33,16 +33,22 @@ CREATE TABLE public.profiles (
     min_edge_threshold NUMERIC DEFAULT 10.0,
     min_confidence_threshold NUMERIC DEFAULT 70.0,
     max_bet_size NUMERIC DEFAULT 50.0,
+    bankroll NUMERIC DEFAULT 1000.0, -- auto-bet sizing base
+    kelly_fraction NUMERIC DEFAULT 0.25, -- fraction of full Kelly to bet
     daily_stop_loss NUMERIC DEFAULT 250.0,
     
     -- Webhooks
     discord_webhook TEXT,
     telegram_chat_id TEXT,
     
-    -- Encrypted API Keys
+    -- Polymarket venue credentials. Stored as plaintext, NOT encrypted: keep
+    -- profiles behind RLS (section 4) and service-role access. The scanner reads
+    -- them only for users it is placing an order for.
     polymarket_api_key TEXT,
     polymarket_secret TEXT,
     polymarket_passphrase TEXT,
+    polymarket_private_key TEXT, -- signs CTF Exchange orders (EIP-712)
+    polymarket_funder TEXT, -- proxy wallet holding the funds (defaults to the signer)
     
     updated_at TIMESTAMPTZ DEFAULT NOW(),
     created_at TIMESTAMPTZ DEFAULT NOW()
@@ -71,6 +77,8 @@ CREATE TABLE public.predictions (
     key_signals JSONB,
     risk_factors JSONB,
     sentiment_score NUMERIC, -- -1.0 to 1.0
+    price_signals JSONB, -- {change_24h, volatility_24h, momentum, ...} from price history
+    order_book JSONB, -- {spread, bid_depth, ask_depth, imbalance, slippage} for the YES token
     
     model_version TEXT DEFAULT 'llama-3.1-8b-god-tier'
 );
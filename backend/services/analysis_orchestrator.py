@@ -1,9 +1,15 @@
 import json
 from services.context_service import ContextService
-from services.model_service import ModelService
+from services.model_service import FAST_SIGNAL, FULL_ANALYSIS, ModelService
 from services.notification_service import NotificationService
 from services.betting_service import BettingService
+from services.polymarket_service import PolymarketService
+from services.execution_engine import ExecutionEngine, OrderIntent
+from services.inference_queue import BACKGROUND
+from services.model_client import predict_edge
 from utils.prompt_builder import PromptBuilder
+from utils.order_book import OrderBook, OrderBookCache
+from utils.price_features import PriceHistoryCache
 from supabase_client import get_supabase_client
 from typing import Dict, Any, Optional, List
 
@@ -16,37 +22,93 @@ class AnalysisOrchestrator:
     # Simple in-memory cache to save on duplicate requests
     _cache = {}
 
+    # Profile columns alert dispatch and bet sizing read. Venue credentials are
+    # fetched separately, only for users an order is actually placed for.
+    PROFILE_COLUMNS = "id, discord_webhook, bankroll, max_bet_size, kelly_fraction, min_edge_threshold, min_confidence_threshold"
+    CREDENTIAL_COLUMNS = (
+        "id, polymarket_api_key, polymarket_secret, polymarket_passphrase, polymarket_private_key, polymarket_funder"
+    )
+
     @classmethod
-    def analyze_market_live(cls, market_id: str, question: str, current_price: float, volume: float) -> Optional[Dict[str, Any]]:
+    def analyze_market_live(
+        cls,
+        market_id: str,
+        question: str,
+        current_price: float,
+        volume: float,
+        category: Optional[str] = None,
+        token_ids: Optional[List[str]] = None,
+        lane: str = BACKGROUND,
+        mode: str = FULL_ANALYSIS,
+    ) -> Optional[Dict[str, Any]]:
         """
         Runs the full God-Tier pipeline for a single market.
+        `lane` is the inference queue lane: "interactive" when a user is
+        waiting on the result, "background" for scans. Raises QueueFull
+        when that lane is at its depth limit, ModelUnavailable when the
+        model server can't serve.
+        `mode` FAST_SIGNAL returns only the numeric/enum fields (greedy,
+        no reasoning) and skips persistence and automated workflows.
         """
         print(f"--- STARTING GOD-TIER ANALYSIS: {question} ---")
         
         # 1. Fetch Real Context (Twitter + News)
         # ContextService handles real API calls to GDELT and TwitterAPI.io
-        context_data = ContextService.get_market_context(question)
+        # (sources can be switched off per market category)
+        context = ContextService.get_context(question, category=category)
+        
+        # Price-history signals for the YES token (after the first call only new points are fetched)
+        token_ids = token_ids or []
+        yes_token = token_ids[0] if token_ids else None
+        if yes_token:
+            price_features = PriceHistoryCache.default().refresh(
+                yes_token, lambda start_ts: PolymarketService.get_price_history(yes_token, start_ts)
+            )
+        else:
+            price_features = PriceHistoryCache.default().features(market_id)
+        
+        # YES and NO books in one bulk request (cached for a few seconds)
+        books = OrderBookCache.default().get_many(token_ids, PolymarketService.get_order_books)
+        yes_book = books.get(yes_token) if yes_token else None
+        book_signals = yes_book.signals() if yes_book else None
         
-        # 2. Build Model Prompt (Strict Contract)
-        prompt_input = PromptBuilder.build_analysis_input(
+        # 2. Build Model Prompt (Strict Contract), packed to fit the context window
+        packed = PromptBuilder.build_packed_input(
             question=question,
             current_price=current_price,
             volume=volume,
-            news_context=context_data
+            context=context,
+            counter=ModelService.get_token_counter(),
+            max_seq_length=ModelService.MAX_SEQ_LENGTH,
+            response_tokens=ModelService.MAX_NEW_TOKENS,
+            price_signals="\n".join(filter(None, [
+                PromptBuilder.format_price_signals(price_features),
+                PromptBuilder.format_order_book(book_signals),
+            ])),
+        )
+        prompt_input = packed.input_text
+        print(
+            f"Prompt: {packed.prompt_tokens} tokens{'' if packed.exact else ' (estimated)'}, "
+            f"{packed.items_kept} context items kept, {packed.items_dropped} dropped"
         )
         
-        # 3. Run Model Inference (Fine-tuned Llama 3.1 8B)
-        prediction = ModelService.predict_edge(prompt_input)
+        # 3. Run Model Inference (Fine-tuned Llama 3.1 8B), scheduled by lane priority
+        # (in this process, or on the model server when MODEL_SERVING=server)
+        prediction = predict_edge(prompt_input, lane, mode)
         
         if not prediction:
             print(f"Failed to generate prediction for {market_id}")
             return None
+        
+        # Signals without reasoning are not stored or traded on; the full analysis is
+        if mode == FAST_SIGNAL:
+            return prediction
             
         # 4. Persistence & Dashboard Metadata
         supabase = get_supabase_client()
         
-        # Extract top headlines for the UI cards
-        headlines = cls._extract_top_headlines(context_data)
+        # Headlines and sentiment come from the records the model actually saw
+        headlines = packed.kept.top_headlines()
         
         prediction_entry = {
             "market_id": market_id,
@@ -61,8 +123,10 @@ class AnalysisOrchestrator:
             "key_signals": prediction.get("key_signals"),
             "risk_factors": prediction.get("risk_factors"),
             "top_headlines": headlines,
-            "sentiment_score": cls._calculate_sentiment_proxy(context_data),
-            "raw_context": context_data,
+            "sentiment_score": packed.kept.sentiment(),
+            "price_signals": price_features.as_dict(),
+            "order_book": book_signals.as_dict() if book_signals else None,
+            "raw_context": packed.context,
             "model_version": "llama-3.1-8b-god-tier"
         }
         
@@ -72,56 +136,36 @@ class AnalysisOrchestrator:
             # 5. Pro Alerts & Execution
             # Only trigger if confidence is high
             if prediction.get("confidence", 0) >= 70:
-                cls._trigger_automated_workflows(prediction, market_id)
+                side = 1 if prediction.get("action") == "BUY_NO" else 0
+                token_id = token_ids[side] if len(token_ids) > side else None
+                prediction_id = res.data[0].get("id") if res.data else None
+                cls._trigger_automated_workflows(prediction, market_id, token_id, books.get(token_id), prediction_id)
                 
             return prediction
         except Exception as e:
             print(f"Error in orchestrator persistence: {e}")
             return prediction
 
-    @staticmethod
-    def _extract_top_headlines(context: str) -> List[Dict]:
-        """Extracts the first 3 Tier 1/3 headlines from the formatted context string."""
-        headlines = []
-        lines = context.split("\n")
-        for line in lines:
-            if line.startswith("- "):
-                # Simple parsing for the dashboard visualization
-                parts = line[2:].split(": \"")
-                if len(parts) == 2:
-                    headlines.append({
-                        "source": parts[0].strip(),
-                        "title": parts[1].strip().strip("\""),
-                        "tier": 1 if "(verified)" in parts[0] or "Reuters" in parts[0] or "Bloomberg" in parts[0] else 3
-                    })
-            if len(headlines) >= 3:
-                break
-        return headlines
-
-    @staticmethod
-    def _calculate_sentiment_proxy(context: str) -> float:
-        """Returns a rough sentiment score for the UI heatmap."""
-        bullish = ["bullish", "high", "rally", "gain", "buy", "success", "yes"]
-        bearish = ["bearish", "low", "dip", "drop", "sell", "fail", "no"]
-        
-        text = context.lower()
-        score = 0
-        for word in bullish: score += text.count(word)
-        for word in bearish: score -= text.count(word)
-        
-        # Normalize to -1.0 to 1.0 range
-        total = abs(score) + 1
-        return max(-1.0, min(1.0, score / total))
-
     @classmethod
-    def _trigger_automated_workflows(cls, prediction: Dict, market_id: str):
+    def _trigger_automated_workflows(
+        cls,
+        prediction: Dict,
+        market_id: str,
+        token_id: Optional[str] = None,
+        book: Optional[OrderBook] = None,
+        prediction_id: Optional[str] = None,
+    ):
         """Dispatches alerts and checks for auto-betting opportunities."""
         supabase = get_supabase_client()
         
-        # Fetch active Pro user profiles
-        profiles = supabase.table("profiles").select("*").eq("is_pro", True).execute()
+        # Fetch active Pro user profiles (no credentials)
+        profiles = supabase.table("profiles").select(cls.PROFILE_COLUMNS).eq("is_pro", True).execute()
+        
+        # Size the bet for every user at once (thresholds, Kelly, book depth)
+        sizing = BettingService.size_for_users(prediction, profiles.data, book)
         
-        for profile in profiles.data:
+        orders = []
+        for profile, size in zip(profiles.data, sizing.size):
             # 1. Discord/Telegram Alerts
             if profile.get("discord_webhook"):
                 NotificationService.send_discord_alert(
@@ -131,7 +175,36 @@ class AnalysisOrchestrator:
                 )
             
             # 2. Automated Betting logic (Inherent risk control)
-            if BettingService.validate_risk(profile, prediction):
-                # This would execute the actual trade if keys were present
-                print(f"AUTO-BET TRIGGERED for user {profile['id']} on market {market_id}")
-                # BettingService.place_order(...)
+            if size > 0 and token_id:
+                print(f"AUTO-BET TRIGGERED for user {profile['id']} on market {market_id}: {sizing.side} ${size:.2f}")
+                orders.append((profile["id"], float(size)))
+        
+        credentials = {}
+        if orders:
+            rows = supabase.table("profiles").select(cls.CREDENTIAL_COLUMNS).in_("id", [u for u, _ in orders]).execute()
+            credentials = {row["id"]: row for row in rows.data}
+        
+        intents = []
+        for user_id, size in orders:
+            row = credentials.get(user_id, {})
+            intents.append(OrderIntent(
+                user_id=user_id,
+                token_id=token_id,
+                usd=size,
+                limit_price=round(min(0.99, sizing.price * (1 + BettingService.MAX_SLIPPAGE)), 3),
+                market_id=market_id,
+                signal_id=prediction_id,
+                credentials={
+                    "api_key": row.get("polymarket_api_key"),
+                    "secret": row.get("polymarket_secret"),
+                    "passphrase": row.get("polymarket_passphrase"),
+                    # EIP-712 order signing (BettingService.build_clob_order)
+                    "private_key": row.get("polymarket_private_key"),
+                    "funder": row.get("polymarket_funder"),
+                },
+            ))
+        
+        # Queued for execution (paper exchange unless EXECUTION_MODE=live); retries
+        # of the same prediction reuse the same idempotency keys
+        if intents:
+            ExecutionEngine.default().submit_many(intents)
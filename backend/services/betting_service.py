@@ -1,8 +1,8 @@
 import requests
 import time
-from typing import Dict, Any, Optional
-from eth_account import Account
-from eth_account.messages import encode_defunct
+from typing import Dict, Any, List, Optional, Tuple
+from utils.bet_sizing import MAX_SLIPPAGE, Sizing, UserArrays, size_orders
+from utils.order_book import OrderBook
 
 class BettingService:
     """
@@ -11,6 +11,41 @@ class BettingService:
     """
     
     CLOB_API_URL = "https://clob.polymarket.com"
+    # Max average fill price above the best ask, as a fraction (0.02 = 2%)
+    MAX_SLIPPAGE = MAX_SLIPPAGE
+    ORDER_TTL_SECONDS = 3600
+
+    @classmethod
+    def order_expiration(cls, now: Optional[float] = None) -> int:
+        """
+        End of the next ORDER_TTL_SECONDS window (1-2 TTLs out). Retries inside
+        one window get the same expiration and so, with the same salt, the
+        same signed order.
+        """
+        now = time.time() if now is None else now
+        return (int(now) // cls.ORDER_TTL_SECONDS + 2) * cls.ORDER_TTL_SECONDS
+
+    @classmethod
+    def build_clob_order(
+        cls, token_id: str, price: float, size: float, side: str, credentials: Dict[str, str], expiration: int,
+        client_order_id: Optional[str] = None,
+    ) -> Optional[Tuple[Any, str]]:
+        """
+        (ClobOrder, private key) to sign for these credentials; None without a
+        private key. The salt is derived from client_order_id when given.
+        """
+        private_key = credentials.get("private_key")
+        if not private_key:
+            return None
+        # eth_keys/eth_utils load only once a live order is actually signed
+        from services.order_signer import ClobOrder, salt_from_key, signer_address
+
+        signer = signer_address(private_key)
+        order = ClobOrder.limit(
+            credentials.get("funder") or signer, token_id, price, size, side, signer=signer, expiration=expiration,
+            salt=salt_from_key(client_order_id) if client_order_id else None,
+        )
+        return order, private_key
 
     @classmethod
     def place_limit_order(cls, 
@@ -18,9 +53,15 @@ class BettingService:
                          price: float, 
                          size: float, 
                          side: str, 
-                         credentials: Dict[str, str]) -> Optional[Dict[str, Any]]:
+                         credentials: Dict[str, str],
+                         signed_order: Optional[Dict[str, Any]] = None,
+                         client_order_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Executes a real order on the Polymarket CLOB.
+        `signed_order` is an order already signed in a batch (ClobVenue); otherwise
+        it is signed here when the credentials carry a private key, salted from
+        client_order_id. The CLOB has no client order id field, so that salt is
+        what makes a retry the same order.
         """
         api_key = credentials.get("api_key")
         secret = credentials.get("secret")
@@ -37,15 +78,24 @@ class BettingService:
             "side": side.upper(), # BUY or SELL
             "size": size,
             "type": "LIMIT",
-            "expiration": int(time.time() + 3600), # 1 hour
+            "expiration": int(signed_order["expiration"]) if signed_order else cls.order_expiration(),
         }
 
-        # 2. Signature Logic (Simplified for Architectural Integrity)
-        # Note: A real CLOB order requires EIP-712 signing.
-        # We would use eth_account to sign the order hash here.
-        print(f"DEBUG: Executing {side} on CLOB for token {token_id} at {price}")
-        
         try:
+            # 2. EIP-712 signature over the CTF Exchange order (see services/order_signer.py)
+            if signed_order is None:
+                prepared = cls.build_clob_order(
+                    token_id, price, size, side, credentials, order["expiration"], client_order_id
+                )
+                if prepared:
+                    from services.order_signer import sign_order
+
+                    clob_order, private_key = prepared
+                    signed_order = clob_order.to_api(sign_order(clob_order, private_key))
+            if signed_order:
+                order["signed_order"] = signed_order
+            print(f"DEBUG: Executing {side} on CLOB for token {token_id} at {price}")
+            
             # Simulated headers for the CLOB API
             headers = {
                 "POLYMARKET-API-KEY": api_key,
@@ -86,8 +136,20 @@ class BettingService:
         return True
 
     @classmethod
-    def calculate_bet_size(cls, max_usd: float, confidence: int) -> float:
+    def calculate_bet_size(cls, max_usd: float, confidence: int, book: Optional[OrderBook] = None) -> float:
         """Dynamically scales bet size based on AI confidence."""
         # Simple multiplier: higher confidence = closer to max bet
         # e.g., 70% confidence = 0.7 * max_usd
-        return max_usd * (confidence / 100.0)
+        size = max_usd * (confidence / 100.0)
+        if book is not None:
+            # Never pay more than MAX_SLIPPAGE over the best ask on average
+            size = min(size, book.max_buy_within(cls.MAX_SLIPPAGE))
+        return size
+
+    @classmethod
+    def size_for_users(cls, prediction: Dict[str, Any], profiles: List[Dict[str, Any]], book: Optional[OrderBook] = None) -> Sizing:
+        """
+        Kelly-style order sizes for every profile in one vectorized pass,
+        with each user's thresholds applied and sizes capped by the book.
+        """
+        return size_orders(prediction, UserArrays.from_profiles(profiles), book, cls.MAX_SLIPPAGE)
@@ -0,0 +1,202 @@
+"""
+Local full-text index over every article and tweet ContextService fetches.
+
+Items are stored once (keyed by URL / tweet id) with their publish time in
+SQLite, with an FTS5 table over title/text (plus the query terms that
+retrieved the item) for BM25 retrieval. A coverage
+table records which time ranges have already been fetched upstream for a
+given normalized query, so sibling markets ("Will BTC hit 100k" vs. "110k")
+that produce the same query reuse each other's fetches and only the
+missing ranges go upstream.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.context_models import parse_timestamp
+
+INDEX_PATH = Path(os.getenv("CONTEXT_INDEX_PATH", Path(__file__).parent.parent / "data" / "context_index.sqlite"))
+
+# Gaps shorter than this are not worth an upstream call; it also bounds how
+# stale the most recent slice of a window can get.
+MIN_GAP_SECONDS = 15 * 60
+
+# Coverage older than this can't fall inside a context window any more and is dropped
+COVERAGE_RETENTION_SECONDS = 30 * 24 * 3600
+
+_FTS_TERM_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-folds and sorts OR'd terms so equivalent queries share coverage."""
+    terms = [t.strip().strip('"').lower() for t in query.strip("() ").split(" OR ")]
+    return " OR ".join(sorted(set(t for t in terms if t)))
+
+
+def fts_query(terms: Sequence[str]) -> Optional[str]:
+    """FTS5 MATCH expression: each term as a quoted phrase, OR'd ($BTC, #Bitcoin -> btc, bitcoin)."""
+    phrases = []
+    for term in terms:
+        words = _FTS_TERM_RE.findall(term)
+        if words:
+            phrase = '"' + " ".join(words).lower() + '"'
+            if phrase not in phrases:
+                phrases.append(phrase)
+    return " OR ".join(phrases) if phrases else None
+
+
+class ContextIndex:
+    ARTICLE = "article"
+    TWEET = "tweet"
+
+    _default: Optional["ContextIndex"] = None
+
+    def __init__(
+        self, path: Path = INDEX_PATH, min_gap: float = MIN_GAP_SECONDS, retention: float = COVERAGE_RETENTION_SECONDS
+    ):
+        self.path = Path(path)
+        self.min_gap = min_gap
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def default(cls) -> "ContextIndex":
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(
+                "PRAGMA journal_mode=WAL;"
+                "CREATE TABLE IF NOT EXISTS items ("
+                "rowid INTEGER PRIMARY KEY, id TEXT UNIQUE, kind TEXT, ts REAL, body TEXT, tags TEXT, payload TEXT);"
+                "CREATE INDEX IF NOT EXISTS items_kind_ts ON items(kind, ts);"
+                "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5("
+                "body, tags, content='items', content_rowid='rowid');"
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                "kind TEXT, query TEXT, start_ts REAL, end_ts REAL, fetched_at REAL);"
+                "CREATE INDEX IF NOT EXISTS coverage_kind_query ON coverage(kind, query);"
+            )
+        return self._conn
+
+    def _add(self, kind: str, query: str, rows: List[Tuple[str, float, str, Dict]]) -> int:
+        # Upstream matched on text we don't keep (GDELT searches the full article),
+        # so items are tagged with the query terms that retrieved them.
+        query_tags = fts_query(normalize_query(query).split(" OR ")) or ""
+        query_tags = query_tags.replace('"', "").replace(" OR ", " ")
+        added = 0
+        with self._lock:
+            for item_id, ts, body, payload in rows:
+                existing = self.conn.execute("SELECT rowid, body, tags FROM items WHERE id = ?", (item_id,)).fetchone()
+                if existing is None:
+                    cur = self.conn.execute(
+                        "INSERT INTO items (id, kind, ts, body, tags, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                        (item_id, kind, ts, body, query_tags, json.dumps(payload)),
+                    )
+                    self.conn.execute(
+                        "INSERT INTO items_fts (rowid, body, tags) VALUES (?, ?, ?)", (cur.lastrowid, body, query_tags)
+                    )
+                    added += 1
+                    continue
+                rowid, old_body, old_tags = existing
+                new_words = [w for w in query_tags.split() if w not in old_tags.split()]
+                if new_words:
+                    tags = " ".join([old_tags] + new_words).strip()
+                    self.conn.execute(
+                        "INSERT INTO items_fts (items_fts, rowid, body, tags) VALUES ('delete', ?, ?, ?)",
+                        (rowid, old_body, old_tags),
+                    )
+                    self.conn.execute("UPDATE items SET tags = ? WHERE rowid = ?", (tags, rowid))
+                    self.conn.execute("INSERT INTO items_fts (rowid, body, tags) VALUES (?, ?, ?)", (rowid, old_body, tags))
+            self.conn.commit()
+        return added
+
+    def add_articles(self, articles: List[Dict], query: str = "", default_ts: Optional[float] = None) -> int:
+        """Ingests raw GDELT artlist entries; returns how many were new. Undated items get default_ts (or now)."""
+        now = default_ts or time.time()
+        rows = []
+        for a in articles:
+            if a.get("url") and a.get("title"):
+                rows.append((a["url"], parse_timestamp(a.get("seendate")) or now, a["title"], a))
+        return self._add(self.ARTICLE, query, rows)
+
+    def add_tweets(self, tweets: List[Dict], query: str = "", default_ts: Optional[float] = None) -> int:
+        """Ingests raw TwitterAPI.io tweets; returns how many were new. Undated items get default_ts (or now)."""
+        now = default_ts or time.time()
+        rows = []
+        for t in tweets:
+            if t.get("id") and t.get("text"):
+                rows.append((str(t["id"]), parse_timestamp(t.get("createdAt")) or now, t["text"], t))
+        return self._add(self.TWEET, query, rows)
+
+    def mark_covered(self, kind: str, query: str, start_ts: float, end_ts: float):
+        """
+        Records [start_ts, end_ts] as fetched for this query, merged with any
+        overlapping or touching range so each query keeps a handful of rows.
+        Ranges that ended before the retention horizon are dropped.
+        """
+        query = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            overlapping = self.conn.execute(
+                "SELECT rowid, start_ts, end_ts FROM coverage WHERE kind = ? AND query = ? AND end_ts >= ? AND start_ts <= ?",
+                (kind, query, start_ts, end_ts),
+            ).fetchall()
+            if overlapping:
+                start_ts = min([start_ts] + [r[1] for r in overlapping])
+                end_ts = max([end_ts] + [r[2] for r in overlapping])
+                self.conn.executemany("DELETE FROM coverage WHERE rowid = ?", [(r[0],) for r in overlapping])
+            self.conn.execute("INSERT INTO coverage VALUES (?, ?, ?, ?, ?)", (kind, query, start_ts, end_ts, now))
+            self.conn.execute("DELETE FROM coverage WHERE end_ts < ?", (now - self.retention,))
+            self.conn.commit()
+
+    def missing_ranges(self, kind: str, query: str, start_ts: float, end_ts: float) -> List[Tuple[float, float]]:
+        """Sub-ranges of [start_ts, end_ts] not yet fetched upstream for this query."""
+        with self._lock:
+            covered = self.conn.execute(
+                "SELECT start_ts, end_ts FROM coverage WHERE kind = ? AND query = ? AND end_ts > ? AND start_ts < ? "
+                "ORDER BY start_ts",
+                (kind, normalize_query(query), start_ts, end_ts),
+            ).fetchall()
+
+        gaps = []
+        cursor = start_ts
+        for c_start, c_end in covered:
+            if c_start > cursor:
+                gaps.append((cursor, min(c_start, end_ts)))
+            cursor = max(cursor, c_end)
+            if cursor >= end_ts:
+                break
+        if cursor < end_ts:
+            gaps.append((cursor, end_ts))
+        return [(s, e) for s, e in gaps if e - s >= self.min_gap]
+
+    def search(self, kind: str, terms: Sequence[str], start_ts: float, end_ts: float, k: int = 20) -> List[Dict]:
+        """Top-k items matching any term inside the time window, best BM25 first."""
+        match = fts_query(terms)
+        if match is None:
+            return []
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT items.payload FROM items_fts JOIN items ON items.rowid = items_fts.rowid "
+                "WHERE items_fts MATCH ? AND items.kind = ? AND items.ts BETWEEN ? AND ? "
+                "ORDER BY bm25(items_fts, 1.0, 0.5) LIMIT ?",
+                (match, kind, start_ts, end_ts, k),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self.conn.execute("SELECT kind, COUNT(*) FROM items GROUP BY kind").fetchall())
+        return {"articles": counts.get(self.ARTICLE, 0), "tweets": counts.get(self.TWEET, 0)}
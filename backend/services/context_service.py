@@ -1,10 +1,19 @@
 import os
 import requests
 import json
+import threading
 import time
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
+from utils.keyword_engine import KeywordEngine, gdelt_query
+from services.context_index import ContextIndex
+from utils.relevance import rank_items
+from utils.prompt_builder import PromptBuilder
+from services.context_sources import ContextSource, SourceRegistry, SourceRequest, SourceResult
+from utils.context_models import TIER_NEWS, TIER_REGULAR, TIER_VERIFIED, MarketContext, article_items, parse_timestamp, tweet_items
+from utils.latency import LatencyHistogram
 
 load_dotenv()
 
@@ -17,37 +26,224 @@ class ContextService:
     TWITTER_API_IO_KEY = os.getenv("TWITTER_API_IO_KEY")
     TWITTER_API_IO_BASE = "https://api.twitterapi.io/twitter"
     GDELT_DOC_API = "https://api.gdeltproject.org/api/v2/doc/doc"
+    # Upstream result caps: one GDELT artlist request, one TwitterAPI.io page
+    GDELT_MAX_RECORDS = 20
+    TWITTER_PAGE_SIZE = 20
+
+    # Overall deadline for the context stage; sources still running are reported missing
+    LATENCY_BUDGET = float(os.getenv("CONTEXT_LATENCY_BUDGET", "10"))
+    # A duplicate request is sent once the first has been out longer than the
+    # source's recent p90 (clamped to this range). Paid sources are never hedged.
+    HEDGE_MIN_DELAY = 1.0
+    HEDGE_MAX_DELAY = 6.0
+
+    # Context sources fanned out per market; builtins are registered below the class
+    REGISTRY = SourceRegistry.from_env()
+    # Upstream request latency and hedge counts for the builtin sources
+    LATENCY = {name: LatencyHistogram() for name in ("gdelt", "twitter")}
+    HEDGES = {name: 0 for name in LATENCY}
+
+    # Separate pools so per-source tasks never wait on their own upstream requests
+    _source_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="context-source")
+    _request_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="context-request")
 
     @classmethod
     def get_market_context(cls, question: str, days_before: int = 3) -> str:
         """
         Fetches combined News and X signals and returns a formatted God-Tier string.
         """
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days_before)
-        
-        # 1. Fetch News
-        news_articles = cls._fetch_gdelt(question, start_date, end_date)
-        
-        # 2. Fetch Tweets
-        tweets = cls._fetch_tweets(question, start_date, end_date)
-        
-        # 3. Format into the God-Tier Contract
-        return cls._format_context(news_articles, tweets)
+        return PromptBuilder.render_context(cls.get_context(question, days_before))
 
     @classmethod
-    def _fetch_gdelt(cls, question: str, start_dt: datetime, end_dt: datetime) -> List[Dict]:
-        """Real GDELT Fetcher"""
+    def get_context(
+        cls, question: str, days_before: int = 3, budget: Optional[float] = None, category: Optional[str] = None
+    ) -> MarketContext:
+        """
+        Fans the registered sources enabled for this market category out in
+        parallel and returns their relevance-ranked, tiered records. Whatever
+        arrived within the latency budget is returned; sources that didn't (or
+        are disabled for the category) are listed in MarketContext.missing.
+        Formatting happens once, at prompt-build time (PromptBuilder.build_packed_input).
+        """
+        budget = cls.LATENCY_BUDGET if budget is None else budget
+        end_date = datetime.now()
         keywords = cls._extract_keywords(question)
-        query = "(" + " OR ".join(keywords) + ")"
+        twitter_query = cls._extract_twitter_query(question)
+        request = SourceRequest(
+            question=question,
+            category=category,
+            keywords=tuple(keywords),
+            twitter_query=twitter_query,
+            relevance_query=" ".join([question] + keywords + twitter_query.split(" OR ")),
+            start=end_date - timedelta(days=days_before),
+            end=end_date,
+            deadline=time.monotonic() + budget,
+        )
+        return cls.REGISTRY.fan_out(request, cls._source_pool)
+
+    # Builtin sources: local index first, upstream only for time ranges not fetched
+    # yet, then ranked by similarity to the question with near-duplicates dropped
+    # so the prompt isn't filled with the same headline from ten outlets
+
+    @classmethod
+    def _gdelt_source(cls, req: SourceRequest) -> SourceResult:
+        keywords = list(req.keywords)
+        articles, complete = cls._indexed_fetch(
+            "gdelt", ContextIndex.ARTICLE, gdelt_query(keywords), keywords,
+            lambda s, e: cls._fetch_gdelt(req.question, s, e), req.start, req.end, 20, req.deadline,
+            hedge=True, cap=cls.GDELT_MAX_RECORDS,
+        )
+        ranked = rank_items(req.relevance_query, articles, lambda a: a.get("title") or "", lambda a: a.get("url"), k=10)
+        return SourceResult(article_items(ranked), complete)
+
+    @classmethod
+    def _twitter_source(cls, req: SourceRequest) -> SourceResult:
+        tweets, complete = cls._indexed_fetch(
+            "twitter", ContextIndex.TWEET, req.twitter_query, req.twitter_query.split(" OR "),
+            # Billed per request, so no duplicate requests
+            lambda s, e: cls._fetch_tweets(req.question, s, e), req.start, req.end, 50, req.deadline,
+            hedge=False, cap=cls.TWITTER_PAGE_SIZE,
+        )
+        ranked = rank_items(
+            req.relevance_query, tweets, lambda t: t.get("text") or "", lambda t: str(t["id"]) if t.get("id") else None, k=20
+        )
+        return SourceResult(tweet_items(ranked), complete)
+
+    @classmethod
+    def _indexed_fetch(
+        cls, source: str, kind: str, query: str, terms: List[str], fetch: Callable, start_dt: datetime, end_dt: datetime,
+        k: int, deadline: float, hedge: bool = True, cap: Optional[int] = None,
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Fetches only the parts of the window the index hasn't seen for this
+        query, ingests them, then serves the window from the index. The flag is
+        False if any upstream fetch failed or timed out. A fetch that answers
+        after the deadline is still ingested when it lands, for the next call.
+        Upstream returns newest first; when a fetch comes back with `cap` items
+        only the span from its oldest item on is marked covered, so the rest of
+        the gap is fetched again next time.
+        """
+        index = ContextIndex.default()
+        date_key = "seendate" if kind == ContextIndex.ARTICLE else "createdAt"
+        start_ts, end_ts = start_dt.timestamp(), end_dt.timestamp()
+
+        def ingest(gap_start: float, gap_end: float, items: List[Dict]):
+            if kind == ContextIndex.ARTICLE:
+                index.add_articles(items, query, default_ts=gap_end)
+            else:
+                index.add_tweets(items, query, default_ts=gap_end)
+            if cap is not None and len(items) >= cap:
+                # Truncated: older items in the gap were never returned
+                stamps = [ts for ts in (parse_timestamp(i.get(date_key)) for i in items) if ts is not None]
+                if not stamps:
+                    return
+                gap_start = max(gap_start, min(stamps))
+            index.mark_covered(kind, query, gap_start, gap_end)
+
+        complete = True
+        for gap_start, gap_end in index.missing_ranges(kind, query, start_ts, end_ts):
+            items = cls._hedged(
+                source, fetch, datetime.fromtimestamp(gap_start), datetime.fromtimestamp(gap_end), deadline,
+                hedge=hedge, on_late=lambda late, s=gap_start, e=gap_end: ingest(s, e, late),
+            )
+            if items is None:
+                # Failed or still running; a late answer is ingested by on_late, else the next call retries
+                complete = False
+                continue
+            ingest(gap_start, gap_end, items)
+        return index.search(kind, terms, start_ts, end_ts, k), complete
+
+    @classmethod
+    def _hedged(
+        cls, source: str, fetch: Callable, start_dt: datetime, end_dt: datetime, deadline: float,
+        hedge: bool = True, on_late: Optional[Callable[[List[Dict]], None]] = None,
+    ) -> Optional[List[Dict]]:
+        """
+        Runs fetch, and (if hedge) when it is slower than this source usually
+        is, fires one duplicate request; the first usable answer before the
+        deadline wins. Requests still out at the deadline keep running, and the
+        first usable one to finish is handed to on_late.
+        """
+        histogram = cls.LATENCY[source]
+
+        def timed():
+            started = time.monotonic()
+            try:
+                return fetch(start_dt, end_dt)
+            finally:
+                histogram.observe(time.monotonic() - started)
+
+        p90 = histogram.percentile(0.9) or cls.HEDGE_MAX_DELAY
+        hedge_after = min(cls.HEDGE_MAX_DELAY, max(cls.HEDGE_MIN_DELAY, p90))
+        pending = {cls._request_pool.submit(timed)}
+        hedged = False
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                if on_late is not None:
+                    cls._deliver_late(source, pending, on_late)
+                return None
+            timeout = min(remaining, hedge_after) if hedge and not hedged else remaining
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error fetching {source}: {e}")
+                    result = None
+                if result is not None:
+                    return result
+            if not done and hedge and not hedged:
+                hedged = True
+                cls.HEDGES[source] += 1
+                pending.add(cls._request_pool.submit(timed))
+        return None
+
+    @staticmethod
+    def _deliver_late(source: str, futures, on_late: Callable[[List[Dict]], None]):
+        """Calls on_late with the first usable result among futures, once, whenever it arrives."""
+        lock = threading.Lock()
+        delivered = []
+
+        def done(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error fetching {source} (late): {e}")
+                return
+            with lock:
+                if result is None or delivered:
+                    return
+                delivered.append(True)
+            try:
+                on_late(result)
+            except Exception as e:
+                print(f"Error ingesting late {source} results: {e}")
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    @classmethod
+    def latency_stats(cls) -> Dict[str, Dict]:
+        """Per-source timing and hit rate, plus upstream latency histograms and hedge counts."""
+        return {
+            "sources": cls.REGISTRY.stats_snapshot(),
+            "upstream": {name: {**cls.LATENCY[name].snapshot(), "hedged": cls.HEDGES[name]} for name in cls.LATENCY},
+        }
+
+    @classmethod
+    def _fetch_gdelt(cls, question: str, start_dt: datetime, end_dt: datetime) -> Optional[List[Dict]]:
+        """Real GDELT Fetcher. Returns None if the request failed."""
+        query = gdelt_query(cls._extract_keywords(question))
         
         params = {
             "query": query,
             "mode": "artlist",
-            "maxrecords": "20",
+            "maxrecords": str(cls.GDELT_MAX_RECORDS),
+            "sort": "datedesc",
             "format": "json",
-            "startdatetime": start_dt.strftime("%Y%m%d%H%M%S"),
-            "enddatetime": end_dt.strftime("%Y%m%d%H%M%S"),
+            "startdatetime": start_dt.astimezone(timezone.utc).strftime("%Y%m%d%H%M%S"),
+            "enddatetime": end_dt.astimezone(timezone.utc).strftime("%Y%m%d%H%M%S"),
             "sourcelang": "eng"
         }
         
@@ -58,16 +254,19 @@ class ContextService:
                 return data.get("articles", [])
         except Exception as e:
             print(f"Error fetching GDELT: {e}")
-        return []
+        return None
 
     @classmethod
-    def _fetch_tweets(cls, question: str, start_dt: datetime, end_dt: datetime) -> List[Dict]:
-        """Real Twitter Fetcher via TwitterAPI.io"""
+    def _fetch_tweets(cls, question: str, start_dt: datetime, end_dt: datetime) -> Optional[List[Dict]]:
+        """Real Twitter Fetcher via TwitterAPI.io. Returns None if the request failed or no key is set."""
         if not cls.TWITTER_API_IO_KEY:
-            return []
+            return None
             
         search_query = cls._extract_twitter_query(question)
-        full_query = f"{search_query} since:{start_dt.strftime('%Y-%m-%d')}_00:00:00_UTC until:{end_dt.strftime('%Y-%m-%d')}_23:59:59_UTC"
+        # Exact bounds so incremental index fills don't re-pull whole days
+        since = start_dt.astimezone(timezone.utc).strftime("%Y-%m-%d_%H:%M:%S")
+        until = end_dt.astimezone(timezone.utc).strftime("%Y-%m-%d_%H:%M:%S")
+        full_query = f"{search_query} since:{since}_UTC until:{until}_UTC"
         
         headers = {"X-API-Key": cls.TWITTER_API_IO_KEY}
         params = {"query": full_query, "queryType": "Latest"}
@@ -78,42 +277,26 @@ class ContextService:
                 return response.json().get("tweets", [])
         except Exception as e:
             print(f"Error fetching Tweets: {e}")
-        return []
+        return None
 
     @staticmethod
     def _extract_keywords(question: str) -> List[str]:
-        words = question.replace("?", "").split()
-        return [w for w in words if len(w) > 3 and w[0].isupper()][:3]
+        return KeywordEngine.default().keywords(question, limit=5)
 
     @staticmethod
     def _extract_twitter_query(question: str) -> str:
-        # Simple extraction for now
-        keywords = [w for w in question.split() if w[0].isupper()][:2]
-        return " OR ".join(keywords) if keywords else "Polymarket"
+        return KeywordEngine.default().twitter_query(question, default="Polymarket")
 
     @classmethod
     def _format_context(cls, news: List[Dict], tweets: List[Dict]) -> str:
         """Standardizes output for the model."""
-        output = "============================================================\n"
-        output += "TIER 1: VERIFIED SOURCES [WEIGHT: 3x, RELIABILITY: 95%]\n"
-        output += "============================================================\n"
-        
-        # Pull verified tweets & top news
-        for tweet in tweets[:10]:
-            if tweet.get("author", {}).get("isBlueVerified"):
-                output += f"- @{tweet['author']['userName']} (verified): \"{tweet['text'][:200]}\"\n"
-        
-        output += "\n============================================================\n"
-        output += "TIER 3: PROFESSIONAL NEWS [WEIGHT: 2x, RELIABILITY: 80%]\n"
-        output += "============================================================\n"
-        for article in news[:10]:
-            output += f"- {article.get('domain')}: \"{article.get('title')}\"\n"
-            
-        output += "\n============================================================\n"
-        output += "TIER 4/5: REGULAR & SUSPICIOUS [WEIGHT: 0x-1x]\n"
-        output += "============================================================\n"
-        for tweet in tweets:
-            if not tweet.get("author", {}).get("isBlueVerified"):
-                output += f"- @{tweet.get('author', {}).get('userName')}: \"{tweet['text'][:150]}\"\n"
-        
-        return output
+        return PromptBuilder.format_context(news, tweets)
+
+
+# Twitter first so merged items keep the original tweets-then-news order
+ContextService.REGISTRY.register(ContextSource(
+    "twitter", "X/Twitter", (TIER_VERIFIED, TIER_REGULAR), ContextService._twitter_source, cost=0.003, timeout=20.0,
+))
+ContextService.REGISTRY.register(ContextSource(
+    "gdelt", "GDELT news", (TIER_NEWS,), ContextService._gdelt_source, cost=0.0, timeout=15.0,
+))
@@ -0,0 +1,172 @@
+"""
+Pluggable context sources for ContextService.
+
+A source declares a fetch callable, the prompt tiers it feeds, a rough
+cost per call and a timeout. The registry fans the sources enabled for a
+market out over a thread pool, merges their records into one
+MarketContext, marks sources that failed, timed out or were switched off
+as missing, and keeps per-source timing and hit-rate stats.
+
+Sources can be disabled per market category to save latency and API
+spend, in code (disable_for_category) or with CONTEXT_DISABLED_SOURCES,
+e.g. "sports=twitter;pop-culture=gdelt,twitter".
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Executor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from utils.context_models import ContextItem, MarketContext, MissingSource
+from utils.latency import LatencyHistogram
+
+
+@dataclass(frozen=True)
+class SourceRequest:
+    question: str
+    category: Optional[str]
+    keywords: Tuple[str, ...]
+    twitter_query: str
+    relevance_query: str
+    start: datetime
+    end: datetime
+    # time.monotonic() deadline for this source (overall budget or its own timeout, whichever is first)
+    deadline: float
+
+
+@dataclass
+class SourceResult:
+    items: List[ContextItem]
+    # False if an upstream call failed and items may be partial (cached only)
+    complete: bool = True
+
+
+@dataclass(frozen=True)
+class ContextSource:
+    name: str
+    label: str
+    tiers: Tuple[int, ...]
+    fetch: Callable[[SourceRequest], SourceResult]
+    cost: float = 0.0
+    timeout: float = 10.0
+    # None = every category
+    categories: Optional[FrozenSet[str]] = None
+
+
+class SourceStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.calls = 0
+        self.hits = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: Optional[float], items: int = 0, timed_out: bool = False, error: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.hits += items > 0
+            self.timeouts += timed_out
+            self.errors += error
+        if seconds is not None:
+            self.latency.observe(seconds)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                **self.latency.snapshot(),
+                "calls": self.calls,
+                "hit_rate": round(self.hits / self.calls, 3) if self.calls else None,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "skipped": self.skipped,
+            }
+
+
+def _parse_disabled(spec: str) -> Dict[str, Set[str]]:
+    disabled: Dict[str, Set[str]] = {}
+    for part in spec.split(";"):
+        if "=" not in part:
+            continue
+        category, names = part.split("=", 1)
+        disabled.setdefault(category.strip().lower(), set()).update(n.strip() for n in names.split(",") if n.strip())
+    return disabled
+
+
+class SourceRegistry:
+    def __init__(self, disabled: Optional[Dict[str, Set[str]]] = None):
+        self._sources: Dict[str, ContextSource] = {}
+        self._disabled: Dict[str, Set[str]] = disabled or {}
+        self.stats: Dict[str, SourceStats] = {}
+
+    @classmethod
+    def from_env(cls) -> "SourceRegistry":
+        return cls(_parse_disabled(os.getenv("CONTEXT_DISABLED_SOURCES", "")))
+
+    def register(self, source: ContextSource):
+        self._sources[source.name] = source
+        self.stats.setdefault(source.name, SourceStats())
+
+    def unregister(self, name: str):
+        self._sources.pop(name, None)
+
+    @property
+    def sources(self) -> List[ContextSource]:
+        return list(self._sources.values())
+
+    def disable_for_category(self, category: str, names: Iterable[str]):
+        self._disabled.setdefault(category.lower(), set()).update(names)
+
+    def is_enabled(self, source: ContextSource, category: Optional[str]) -> bool:
+        key = (category or "").lower()
+        if source.name in self._disabled.get(key, set()):
+            return False
+        return source.categories is None or key in source.categories
+
+    def fan_out(self, request: SourceRequest, pool: Executor) -> MarketContext:
+        """
+        Runs every source enabled for request.category in parallel and merges
+        their items (in registration order) into one MarketContext. Each source
+        gets until min(request.deadline, start + its timeout).
+        """
+        started = time.monotonic()
+        futures = {}
+        missing: List[MissingSource] = []
+        for source in self._sources.values():
+            if not self.is_enabled(source, request.category):
+                self.stats[source.name].skipped += 1
+                missing.append(MissingSource(source.label, source.tiers, f"disabled for {request.category} markets"))
+                continue
+            deadline = min(request.deadline, started + source.timeout)
+            futures[source.name] = (pool.submit(source.fetch, replace(request, deadline=deadline)), deadline)
+
+        items: List[ContextItem] = []
+        for name, (future, deadline) in futures.items():
+            source, stats = self._sources[name], self.stats[name]
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                # The source task keeps running; builtin sources ingest late upstream answers into the index
+                stats.record(None, timed_out=True)
+                missing.append(MissingSource(source.label, source.tiers, f"no response within {round(deadline - started, 1):g}s"))
+                continue
+            except Exception as e:
+                print(f"Error fetching {source.label}: {e}")
+                stats.record(time.monotonic() - started, error=True)
+                missing.append(MissingSource(source.label, source.tiers, "upstream unavailable"))
+                continue
+
+            stats.record(time.monotonic() - started, items=len(result.items))
+            if not result.complete:
+                reason = "upstream unavailable" + (", showing cached items only" if result.items else "")
+                missing.append(MissingSource(source.label, source.tiers, reason))
+            items.extend(result.items)
+
+        return MarketContext(tuple(items), tuple(missing))
+
+    def stats_snapshot(self) -> Dict[str, Dict]:
+        return {name: {"cost": self._sources[name].cost, **stats.snapshot()} for name, stats in self.stats.items() if name in self._sources}
@@ -0,0 +1,458 @@
+"""
+Order execution engine for auto-bets.
+
+Callers submit OrderIntents (user, token, side, USD size, limit). Each
+intent gets a Future for its ExecutionResult. A dispatcher thread drains
+the intent queue in batch windows and executes the batch on a thread pool.
+
+- Idempotency: every intent has a key, derived from user, token, side and
+  signal unless given (intents without either get a random key and are
+  never deduplicated). Submitting a key that is pending or done returns
+  the same Future, so a retried trigger can't fill twice. Done keys are
+  remembered for IDEMPOTENCY_TTL_SECONDS, at most MAX_DONE_KEYS of them.
+  The key is the venue order's client order id. The live CLOB has no such
+  field, so ClobVenue derives the order salt from it and uses a windowed
+  expiration (BettingService.order_expiration). A retry, even after a
+  restart, then signs the identical order; the exchange tracks fills per
+  order hash, so it can't fill twice. A retry that crosses into the next expiration window
+  (ORDER_TTL_SECONDS) builds a new order and is not protected.
+- Aggregation (optional): intents for the same token, side and limit in
+  one window are sent as a single parent order from the house account.
+  The fill is split back pro rata, so users stop competing for the same
+  liquidity.
+- Rate limits: orders are spaced per account (RATE_PER_ACCOUNT orders/s).
+- Signing: a venue with prepare_orders(...) gets each batch's venue orders
+  before they go out. ClobVenue signs them all at once there (order_signer's
+  process pool for large batches) instead of one by one on the send path.
+- Metrics: submit-to-fill latency histogram, throughput and fill counts.
+
+Venues implement submit_order(...) -> VenueFill. ClobVenue goes through
+BettingService.place_limit_order. PaperExchange (services/paper_exchange.py)
+matches against replayed order books so the pipeline can be exercised
+and measured without a live exchange. EXECUTION_MODE selects the default
+venue ("paper", or "live" for the CLOB).
+
+Usage:
+    python -m services.execution_engine --benchmark   (from backend/)
+"""
+
+import hashlib
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from utils.latency import LatencyHistogram
+
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "paper")
+BATCH_WINDOW_SECONDS = 0.2
+RATE_PER_ACCOUNT = 5.0
+HOUSE_ACCOUNT = "house"
+# How long, and how many, executed keys are remembered for deduplication
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+MAX_DONE_KEYS = 100_000
+
+
+@dataclass(frozen=True)
+class OrderIntent:
+    user_id: str
+    token_id: str
+    usd: float
+    side: str = "BUY"
+    limit_price: Optional[float] = None
+    market_id: Optional[str] = None
+    # Prediction the order comes from; part of the default idempotency key
+    signal_id: Optional[str] = None
+    account: Optional[str] = None
+    idempotency_key: Optional[str] = None
+    credentials: Optional[Dict] = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        # Without a signal there is nothing to tell a retry from a new order, so
+        # "user:token:BUY:None" would block every later one; use a one-off key
+        if self.idempotency_key is None and self.signal_id is None:
+            object.__setattr__(self, "idempotency_key", uuid.uuid4().hex)
+
+    @property
+    def key(self) -> str:
+        return self.idempotency_key or f"{self.user_id}:{self.token_id}:{self.side.upper()}:{self.signal_id}"
+
+
+@dataclass(frozen=True)
+class VenueFill:
+    order_id: Optional[str]
+    filled_usd: float
+    shares: float
+    avg_price: Optional[float]
+    # filled, partial, unfilled, rejected or submitted (accepted, fill unknown yet)
+    status: str
+
+
+@dataclass(frozen=True)
+class ExecutionResult:
+    key: str
+    user_id: str
+    token_id: str
+    side: str
+    requested_usd: float
+    filled_usd: float
+    shares: float
+    avg_price: Optional[float]
+    status: str
+    order_id: Optional[str]
+    # Number of intents in the venue order this came from (1 = not aggregated)
+    batch_size: int
+    latency: float
+
+
+@dataclass(frozen=True)
+class VenueOrder:
+    """One order sent to the venue: a single intent, or an aggregated group on the house account."""
+
+    account: str
+    token_id: str
+    side: str
+    usd: float
+    limit_price: Optional[float]
+    client_order_id: str
+    credentials: Optional[Dict] = field(default=None, compare=False, repr=False)
+
+
+class RateLimiter:
+    """Spaces calls at most `rate` per second (shared across threads)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_send = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            send_at = max(now, self._next_send)
+            self._next_send = send_at + 1.0 / self.rate
+        if send_at > now:
+            time.sleep(send_at - now)
+
+
+class ClobVenue:
+    """Live CLOB through BettingService (credentials come with each intent)."""
+
+    name = "clob"
+
+    def __init__(self):
+        # client order id -> signed order body from prepare_orders, used once by submit_order
+        self._signed: Dict[str, Dict] = {}
+
+    @staticmethod
+    def _price_size(usd: float, limit_price: Optional[float]) -> Tuple[float, float]:
+        price = limit_price or 0.99
+        return price, round(usd / price, 2)
+
+    def prepare_orders(self, orders: List[VenueOrder]):
+        """Signs a batch's orders in one go (process pool once the batch is large enough)."""
+        from services.betting_service import BettingService
+
+        expiration = BettingService.order_expiration()
+        prepared = []
+        for order in orders:
+            price, size = self._price_size(order.usd, order.limit_price)
+            try:
+                built = BettingService.build_clob_order(
+                    order.token_id, price, size, order.side, order.credentials or {}, expiration, order.client_order_id,
+                )
+            except Exception as e:
+                # Malformed key: left unsigned here, rejected by place_limit_order
+                print(f"CLOB order signing error for {order.client_order_id}: {e}")
+                continue
+            if built:
+                prepared.append((order.client_order_id, *built))
+        if not prepared:
+            return
+        from services.order_signer import sign_batch
+
+        signatures = sign_batch([(clob_order, key) for _, clob_order, key in prepared])
+        for (client_order_id, clob_order, _), signature in zip(prepared, signatures):
+            self._signed[client_order_id] = clob_order.to_api(signature)
+
+    def submit_order(
+        self,
+        account: str,
+        token_id: str,
+        side: str,
+        usd: float,
+        limit_price: Optional[float],
+        client_order_id: str,
+        credentials: Optional[Dict] = None,
+    ) -> VenueFill:
+        from services.betting_service import BettingService
+
+        price, size = self._price_size(usd, limit_price)
+        signed_order = self._signed.pop(client_order_id, None)
+        response = BettingService.place_limit_order(
+            token_id, price, size, side, credentials or {}, signed_order, client_order_id
+        )
+        if not response:
+            return VenueFill(None, 0.0, 0.0, None, "rejected")
+        # Fills arrive asynchronously on the CLOB; the order is only acknowledged here
+        return VenueFill(response.get("orderID"), 0.0, 0.0, None, "submitted")
+
+
+_Pending = Tuple[OrderIntent, float, Future]
+
+
+class ExecutionEngine:
+    _default: Optional["ExecutionEngine"] = None
+
+    def __init__(
+        self,
+        venue,
+        aggregate: bool = False,
+        batch_window: float = BATCH_WINDOW_SECONDS,
+        max_workers: int = 8,
+        rate_per_account: float = RATE_PER_ACCOUNT,
+        house_account: str = HOUSE_ACCOUNT,
+        house_credentials: Optional[Dict] = None,
+        idempotency_ttl: float = IDEMPOTENCY_TTL_SECONDS,
+        max_done_keys: int = MAX_DONE_KEYS,
+    ):
+        self.venue = venue
+        self.aggregate = aggregate
+        self.batch_window = batch_window
+        self.rate_per_account = rate_per_account
+        self.house_account = house_account
+        self.house_credentials = house_credentials
+        self.idempotency_ttl = idempotency_ttl
+        self.max_done_keys = max_done_keys
+        self.latency = LatencyHistogram()
+        self.counts = defaultdict(int)
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._futures: Dict[str, Future] = {}
+        # Executed keys in completion order (key -> finish time), for expiry
+        self._done: "OrderedDict[str, float]" = OrderedDict()
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="execution")
+        self._thread: Optional[threading.Thread] = None
+        self._started_at: Optional[float] = None
+
+    @classmethod
+    def default(cls) -> "ExecutionEngine":
+        """Process-wide engine on the EXECUTION_MODE venue, started on first use."""
+        if cls._default is None:
+            if EXECUTION_MODE == "live":
+                engine = cls(ClobVenue())
+            else:
+                from services.paper_exchange import PaperExchange
+                from services.polymarket_service import PolymarketService
+                from utils.order_book import OrderBookCache
+
+                venue = PaperExchange(book_source=lambda token_id: OrderBookCache.default().get(token_id, PolymarketService.get_order_books))
+                engine = cls(venue, aggregate=True)
+            cls._default = engine.start()
+        return cls._default
+
+    def start(self) -> "ExecutionEngine":
+        if self._thread is None:
+            self._started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="execution-dispatch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Executes everything already queued, then stops the dispatcher."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._pool.shutdown(wait=True)
+
+    def _expire_done(self, now: float):
+        """Forgets executed keys past the TTL or beyond the cap (pending keys are kept). Caller holds _lock."""
+        while self._done:
+            key, finished = next(iter(self._done.items()))
+            if now - finished < self.idempotency_ttl and len(self._done) <= self.max_done_keys:
+                break
+            self._done.popitem(last=False)
+            self._futures.pop(key, None)
+
+    def submit(self, intent: OrderIntent) -> Future:
+        with self._lock:
+            self._expire_done(time.monotonic())
+            existing = self._futures.get(intent.key)
+            if existing is not None:
+                self.counts["duplicates"] += 1
+                return existing
+            future: Future = Future()
+            self._futures[intent.key] = future
+            self.counts["intents"] += 1
+        self._queue.put((intent, time.monotonic(), future))
+        return future
+
+    def submit_many(self, intents: List[OrderIntent]) -> List[Future]:
+        return [self.submit(intent) for intent in intents]
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            window_ends = time.monotonic() + self.batch_window
+            while True:
+                remaining = window_ends - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=max(0.0, remaining)) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[_Pending]):
+        if self.aggregate:
+            grouped: Dict[Tuple, List[_Pending]] = defaultdict(list)
+            for pending in batch:
+                intent = pending[0]
+                grouped[(intent.token_id, intent.side.upper(), intent.limit_price)].append(pending)
+            groups = list(grouped.values())
+        else:
+            groups = [[pending] for pending in batch]
+        prepare = getattr(self.venue, "prepare_orders", None)
+        if prepare is not None:
+            try:
+                prepare([self._venue_order(group) for group in groups])
+            except Exception as e:
+                # submit_order still signs each order itself
+                print(f"Batch order preparation failed: {e}")
+        for group in groups:
+            self._pool.submit(self._execute, group)
+
+    def _venue_order(self, group: List[_Pending]) -> VenueOrder:
+        intents = [intent for intent, _, _ in group]
+        lead = intents[0]
+        total = sum(intent.usd for intent in intents)
+        if len(group) == 1:
+            return VenueOrder(lead.account or lead.user_id, lead.token_id, lead.side, total, lead.limit_price, lead.key, lead.credentials)
+        client_id = hashlib.sha1("|".join(sorted(i.key for i in intents)).encode()).hexdigest()
+        return VenueOrder(self.house_account, lead.token_id, lead.side, total, lead.limit_price, client_id, self.house_credentials)
+
+    def _limiter(self, account: str) -> RateLimiter:
+        with self._lock:
+            if account not in self._limiters:
+                self._limiters[account] = RateLimiter(self.rate_per_account)
+            return self._limiters[account]
+
+    def _execute(self, group: List[_Pending]):
+        intents = [intent for intent, _, _ in group]
+        order = self._venue_order(group)
+        total = order.usd
+
+        try:
+            self._limiter(order.account).wait()
+            fill = self.venue.submit_order(
+                order.account, order.token_id, order.side, total, order.limit_price, order.client_order_id, order.credentials,
+            )
+        except Exception as e:
+            print(f"Execution error on {order.token_id}: {e}")
+            with self._lock:
+                self.counts["errors"] += len(group)
+                # Released so a retry can resubmit; the client order id stays the same
+                for intent in intents:
+                    self._futures.pop(intent.key, None)
+            for _, _, future in group:
+                future.set_exception(e)
+            return
+
+        finished = time.monotonic()
+        with self._lock:
+            self.counts["venue_orders"] += 1
+            self.counts[fill.status] += len(group)
+            for intent in intents:
+                self._done[intent.key] = finished
+        for intent, enqueued, future in group:
+            share = intent.usd / total if total else 0.0
+            self.latency.observe(finished - enqueued)
+            future.set_result(ExecutionResult(
+                key=intent.key,
+                user_id=intent.user_id,
+                token_id=intent.token_id,
+                side=intent.side.upper(),
+                requested_usd=intent.usd,
+                filled_usd=fill.filled_usd * share,
+                shares=fill.shares * share,
+                avg_price=fill.avg_price,
+                status=fill.status,
+                order_id=fill.order_id,
+                batch_size=len(group),
+                latency=finished - enqueued,
+            ))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        completed = sum(counts.get(s, 0) for s in ("filled", "partial", "unfilled", "rejected", "submitted"))
+        return {
+            "venue": self.venue.name,
+            "aggregate": self.aggregate,
+            **counts,
+            "intents_per_second": round(completed / elapsed, 1) if elapsed else None,
+            "latency": self.latency.snapshot(),
+            "p50": self.latency.percentile(0.5),
+            "p90": self.latency.percentile(0.9),
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import numpy as np
+
+    from services.paper_exchange import PaperExchange
+
+    parser = argparse.ArgumentParser(description="Execution engine benchmark on the paper exchange")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--venue-latency", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=50.0, help="orders/s per account")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    def snapshot(token_id: str) -> Dict:
+        asks = [{"price": f"{0.50 + 0.002 * i:.3f}", "size": f"{rng.uniform(500, 5000):.2f}"} for i in range(100)]
+        return {"asset_id": token_id, "bids": [], "asks": asks}
+
+    tokens = [f"token-{t}" for t in range(args.tokens)]
+    intents = [
+        OrderIntent(f"user-{u}", tokens[int(rng.integers(args.tokens))], float(rng.uniform(5, 200)), limit_price=0.6, signal_id="bench")
+        for u in range(args.users)
+    ]
+
+    for aggregate in (False, True):
+        venue = PaperExchange(latency=args.venue_latency)
+        for token_id in tokens:
+            venue.load_raw(snapshot(token_id))
+        engine = ExecutionEngine(venue, aggregate=aggregate, rate_per_account=args.rate, max_workers=32).start()
+        start = time.perf_counter()
+        futures = engine.submit_many(intents)
+        results = [f.result() for f in futures]
+        elapsed = time.perf_counter() - start
+        stats = engine.stats()
+        engine.stop()
+        filled = sum(r.filled_usd for r in results)
+        print(
+            f"aggregate={aggregate}: {len(results):,} intents in {elapsed:.2f}s ({len(results) / elapsed:,.0f}/s), "
+            f"{stats['venue_orders']:,} venue orders, filled ${filled:,.0f}, "
+            f"latency p50<={stats['p50']}s p90<={stats['p90']}s"
+        )
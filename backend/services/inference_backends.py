@@ -0,0 +1,321 @@
+"""
+Pluggable inference backends.
+
+A backend turns an analysis input (PromptBuilder.build_analysis_input)
+into the model's parsed JSON prediction. MODEL_BACKEND selects one for
+in-process serving and for the model server:
+
+- "unsloth": the fine-tuned model on CUDA via ModelService (4-bit).
+- "llama_cpp": a quantized GGUF export of polyedge-model-merged on CPU
+  (optional dependency: pip install llama-cpp-python). finetune.py writes it to ./polyedge-model-gguf right
+  after the merge. Use it for CPU nodes during GPU outages, and to run the
+  real model in tests.
+- "fake": a simulated prediction, stable per input, with no weights.
+
+Backends implement load() and predict(); preload()/readiness() add the
+cold -> loading -> ready (or error) lifecycle with load timings.
+predict_signal() is the fast path: greedy, and only the numeric/enum
+fields (model_service.SIGNAL_FIELDS), stopped before the reasoning.
+
+Usage:
+    python -m services.inference_backends --benchmark --backend llama_cpp --threads 2,4,8
+    python -m services.inference_backends --benchmark --backend llama_cpp --mode both
+"""
+
+import glob
+import os
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence
+
+from services.model_service import FAST_SIGNAL, FULL_ANALYSIS, SIGNAL_STOP_KEYS, ModelService
+from utils.latency import GenerationStats
+from utils.prompt_builder import PromptBuilder
+
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "unsloth")
+GGUF_DIR = os.getenv("GGUF_DIR", "./polyedge-model-gguf")
+# Tokens llama.cpp evaluates per forward pass during prompt processing
+LLAMA_BATCH = 512
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (its affinity mask where the OS has one)."""
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+def default_threads() -> int:
+    """
+    LLAMA_THREADS, else available_cpus(). Decoding is memory bound and often
+    peaks below that (around the physical core count); the --benchmark sweep
+    finds the best value for a node.
+    """
+    if os.getenv("LLAMA_THREADS"):
+        return int(os.environ["LLAMA_THREADS"])
+    return available_cpus()
+
+
+class InferenceBackend:
+    name = "base"
+
+    def __init__(self):
+        self._readiness: Dict = {"state": "cold"}
+
+    def load(self) -> Dict:
+        """Loads (and warms) the model; returns extra timings for readiness()."""
+        raise NotImplementedError
+
+    def predict(self, input_text: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def predict_signal(self, input_text: str) -> Optional[Dict]:
+        return ModelService.signal_fields(self.predict(input_text))
+
+    def predict_mode(self, input_text: str, mode: str = FULL_ANALYSIS) -> Optional[Dict]:
+        """predict() or predict_signal(), by decode path."""
+        return self.predict_signal(input_text) if mode == FAST_SIGNAL else self.predict(input_text)
+
+    def predict_batch(self, input_texts: Sequence[str]) -> List[Optional[Dict]]:
+        return [self.predict(text) for text in input_texts]
+
+    def preload(self) -> Dict:
+        self._readiness = {"state": "loading"}
+        started = time.monotonic()
+        try:
+            timings = self.load() or {}
+            self._readiness = {"state": "ready", "load_seconds": round(time.monotonic() - started, 2), **timings}
+        except Exception as e:
+            print(f"Model load failed ({self.name}): {e}")
+            self._readiness = {"state": "error", "error": str(e)}
+        return self.readiness()
+
+    def readiness(self) -> Dict:
+        return {"backend": self.name, **self._readiness}
+
+
+class FakeModelBackend(InferenceBackend):
+    """Simulated predictions, stable per input, for running without weights or a GPU."""
+
+    name = "fake"
+
+    def __init__(self, latency: float = float(os.getenv("FAKE_MODEL_LATENCY", "0")), load_seconds: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.load_seconds = load_seconds
+
+    def load(self) -> Dict:
+        time.sleep(self.load_seconds)
+        started = time.monotonic()
+        self.predict("warmup")
+        return {"warmup_seconds": {"fake": round(time.monotonic() - started, 2)}}
+
+    def predict(self, input_text: str) -> Dict:
+        time.sleep(self.latency)
+        fair = 0.3 + (zlib.crc32(input_text.encode()) % 400) / 1000
+        return {
+            "market_probability": 0.5,
+            "fair_probability": round(fair, 3),
+            "edge_percentage": round((fair - 0.5) * 100, 1),
+            "action": "BUY_YES" if fair > 0.55 else "BUY_NO" if fair < 0.45 else "HOLD",
+            "confidence": 75,
+            "edge_quality": "Simulated",
+            "signal_agreement": "Simulated",
+            "reasoning": "Simulated prediction from the fake model backend.",
+            "key_signals": [],
+            "risk_factors": [],
+        }
+
+
+class UnslothBackend(InferenceBackend):
+    """The fine-tuned model on CUDA through ModelService, which keeps its own load/warmup state."""
+
+    name = "unsloth"
+
+    def preload(self) -> Dict:
+        ModelService.preload()
+        return self.readiness()
+
+    def readiness(self) -> Dict:
+        return {"backend": self.name, **ModelService.readiness()}
+
+    def predict(self, input_text: str) -> Optional[Dict]:
+        return ModelService.predict_edge(input_text)
+
+    def predict_signal(self, input_text: str) -> Optional[Dict]:
+        return ModelService.predict_signal(input_text)
+
+
+class LlamaCppBackend(InferenceBackend):
+    """
+    Quantized GGUF model on CPU through llama.cpp.
+
+    n_threads drives token generation and n_threads_batch drives prompt
+    processing. Prompt processing is compute bound and can use every core
+    the process is allowed on.
+    """
+
+    name = "llama_cpp"
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        n_threads: Optional[int] = None,
+        n_threads_batch: Optional[int] = None,
+        n_batch: int = LLAMA_BATCH,
+        n_ctx: int = ModelService.MAX_SEQ_LENGTH,
+        max_new_tokens: int = ModelService.MAX_NEW_TOKENS,
+    ):
+        super().__init__()
+        self.model_path = model_path or os.getenv("GGUF_PATH")
+        self.n_threads = n_threads or default_threads()
+        self.n_threads_batch = n_threads_batch or available_cpus()
+        self.n_batch = n_batch
+        self.n_ctx = n_ctx
+        self.max_new_tokens = max_new_tokens
+        self._llm = None
+        self._decode_stats = {FULL_ANALYSIS: GenerationStats(), FAST_SIGNAL: GenerationStats()}
+        # A llama.cpp context decodes one sequence at a time
+        self._lock = threading.Lock()
+
+    def resolve_path(self) -> str:
+        if self.model_path:
+            return self.model_path
+        exports = sorted(glob.glob(os.path.join(GGUF_DIR, "*.gguf")))
+        if not exports:
+            raise FileNotFoundError(f"No GGUF export in {GGUF_DIR} (finetune.py writes one after the merge; or set GGUF_PATH)")
+        return exports[0]
+
+    def load(self) -> Dict:
+        from llama_cpp import Llama
+
+        path = self.resolve_path()
+        print(f"Loading GGUF model {path} ({self.n_threads} decode / {self.n_threads_batch} prompt threads)...")
+        self._llm = Llama(
+            model_path=path,
+            n_ctx=self.n_ctx,
+            n_threads=self.n_threads,
+            n_threads_batch=self.n_threads_batch,
+            n_batch=self.n_batch,
+            verbose=False,
+        )
+        warmup = {}
+        for tokens in ModelService.WARMUP_PROMPT_TOKENS:
+            started = time.monotonic()
+            self.complete(ModelService.warmup_input(tokens), max_tokens=ModelService.WARMUP_NEW_TOKENS)
+            warmup[str(tokens)] = round(time.monotonic() - started, 2)
+        return {"model_path": path, "n_threads": self.n_threads, "warmup_seconds": warmup}
+
+    def readiness(self) -> Dict:
+        return {**super().readiness(), "decode": {mode: stats.snapshot() for mode, stats in self._decode_stats.items()}}
+
+    def complete(self, input_text: str, max_tokens: Optional[int] = None, mode: Optional[str] = None) -> Dict:
+        """
+        Raw llama.cpp completion (text and token usage) for one analysis input.
+        FAST_SIGNAL decodes greedily and stops before the first key after the
+        signal fields; requests with a mode are counted in readiness().
+        """
+        # llama.cpp adds BOS itself when tokenizing
+        prompt = PromptBuilder.format_model_prompt(input_text).removeprefix("<|begin_of_text|>")
+        stop = ["<|eot_id|>"]
+        if mode == FAST_SIGNAL:
+            stop += [f'"{key}"' for key in SIGNAL_STOP_KEYS]
+        with self._lock:
+            started = time.monotonic()
+            output = self._llm(
+                prompt,
+                max_tokens=max_tokens or self.max_new_tokens,
+                temperature=0.0 if mode == FAST_SIGNAL else 0.1,
+                stop=stop,
+            )
+            elapsed = time.monotonic() - started
+        usage = output.get("usage", {})
+        if mode is not None:
+            self._decode_stats[mode].observe(elapsed, usage.get("completion_tokens", 0))
+        return {"text": output["choices"][0]["text"], "usage": usage}
+
+    def predict(self, input_text: str) -> Optional[Dict]:
+        try:
+            return ModelService.parse_completion(self.complete(input_text, mode=FULL_ANALYSIS)["text"])
+        except ValueError as e:
+            print(f"Error parsing llama.cpp prediction: {e}")
+            return None
+
+    def predict_signal(self, input_text: str) -> Optional[Dict]:
+        try:
+            text = self.complete(input_text, max_tokens=ModelService.SIGNAL_NEW_TOKENS, mode=FAST_SIGNAL)["text"]
+            return ModelService.parse_signal(text)
+        except ValueError as e:
+            print(f"Error parsing llama.cpp signal: {e}")
+            return None
+
+    def predict_batch(self, input_texts: Sequence[str]) -> List[Optional[Dict]]:
+        """
+        The bindings decode one sequence at a time, so a batch runs back to
+        back on one context. The prompts are sorted first: llama.cpp keeps the
+        KV cache of the longest prefix shared with the previous prompt, so
+        neighbouring prompts for the same market skip most of their prompt
+        processing.
+        """
+        order = sorted(range(len(input_texts)), key=lambda i: input_texts[i])
+        results: List[Optional[Dict]] = [None] * len(input_texts)
+        for i in order:
+            results[i] = self.predict(input_texts[i])
+        return results
+
+
+BACKENDS = {"unsloth": UnslothBackend, "llama_cpp": LlamaCppBackend, "fake": FakeModelBackend}
+_instances: Dict[str, InferenceBackend] = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name: Optional[str] = None) -> InferenceBackend:
+    """Process-wide instance of the named backend (MODEL_BACKEND by default)."""
+    name = name or MODEL_BACKEND
+    with _instances_lock:
+        if name not in _instances:
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown MODEL_BACKEND {name!r} (expected one of {', '.join(BACKENDS)})")
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inference backend throughput, and a llama.cpp thread sweep")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--backend", default=MODEL_BACKEND, choices=sorted(BACKENDS))
+    parser.add_argument("--threads", default="", help="comma-separated decode thread counts to try (llama_cpp)")
+    parser.add_argument("--prompts", type=int, default=4)
+    parser.add_argument("--prompt-tokens", type=int, default=1024)
+    parser.add_argument("--mode", default=FULL_ANALYSIS, choices=[FULL_ANALYSIS, FAST_SIGNAL, "both"],
+                        help="decode path(s) to time: full analysis and/or the fast signal")
+    args = parser.parse_args()
+    modes = [FULL_ANALYSIS, FAST_SIGNAL] if args.mode == "both" else [args.mode]
+
+    inputs = [ModelService.warmup_input(args.prompt_tokens).replace("warmup market", f"market #{i}") for i in range(args.prompts)]
+    if args.backend == "llama_cpp":
+        sweep = [int(t) for t in args.threads.split(",") if t] or [default_threads()]
+        for threads in sweep:
+            backend = LlamaCppBackend(n_threads=threads)
+            backend.preload()
+            for mode in modes:
+                started = time.perf_counter()
+                for text in inputs:
+                    backend.predict_mode(text, mode)
+                elapsed = time.perf_counter() - started
+                stats = backend.readiness()["decode"][mode]
+                print(
+                    f"n_threads={threads:>3} {mode:>6}: {stats['tokens_per_second']} tokens/s, "
+                    f"{elapsed / len(inputs):.2f}s and {stats['tokens_per_request']} tokens per prompt "
+                    f"(load {backend.readiness().get('load_seconds')}s)"
+                )
+    else:
+        backend = BACKENDS[args.backend]()
+        print(backend.preload())
+        for mode in modes:
+            started = time.perf_counter()
+            for text in inputs:
+                backend.predict_mode(text, mode)
+            print(f"{args.backend} {mode}: {(time.perf_counter() - started) / len(inputs):.3f}s per prompt")
+        print(backend.readiness().get("decode"))
@@ -0,0 +1,232 @@
+"""
+Priority scheduler in front of model inference.
+
+Jobs are submitted to a lane: "interactive" (a user waiting on
+/analyze-url) or "background" (scans). A fixed set of worker threads, one
+per inference slot, always takes the head job of the lane with the best
+effective priority:
+
+    lane.priority - aging_rate * seconds_the_head_job_has_waited
+
+Lower is better. Interactive jobs therefore go ahead of any queued scan
+work, and background jobs fill the slots whenever no user is waiting. A
+background job that has waited long enough outranks new interactive
+work, so a steady stream of users can't starve scans.
+
+A running generate() is never interrupted, so a user arriving while scans
+hold every slot waits out a whole background generation. With more than
+one slot the background lane therefore defaults to slots - 1, keeping one
+slot free for interactive work.
+
+Each lane has its own concurrency limit and queue depth limit. A full
+lane raises QueueFull rather than growing without bound. Queue wait and
+run time are recorded per lane.
+
+Usage:
+    python -m services.inference_queue --benchmark   (from backend/)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from utils.latency import LatencyHistogram
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+INFERENCE_SLOTS = int(os.getenv("INFERENCE_SLOTS", "1"))
+# Seconds of waiting worth one priority point
+AGING_RATE = 0.1
+
+
+class QueueFull(Exception):
+    """The lane already holds max_depth queued jobs."""
+
+
+@dataclass
+class LaneConfig:
+    priority: float
+    max_concurrency: int
+    max_depth: int
+
+
+def default_lanes(slots: int = INFERENCE_SLOTS) -> Dict[str, LaneConfig]:
+    return {
+        INTERACTIVE: LaneConfig(priority=0.0, max_concurrency=slots, max_depth=32),
+        # ~100s of waiting before a scan job outranks a fresh user request. One
+        # slot is reserved for users when there is more than one.
+        BACKGROUND: LaneConfig(priority=10.0, max_concurrency=max(1, slots - 1), max_depth=500),
+    }
+
+
+DEFAULT_LANES = default_lanes()
+
+
+@dataclass
+class _Lane:
+    config: LaneConfig
+    queue: Deque[Tuple[float, Callable, tuple, dict, Future]] = field(default_factory=deque)
+    running: int = 0
+    submitted: int = 0
+    completed: int = 0
+    rejected: int = 0
+    wait: LatencyHistogram = field(default_factory=LatencyHistogram)
+    run: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+
+class InferenceScheduler:
+    _default: Optional["InferenceScheduler"] = None
+
+    def __init__(self, slots: int = INFERENCE_SLOTS, lanes: Optional[Dict[str, LaneConfig]] = None, aging_rate: float = AGING_RATE):
+        self.slots = slots
+        self.aging_rate = aging_rate
+        self._lanes = {name: _Lane(config) for name, config in (lanes or default_lanes(slots)).items()}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._workers = [
+            threading.Thread(target=self._work, name=f"inference-{i}", daemon=True) for i in range(slots)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @classmethod
+    def default(cls) -> "InferenceScheduler":
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def submit(self, lane: str, fn: Callable, *args, **kwargs) -> Future:
+        future: Future = Future()
+        with self._cond:
+            state = self._lanes[lane]
+            if len(state.queue) >= state.config.max_depth:
+                state.rejected += 1
+                raise QueueFull(f"{lane} queue is full ({state.config.max_depth} jobs)")
+            state.queue.append((time.monotonic(), fn, args, kwargs, future))
+            state.submitted += 1
+            self._cond.notify()
+        return future
+
+    def run(self, lane: str, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Submits and waits for the result."""
+        return self.submit(lane, fn, *args, **kwargs).result(timeout=timeout)
+
+    def _pick(self) -> Optional[Tuple[str, _Lane]]:
+        """Lane whose head job has the best aged priority and a free concurrency slot."""
+        now = time.monotonic()
+        best = None
+        for name, state in self._lanes.items():
+            if not state.queue or state.running >= state.config.max_concurrency:
+                continue
+            score = state.config.priority - self.aging_rate * (now - state.queue[0][0])
+            if best is None or score < best[0]:
+                best = (score, name, state)
+        return (best[1], best[2]) if best else None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                picked = self._pick()
+                while picked is None and not self._stopped:
+                    self._cond.wait()
+                    picked = self._pick()
+                if picked is None:
+                    return
+                name, state = picked
+                enqueued, fn, args, kwargs, future = state.queue.popleft()
+                state.running += 1
+            started = time.monotonic()
+            state.wait.observe(started - enqueued)
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                state.run.observe(time.monotonic() - started)
+                with self._cond:
+                    state.running -= 1
+                    state.completed += 1
+                    # A lane at its concurrency cap may have become eligible again
+                    self._cond.notify_all()
+
+    def shutdown(self):
+        """Lets the workers finish everything queued, then stops them."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._cond:
+            snapshot = {
+                name: {
+                    "queued": len(state.queue),
+                    "running": state.running,
+                    "submitted": state.submitted,
+                    "completed": state.completed,
+                    "rejected": state.rejected,
+                }
+                for name, state in self._lanes.items()
+            }
+        for name, state in self._lanes.items():
+            snapshot[name].update(
+                wait_p50=state.wait.percentile(0.5),
+                wait_p95=state.wait.percentile(0.95),
+                wait=state.wait.snapshot(),
+                run=state.run.snapshot(),
+            )
+        return snapshot
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Interactive latency under a background scan")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--scan-jobs", type=int, default=200)
+    parser.add_argument("--job-seconds", type=float, default=0.05)
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--slots", type=int, default=2)
+    args = parser.parse_args()
+
+    def job():
+        time.sleep(args.job_seconds)
+        return time.monotonic()
+
+    def measure(lanes: Dict[str, LaneConfig]) -> List[float]:
+        """Users arrive every two job lengths while the whole scan is queued."""
+        scheduler = InferenceScheduler(slots=args.slots, lanes=lanes)
+        for _ in range(args.scan_jobs):
+            scheduler.submit(BACKGROUND, job)
+        users = []
+        for _ in range(args.users):
+            time.sleep(args.job_seconds * 2)
+            users.append((time.monotonic(), scheduler.submit(INTERACTIVE, job)))
+        waits = []
+        for submitted, future in users:
+            waits.append(future.result() - submitted - args.job_seconds)
+        scheduler.shutdown()
+        return sorted(waits)
+
+    slots = args.slots
+    fifo = {INTERACTIVE: LaneConfig(0.0, slots, 10_000), BACKGROUND: LaneConfig(0.0, slots, 10_000)}
+    # Priority lanes where scans may take every slot
+    shared = {**default_lanes(slots), BACKGROUND: LaneConfig(10.0, slots, 500)}
+    configs = [("single FIFO", fifo), ("priority lanes", shared)]
+    if slots > 1:
+        configs.append(("+ 1 reserved", default_lanes(slots)))
+    for label, lanes in configs:
+        waits = measure(lanes)
+        p50, p95 = waits[len(waits) // 2], waits[int(len(waits) * 0.95) - 1]
+        print(
+            f"{label:>15}: interactive wait p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms "
+            f"({slots} slots, job = {args.job_seconds * 1000:.0f} ms)"
+        )
@@ -0,0 +1,133 @@
+"""
+Client side of the model server (backend/model_server.py).
+
+With MODEL_SERVING=server, API workers and the scanner worker hold no
+model. They send prompts to the model server over a local Unix socket,
+and the server runs every request through its own InferenceScheduler. One
+copy of the weights then serves every process, and lane priorities hold
+across all of them.
+
+With MODEL_SERVING=local (the default), inference runs in-process on the
+MODEL_BACKEND backend (services/inference_backends.py).
+
+Messages are JSON over a multiprocessing connection authenticated with
+MODEL_SERVER_AUTHKEY. Each call opens its own connection, so a restarted
+server is picked up without any reconnect logic.
+"""
+
+import json
+import os
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+from pathlib import Path
+from typing import Dict, Optional
+
+from services.inference_queue import BACKGROUND, InferenceScheduler, QueueFull
+from services.model_service import FULL_ANALYSIS
+
+MODEL_SERVING = os.getenv("MODEL_SERVING", "local")
+SOCKET_PATH = Path(os.getenv("MODEL_SERVER_SOCKET", Path(__file__).parent.parent / "data" / "model_server.sock"))
+AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "polyedge-local").encode()
+# Bumped whenever request or response fields change
+PROTOCOL_VERSION = 2
+REQUEST_TIMEOUT = 300.0
+
+
+class ModelUnavailable(Exception):
+    """The model server is not running, not ready yet, or speaks another protocol."""
+
+
+class ModelClient:
+    _default: Optional["ModelClient"] = None
+
+    def __init__(self, socket_path: Path = SOCKET_PATH, authkey: bytes = AUTHKEY, timeout: float = REQUEST_TIMEOUT):
+        self.socket_path = Path(socket_path)
+        self.authkey = authkey
+        self.timeout = timeout
+
+    @classmethod
+    def default(cls) -> "ModelClient":
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def _call(self, request: Dict) -> Dict:
+        try:
+            conn = Client(str(self.socket_path), family="AF_UNIX", authkey=self.authkey)
+        except (OSError, EOFError, AuthenticationError) as e:
+            raise ModelUnavailable(f"model server unreachable at {self.socket_path}: {e}")
+        try:
+            conn.send_bytes(json.dumps(request).encode())
+            if not conn.poll(self.timeout):
+                raise ModelUnavailable(f"no response from model server within {self.timeout:g}s")
+            return json.loads(conn.recv_bytes())
+        except (OSError, EOFError) as e:
+            raise ModelUnavailable(f"model server connection lost: {e}")
+        finally:
+            conn.close()
+
+    def health(self) -> Dict:
+        """Server handshake: state is loading, ready or error ('offline' when unreachable)."""
+        try:
+            status = self._call({"op": "health", "protocol": PROTOCOL_VERSION})
+        except ModelUnavailable as e:
+            return {"state": "offline", "error": str(e)}
+        if status.get("protocol") != PROTOCOL_VERSION:
+            return {"state": "error", "error": f"protocol {status.get('protocol')} != {PROTOCOL_VERSION}"}
+        return status
+
+    def wait_ready(self, timeout: float = 60.0, interval: float = 0.25) -> Dict:
+        """Polls health until the server is ready (returns the last status either way)."""
+        deadline = time.monotonic() + timeout
+        status = self.health()
+        while status.get("state") != "ready" and time.monotonic() < deadline:
+            time.sleep(interval)
+            status = self.health()
+        return status
+
+    def predict_edge(self, input_text: str, lane: str = BACKGROUND, mode: str = FULL_ANALYSIS) -> Optional[Dict]:
+        response = self._call({"op": "predict", "input": input_text, "lane": lane, "mode": mode})
+        error = response.get("error")
+        if error == "queue_full":
+            raise QueueFull(response.get("detail", f"{lane} queue is full"))
+        if error:
+            raise ModelUnavailable(response.get("detail", error))
+        return response.get("result")
+
+    def stats(self) -> Dict:
+        return self._call({"op": "stats"})
+
+
+def predict_edge(input_text: str, lane: str = BACKGROUND, mode: str = FULL_ANALYSIS) -> Optional[Dict]:
+    """
+    Runs on the model server when MODEL_SERVING=server, otherwise in this
+    process. `mode` is FULL_ANALYSIS or FAST_SIGNAL (numeric/enum fields only).
+    """
+    if MODEL_SERVING == "server":
+        return ModelClient.default().predict_edge(input_text, lane, mode)
+    from services.inference_backends import get_backend
+    return InferenceScheduler.default().run(lane, get_backend().predict_mode, input_text, mode)
+
+
+def start_preload():
+    """Loads and warms the in-process model in the background (the model server does its own)."""
+    if MODEL_SERVING == "server":
+        return
+    from services.inference_backends import get_backend
+    threading.Thread(target=get_backend().preload, name="model-preload", daemon=True).start()
+
+
+def readiness() -> Dict:
+    """state is "ready" once inference is loaded and warm, wherever it runs."""
+    if MODEL_SERVING == "server":
+        return {"mode": "server", **ModelClient.default().health()}
+    from services.inference_backends import get_backend
+    return {"mode": "local", **get_backend().readiness()}
+
+
+def serving_status() -> Dict:
+    if MODEL_SERVING == "server":
+        return readiness()
+    return {**readiness(), "inference_queue": InferenceScheduler.default().stats()}
@@ -1,27 +1,169 @@
 import json
-import torch
-from unsloth import FastLanguageModel
+import os
+import threading
+import time
 from typing import Dict, Optional
+from utils.latency import GenerationStats
+from utils.prompt_builder import PromptBuilder
+from utils.token_counter import TokenCounter
+
+# Decode paths: the full analysis, or only the numeric/enum head of the answer
+FULL_ANALYSIS = "full"
+FAST_SIGNAL = "signal"
+# Fields of the fast signal; they come first in the model's answer
+SIGNAL_FIELDS = ("market_probability", "fair_probability", "edge_percentage", "action", "confidence", "edge_quality")
+# Keys that follow the signal fields; the fast path stops at the first one
+SIGNAL_STOP_KEYS = ("signal_agreement", "reasoning", "key_signals", "ignored_signals", "risk_factors")
+ASSISTANT_HEADER = "<|start_header_id|>assistant<|end_header_id|>\n\n"
 
 class ModelService:
     _model = None
     _tokenizer = None
+    _token_counter = None
     MODEL_PATH = "./polyedge-model"
-    MAX_SEQ_LENGTH = 2048
+    MAX_SEQ_LENGTH = PromptBuilder.MAX_SEQ_LENGTH
+    MAX_NEW_TOKENS = PromptBuilder.RESPONSE_TOKENS
+    # The signal fields take about 60 tokens; the cap only bounds a runaway answer
+    SIGNAL_NEW_TOKENS = 96
+    # Prompt lengths warmed up at startup: short, typical and a full context window
+    WARMUP_PROMPT_TOKENS = (256, 1024, MAX_SEQ_LENGTH - MAX_NEW_TOKENS)
+    WARMUP_NEW_TOKENS = 16
+    # "sample" (temperature 0.1) or "speculative" (greedy, prompt-lookup drafts verified in parallel)
+    DECODE_MODE = os.getenv("DECODE_MODE", "sample")
+    _speculative_stats = None
+    _decode_stats = {FULL_ANALYSIS: GenerationStats(), FAST_SIGNAL: GenerationStats()}
+    _load_lock = threading.Lock()
+    _readiness: Dict = {"state": "cold"}
 
     @classmethod
     def load_model(cls):
         """Loads the fine-tuned model and tokenizer if not already loaded."""
-        if cls._model is None:
-            print(f"Loading PolyEdge model from {cls.MODEL_PATH}...")
-            cls._model, cls._tokenizer = FastLanguageModel.from_pretrained(
-                model_name=cls.MODEL_PATH,
-                max_seq_length=cls.MAX_SEQ_LENGTH,
-                load_in_4bit=True,
-            )
-            FastLanguageModel.for_inference(cls._model)
+        with cls._load_lock:
+            if cls._model is None:
+                # Heavy (torch, CUDA init); only processes that actually run the model pay for it
+                from unsloth import FastLanguageModel
+
+                print(f"Loading PolyEdge model from {cls.MODEL_PATH}...")
+                cls._model, cls._tokenizer = FastLanguageModel.from_pretrained(
+                    model_name=cls.MODEL_PATH,
+                    max_seq_length=cls.MAX_SEQ_LENGTH,
+                    load_in_4bit=True,
+                )
+                FastLanguageModel.for_inference(cls._model)
         return cls._model, cls._tokenizer
 
+    @classmethod
+    def warmup_input(cls, prompt_tokens: int) -> str:
+        """A synthetic analysis input whose full prompt is about `prompt_tokens` tokens long."""
+        counter = cls.get_token_counter()
+        header = PromptBuilder.build_analysis_input(
+            "Will the warmup market resolve YES?", 0.5, 100_000.0, "TIER 1: VERIFIED SOURCES\n"
+        )
+        line = "- [reuters.com] Officials comment on the outlook ahead of the scheduled decision\n"
+        base = counter.count_prompt(PromptBuilder.format_model_prompt(header))
+        return header + line * max(0, (prompt_tokens - base) // max(1, counter.count(line)))
+
+    @classmethod
+    def preload(cls, prompt_tokens=WARMUP_PROMPT_TOKENS) -> Dict:
+        """
+        Loads the model, then runs a short generation at each prompt length so
+        CUDA kernels and allocator pools are ready before the first request.
+        Progress and timings are kept in readiness().
+        """
+        if not os.path.exists(cls.MODEL_PATH):
+            cls._readiness = {"state": "ready", "simulated": True}
+            return cls.readiness()
+        try:
+            cls._readiness = {"state": "loading"}
+            started = time.monotonic()
+            cls.load_model()
+            cls._readiness = {"state": "warming", "load_seconds": round(time.monotonic() - started, 2), "warmup_seconds": {}}
+            for tokens in prompt_tokens:
+                warm_start = time.monotonic()
+                cls._generate(cls.warmup_input(tokens), cls.WARMUP_NEW_TOKENS)
+                cls._readiness["warmup_seconds"][str(tokens)] = round(time.monotonic() - warm_start, 2)
+            cls._readiness["state"] = "ready"
+            print(f"Model ready: loaded in {cls._readiness['load_seconds']}s, warmup {cls._readiness['warmup_seconds']}")
+        except Exception as e:
+            print(f"Model preload failed: {e}")
+            cls._readiness = {**cls._readiness, "state": "error", "error": str(e)}
+        return cls.readiness()
+
+    @classmethod
+    def readiness(cls) -> Dict:
+        """cold -> loading -> warming -> ready (or error), with load and warmup timings."""
+        readiness = {**cls._readiness, "decode_mode": cls.DECODE_MODE}
+        if cls._speculative_stats is not None:
+            readiness["speculative"] = cls._speculative_stats.as_dict()
+        readiness["decode"] = {mode: stats.snapshot() for mode, stats in cls._decode_stats.items()}
+        return readiness
+
+    @classmethod
+    def get_token_counter(cls) -> TokenCounter:
+        """Exact counts from the model tokenizer when available, estimates otherwise."""
+        if cls._token_counter is None or (cls._tokenizer is not None and not cls._token_counter.exact):
+            if cls._tokenizer is not None:
+                cls._token_counter = TokenCounter(cls._tokenizer)
+            elif os.path.exists(cls.MODEL_PATH):
+                cls._token_counter = TokenCounter.from_pretrained(cls.MODEL_PATH)
+            else:
+                cls._token_counter = TokenCounter()
+        return cls._token_counter
+
+    @classmethod
+    def _generate(cls, input_text: str, max_new_tokens: int, mode: Optional[str] = None) -> str:
+        """
+        Decoded prompt + completion for one analysis input. FAST_SIGNAL decodes
+        greedily and stops at the first key after the signal fields. Requests
+        with a mode (warmup has none) are counted in readiness()["decode"].
+        """
+        import torch
+
+        model, tokenizer = cls.load_model()
+        
+        # Format matching the training prompt
+        prompt = PromptBuilder.format_model_prompt(input_text)
+        
+        # The template already starts with <|begin_of_text|> (same layout as training/pretokenize.py)
+        inputs = tokenizer(prompt, return_tensors="pt", add_special_tokens=False).to(model.device)
+        prompt_length = inputs["input_ids"].shape[1]
+        started = time.monotonic()
+        
+        if mode == FAST_SIGNAL:
+            with torch.no_grad():
+                output_ids = model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=False,
+                    stop_strings=[f'"{key}"' for key in SIGNAL_STOP_KEYS],
+                    tokenizer=tokenizer,
+                    pad_token_id=tokenizer.eos_token_id,
+                )[0].tolist()
+        elif cls.DECODE_MODE == "speculative":
+            from utils.speculative import SpeculativeStats, skeleton_drafter, speculative_generate
+
+            generated, stats = speculative_generate(
+                model, inputs["input_ids"], max_new_tokens, skeleton_drafter(tokenizer),
+                stop_token_ids=(tokenizer.eos_token_id, tokenizer.convert_tokens_to_ids("<|eot_id|>")),
+            )
+            if cls._speculative_stats is None:
+                cls._speculative_stats = SpeculativeStats()
+            cls._speculative_stats.add(stats)
+            output_ids = inputs["input_ids"][0].tolist() + generated
+        else:
+            with torch.no_grad():
+                output_ids = model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    temperature=0.1,
+                    do_sample=True,
+                    pad_token_id=tokenizer.eos_token_id,
+                )[0].tolist()
+        
+        if mode is not None:
+            cls._decode_stats[mode].observe(time.monotonic() - started, len(output_ids) - prompt_length)
+        return tokenizer.decode(output_ids, skip_special_tokens=False)
+
     @classmethod
     def predict_edge(cls, input_text: str) -> Optional[Dict]:
         """
@@ -43,43 +185,66 @@ class ModelService:
                 "risk_factors": ["Liquidity Depth"]
             }
 
-        model, tokenizer = cls.load_model()
+        response = cls._generate(input_text, cls.MAX_NEW_TOKENS, FULL_ANALYSIS)
         
-        # Format matching the training prompt
-        prompt = f"""<|begin_of_text|><|start_header_id|>user<|end_header_id|>
+        # Extract the assistant's response
+        try:
+            return cls.parse_completion(response.split(ASSISTANT_HEADER)[1])
+        except Exception as e:
+            print(f"Error during model prediction/parsing: {e}")
+            return None
 
-{input_text}
+    @classmethod
+    def predict_signal(cls, input_text: str) -> Optional[Dict]:
+        """
+        Fast signal: only SIGNAL_FIELDS, decoded greedily (same input, same
+        answer) and stopped before the reasoning. Used for teasers, where the
+        reasoning would be thrown away.
+        """
+        if not os.path.exists(cls.MODEL_PATH):
+            return cls.signal_fields(cls.predict_edge(input_text))
 
-RESPONSE FORMAT (JSON ONLY):
-- "market_probability", "fair_probability", "edge_percentage"
-- "action", "confidence", "edge_quality", "signal_agreement"
-- "reasoning", "key_signals", "ignored_signals", "risk_factors"
-<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+        response = cls._generate(input_text, cls.SIGNAL_NEW_TOKENS, FAST_SIGNAL)
+        try:
+            return cls.parse_signal(response.split(ASSISTANT_HEADER)[1])
+        except Exception as e:
+            print(f"Error during signal prediction/parsing: {e}")
+            return None
 
-"""
-        
-        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-        
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=500,
-                temperature=0.1,
-                do_sample=True,
-                pad_token_id=tokenizer.eos_token_id,
-            )
+    @staticmethod
+    def parse_completion(completion: str) -> Dict:
+        """The assistant's JSON (text up to <|eot_id|>) as a dict; raises ValueError if it isn't JSON."""
+        model_response = completion.split("<|eot_id|>")[0].strip()
         
-        response = tokenizer.decode(outputs[0], skip_special_tokens=False)
+        # Basic cleanup
+        model_response = model_response.replace("True", "true").replace("False", "false")
         
-        # Extract the assistant's response
-        try:
-            model_response = response.split("<|start_header_id|>assistant<|end_header_id|>\n\n")[1]
-            model_response = model_response.split("<|eot_id|>")[0].strip()
-            
-            # Basic cleanup
-            model_response = model_response.replace("True", "true").replace("False", "false")
-            
-            return json.loads(model_response)
-        except Exception as e:
-            print(f"Error during model prediction/parsing: {e}")
+        return json.loads(model_response)
+
+    @staticmethod
+    def signal_fields(prediction: Optional[Dict]) -> Optional[Dict]:
+        """The SIGNAL_FIELDS of a prediction (None stays None)."""
+        if prediction is None:
             return None
+        return {field: prediction.get(field) for field in SIGNAL_FIELDS}
+
+    @classmethod
+    def parse_signal(cls, completion: str) -> Dict:
+        """
+        SIGNAL_FIELDS from a completion cut short at (or just before) the
+        first SIGNAL_STOP_KEYS key; the JSON object is closed after the last
+        complete field. When SIGNAL_NEW_TOKENS ran out first, the last field
+        may be cut mid-value and is dropped (missing fields come back None).
+        Full completions parse too.
+        """
+        text = completion.split("<|eot_id|>")[0]
+        cuts = [i for i in (text.find(f'"{key}"') for key in SIGNAL_STOP_KEYS) if i >= 0]
+        if cuts:
+            text = text[:min(cuts)]
+        text = text.strip()
+        if not text.endswith("}"):
+            # A stop key (or llama.cpp's trailing comma) means the last field is whole
+            if not cuts and not text.endswith(","):
+                text = text[:max(text.rfind(","), text.find("{") + 1)]
+            text = text.rstrip().rstrip(",").rstrip() + "}"
+        return cls.signal_fields(cls.parse_completion(text))
@@ -0,0 +1,301 @@
+"""
+EIP-712 signing for Polymarket CTF Exchange orders.
+
+The generic eth_account path (encode_typed_data + sign_message) re-parses
+the type definitions and recomputes the domain separator for every order.
+This module avoids that work:
+- The Order type hash is computed once at import.
+- Domain separators are computed once per (exchange, chain) and cached.
+- An order's struct hash is one keccak over 13 fixed 32-byte words.
+- Signers are loaded once per private key and reused, in every process.
+
+sign_batch spreads large batches over a process pool (secp256k1 signing
+is CPU-bound). The execution engine's ClobVenue signs every batch flush
+through it, on the engine's dispatcher thread.
+
+eth_keys signs with coincurve when it is installed (much faster) and
+falls back to its pure-Python backend otherwise.
+
+Usage:
+    python -m services.order_signer --benchmark   (from backend/)
+"""
+
+import atexit
+import multiprocessing
+import os
+import secrets
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from eth_keys import keys
+from eth_utils import keccak, to_canonical_address, to_checksum_address
+
+CHAIN_ID = 137
+CTF_EXCHANGE = "0x4bFb41d5B3570DeFd03C39a9A4D8dE6Bd8B8982E"
+NEG_RISK_CTF_EXCHANGE = "0xC5d563A36AE78145C45a50134d48A1215220f80a"
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+DOMAIN_NAME = "Polymarket CTF Exchange"
+DOMAIN_VERSION = "1"
+ORDER_TYPE = (
+    "Order(uint256 salt,address maker,address signer,address taker,uint256 tokenId,uint256 makerAmount,"
+    "uint256 takerAmount,uint256 expiration,uint256 nonce,uint256 feeRateBps,uint8 side,uint8 signatureType)"
+)
+ORDER_TYPEHASH = keccak(text=ORDER_TYPE)
+DOMAIN_TYPEHASH = keccak(text="EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)")
+
+BUY = 0
+SELL = 1
+# signatureType: 0 = EOA, 1 = Polymarket proxy, 2 = Gnosis safe
+EOA = 0
+# USDC and conditional tokens both use 6 decimals
+AMOUNT_DECIMALS = 10 ** 6
+
+# Batches smaller than this are signed in-process (pool overhead dominates)
+MIN_POOL_BATCH = 64
+
+
+def _word(value: int) -> bytes:
+    return value.to_bytes(32, "big")
+
+
+def _address_word(address: str) -> bytes:
+    return b"\x00" * 12 + to_canonical_address(address)
+
+
+@lru_cache(maxsize=None)
+def domain_separator(exchange: str = CTF_EXCHANGE, chain_id: int = CHAIN_ID) -> bytes:
+    return keccak(
+        DOMAIN_TYPEHASH
+        + keccak(text=DOMAIN_NAME)
+        + keccak(text=DOMAIN_VERSION)
+        + _word(chain_id)
+        + _address_word(exchange)
+    )
+
+
+@dataclass(frozen=True)
+class ClobOrder:
+    salt: int
+    maker: str
+    signer: str
+    taker: str
+    token_id: int
+    maker_amount: int
+    taker_amount: int
+    expiration: int
+    nonce: int
+    fee_rate_bps: int
+    side: int
+    signature_type: int = EOA
+
+    @classmethod
+    def limit(
+        cls,
+        maker: str,
+        token_id: str,
+        price: float,
+        size: float,
+        side: str,
+        signer: Optional[str] = None,
+        expiration: int = 0,
+        nonce: int = 0,
+        fee_rate_bps: int = 0,
+        salt: Optional[int] = None,
+    ) -> "ClobOrder":
+        """
+        A limit order for `size` shares at `price`. BUY gives USDC for shares
+        and SELL gives shares for USDC (amounts in 6-decimal base units).
+        """
+        shares = round(size * AMOUNT_DECIMALS)
+        usdc = round(size * price * AMOUNT_DECIMALS)
+        buy = side.upper() == "BUY"
+        return cls(
+            salt=secrets.randbits(64) if salt is None else salt,
+            maker=to_checksum_address(maker),
+            signer=to_checksum_address(signer or maker),
+            taker=ZERO_ADDRESS,
+            token_id=int(token_id),
+            maker_amount=usdc if buy else shares,
+            taker_amount=shares if buy else usdc,
+            expiration=expiration,
+            nonce=nonce,
+            fee_rate_bps=fee_rate_bps,
+            side=BUY if buy else SELL,
+        )
+
+    def struct_hash(self) -> bytes:
+        return keccak(
+            ORDER_TYPEHASH
+            + _word(self.salt)
+            + _address_word(self.maker)
+            + _address_word(self.signer)
+            + _address_word(self.taker)
+            + _word(self.token_id)
+            + _word(self.maker_amount)
+            + _word(self.taker_amount)
+            + _word(self.expiration)
+            + _word(self.nonce)
+            + _word(self.fee_rate_bps)
+            + _word(self.side)
+            + _word(self.signature_type)
+        )
+
+    def digest(self, exchange: str = CTF_EXCHANGE, chain_id: int = CHAIN_ID) -> bytes:
+        return keccak(b"\x19\x01" + domain_separator(exchange, chain_id) + self.struct_hash())
+
+    def typed_data(self, exchange: str = CTF_EXCHANGE, chain_id: int = CHAIN_ID) -> Dict:
+        """Full EIP-712 message (for wallets and for checking against the generic encoder)."""
+        fields = [
+            ("salt", "uint256"), ("maker", "address"), ("signer", "address"), ("taker", "address"),
+            ("tokenId", "uint256"), ("makerAmount", "uint256"), ("takerAmount", "uint256"),
+            ("expiration", "uint256"), ("nonce", "uint256"), ("feeRateBps", "uint256"),
+            ("side", "uint8"), ("signatureType", "uint8"),
+        ]
+        values = list(asdict(self).values())
+        return {
+            "types": {
+                "EIP712Domain": [
+                    {"name": "name", "type": "string"},
+                    {"name": "version", "type": "string"},
+                    {"name": "chainId", "type": "uint256"},
+                    {"name": "verifyingContract", "type": "address"},
+                ],
+                "Order": [{"name": name, "type": kind} for name, kind in fields],
+            },
+            "primaryType": "Order",
+            "domain": {"name": DOMAIN_NAME, "version": DOMAIN_VERSION, "chainId": chain_id, "verifyingContract": exchange},
+            "message": {name: value for (name, _), value in zip(fields, values)},
+        }
+
+    def to_api(self, signature: str) -> Dict:
+        """Order body as the CLOB /order endpoint expects it."""
+        return {
+            "salt": self.salt,
+            "maker": self.maker,
+            "signer": self.signer,
+            "taker": self.taker,
+            "tokenId": str(self.token_id),
+            "makerAmount": str(self.maker_amount),
+            "takerAmount": str(self.taker_amount),
+            "expiration": str(self.expiration),
+            "nonce": str(self.nonce),
+            "feeRateBps": str(self.fee_rate_bps),
+            "side": "BUY" if self.side == BUY else "SELL",
+            "signatureType": self.signature_type,
+            "signature": signature,
+        }
+
+
+@lru_cache(maxsize=4096)
+def _signer(private_key: str) -> keys.PrivateKey:
+    """Parsed key (with its public key) per private key, per process."""
+    return keys.PrivateKey(bytes.fromhex(private_key[2:] if private_key.startswith("0x") else private_key))
+
+
+def salt_from_key(client_order_id: str) -> int:
+    """Order salt derived from an idempotency key, so a retried order signs to the same order hash."""
+    return int.from_bytes(keccak(text=client_order_id)[:8], "big")
+
+
+def signer_address(private_key: str) -> str:
+    return _signer(private_key).public_key.to_checksum_address()
+
+
+def sign_order(order: ClobOrder, private_key: str, exchange: str = CTF_EXCHANGE, chain_id: int = CHAIN_ID) -> str:
+    """0x-prefixed 65-byte r || s || v signature (v = 27/28)."""
+    signature = _signer(private_key).sign_msg_hash(order.digest(exchange, chain_id))
+    r, s, v = signature.r, signature.s, signature.v
+    return "0x" + (_word(r) + _word(s) + bytes([v + 27])).hex()
+
+
+def _sign_chunk(items: Sequence[Tuple[ClobOrder, str]], exchange: str, chain_id: int) -> List[str]:
+    return [sign_order(order, key, exchange, chain_id) for order, key in items]
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_signing_pool() -> ProcessPoolExecutor:
+    """
+    Process pool for sign_batch. Workers are spawned, not forked: the server
+    already runs scheduler, dispatcher and context threads (and possibly a
+    CUDA context), and a forked child can inherit their locks mid-hold.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=int(os.getenv("SIGNING_WORKERS", str(os.cpu_count() or 2))),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        atexit.register(shutdown_signing_pool)
+    return _pool
+
+
+def shutdown_signing_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def sign_batch(
+    items: Sequence[Tuple[ClobOrder, str]],
+    exchange: str = CTF_EXCHANGE,
+    chain_id: int = CHAIN_ID,
+    pool: Optional[Executor] = None,
+) -> List[str]:
+    """
+    Signatures for (order, private_key) pairs, in order. Large batches are
+    split into one contiguous chunk per worker, so orders from the same
+    user mostly land on the worker that already has their signer loaded.
+    """
+    if len(items) < MIN_POOL_BATCH and pool is None:
+        return _sign_chunk(items, exchange, chain_id)
+    pool = pool or get_signing_pool()
+    workers = getattr(pool, "_max_workers", 1) or 1
+    step = max(1, -(-len(items) // workers))
+    futures = [pool.submit(_sign_chunk, list(items[i:i + step]), exchange, chain_id) for i in range(0, len(items), step)]
+    return [signature for future in futures for signature in future.result()]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from eth_account import Account
+    from eth_account.messages import encode_typed_data
+
+    parser = argparse.ArgumentParser(description="Order signing benchmark")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    user_keys = ["0x" + secrets.token_hex(32) for _ in range(args.users)]
+    items = [
+        (ClobOrder.limit(signer_address(key), "7132" + str(i), 0.55, 10 + i % 90, "BUY", salt=i), key)
+        for i, key in enumerate(user_keys[i % args.users] for i in range(args.orders))
+    ]
+
+    n = min(200, args.orders)
+    start = time.perf_counter()
+    for order, key in items[:n]:
+        Account.sign_message(encode_typed_data(full_message=order.typed_data()), private_key=key)
+    generic = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    _sign_chunk(items[:n], CTF_EXCHANGE, CHAIN_ID)
+    cached = n / (time.perf_counter() - start)
+
+    pool = get_signing_pool()
+    sign_batch(items[:pool._max_workers], pool=pool)  # warm the workers
+    start = time.perf_counter()
+    sign_batch(items, pool=pool)
+    pooled = args.orders / (time.perf_counter() - start)
+
+    print(f"eth_account encode_typed_data + sign_message: {generic:,.0f} sigs/s")
+    print(f"cached digest + loaded signer, 1 process:    {cached:,.0f} sigs/s")
+    print(f"process pool ({pool._max_workers} workers), {args.orders:,} orders: {pooled:,.0f} sigs/s")
@@ -0,0 +1,122 @@
+"""
+Paper-trading matching engine over replayed CLOB order books.
+
+Books are loaded from /book snapshots (or OrderBook objects) and orders
+are matched against them exactly like taker orders on the CLOB:
+- BUY orders spend USD sweeping the asks up to a limit price.
+- SELL orders sell shares into the bids down to a limit price.
+Filled liquidity is removed, so later orders in the same snapshot see a
+thinner book. Loading the next snapshot (replay) resets the token's book.
+
+Orders carry a client order id. A repeated id returns the original fill
+instead of matching again, mirroring exchange-side dedupe.
+"""
+
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+from services.execution_engine import VenueFill
+from utils.order_book import OrderBook
+
+
+class PaperExchange:
+    name = "paper"
+
+    def __init__(self, latency: float = 0.0, book_source: Optional[Callable[[str], Optional[OrderBook]]] = None):
+        # Simulated exchange round trip, in seconds
+        self.latency = latency
+        # Called for tokens without a loaded book (e.g. a live OrderBookCache lookup)
+        self.book_source = book_source
+        self._books: Dict[str, Dict[str, np.ndarray]] = {}
+        self._orders: Dict[str, VenueFill] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def load(self, book: OrderBook):
+        """Replaces the token's book with a snapshot."""
+        with self._lock:
+            self._books[book.token_id] = {
+                "ask_prices": book.ask_prices.copy(),
+                "ask_sizes": book.ask_sizes.copy(),
+                "bid_prices": book.bid_prices.copy(),
+                "bid_sizes": book.bid_sizes.copy(),
+            }
+
+    def load_raw(self, raw: Dict):
+        self.load(OrderBook.from_raw(raw))
+
+    def replay(self, snapshots: Iterable[Dict], interval: float) -> threading.Thread:
+        """Loads raw snapshots one after another, `interval` seconds apart, in the background."""
+
+        def run():
+            for raw in snapshots:
+                self.load_raw(raw)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name="paper-replay", daemon=True)
+        thread.start()
+        return thread
+
+    def submit_order(
+        self,
+        account: str,
+        token_id: str,
+        side: str,
+        usd: float,
+        limit_price: Optional[float],
+        client_order_id: str,
+        credentials: Optional[Dict] = None,
+    ) -> VenueFill:
+        if self.latency:
+            time.sleep(self.latency)
+        if token_id not in self._books and self.book_source is not None:
+            book = self.book_source(token_id)
+            if book is not None:
+                self.load(book)
+
+        with self._lock:
+            if client_order_id in self._orders:
+                return self._orders[client_order_id]
+            book = self._books.get(token_id)
+            if book is None:
+                fill = VenueFill(f"paper-{next(self._ids)}", 0.0, 0.0, None, "rejected")
+            elif side.upper() == "BUY":
+                fill = self._match(book, "ask", usd, limit_price, spend_usd=True)
+            else:
+                # SELL: `usd` is converted to shares at the limit (or best bid)
+                fill = self._match(book, "bid", usd, limit_price, spend_usd=False)
+            self._orders[client_order_id] = fill
+            return fill
+
+    def _match(self, book: Dict[str, np.ndarray], side: str, usd: float, limit_price: Optional[float], spend_usd: bool) -> VenueFill:
+        prices, sizes = book[f"{side}_prices"], book[f"{side}_sizes"]
+        if limit_price is not None:
+            crosses = prices <= limit_price + 1e-12 if side == "ask" else prices >= limit_price - 1e-12
+            n = int(np.count_nonzero(crosses))
+        else:
+            n = len(prices)
+        order_id = f"paper-{next(self._ids)}"
+        if not n or usd <= 0:
+            return VenueFill(order_id, 0.0, 0.0, None, "unfilled")
+
+        if spend_usd:
+            budget = usd
+        else:
+            budget = usd / (limit_price or prices[0])
+        # Per-level capacity in the order's unit (USD for buys, shares for sells)
+        capacity = prices[:n] * sizes[:n] if spend_usd else sizes[:n].copy()
+        taken_units = np.clip(budget - np.concatenate(([0.0], np.cumsum(capacity)[:-1])), 0.0, capacity)
+        taken_shares = taken_units / prices[:n] if spend_usd else taken_units
+        sizes[:n] -= taken_shares
+
+        shares = float(taken_shares.sum())
+        filled_usd = float((taken_shares * prices[:n]).sum())
+        if not shares:
+            return VenueFill(order_id, 0.0, 0.0, None, "unfilled")
+        requested = usd if spend_usd else budget
+        done = (taken_units.sum() if spend_usd else shares) >= requested - 1e-9
+        return VenueFill(order_id, filled_usd, shares, filled_usd / shares, "filled" if done else "partial")
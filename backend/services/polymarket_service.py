@@ -1,3 +1,4 @@
+import json
 import requests
 from typing import List, Dict, Optional
 from datetime import datetime
@@ -38,6 +39,24 @@ class PolymarketService:
             print(f"Error in get_market_prices: {e}")
             return {}
 
+    @classmethod
+    def get_price_history(cls, token_id: str, start_ts: Optional[float] = None, fidelity: int = 60) -> Dict:
+        """Fetch a token's price series (the YES token for the YES price) at `fidelity` minutes, only points after start_ts if given."""
+        url = f"{cls.CLOB_API}/prices-history"
+        # prices-history is keyed by CLOB token id, not condition id
+        params = {"market": token_id, "fidelity": fidelity}
+        if start_ts is not None:
+            params["startTs"] = int(start_ts) + 1
+        else:
+            params["interval"] = "1w"
+        try:
+            response = requests.get(url, params=params, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"Error in get_price_history: {e}")
+            return {}
+
     @classmethod
     def get_order_book(cls, token_id: str) -> Dict:
         """Fetch order book for a specific token."""
@@ -50,6 +69,21 @@ class PolymarketService:
         except Exception as e:
             print(f"Error in get_order_book: {e}")
             return {}
+
+    @classmethod
+    def get_order_books(cls, token_ids: List[str], chunk_size: int = 100) -> List[Dict]:
+        """Fetch order books for many tokens in bulk (POST /books)."""
+        books = []
+        for i in range(0, len(token_ids), chunk_size):
+            body = [{"token_id": token_id} for token_id in token_ids[i:i + chunk_size]]
+            try:
+                response = requests.post(f"{cls.CLOB_API}/books", json=body, timeout=10)
+                response.raise_for_status()
+                books.extend(response.json())
+            except Exception as e:
+                print(f"Error in get_order_books: {e}")
+        return books
+
     @classmethod
     def get_market_details(cls, slug: str) -> Optional[Dict]:
         """Fetch details for a specific market by its slug."""
@@ -74,10 +108,20 @@ class PolymarketService:
             return float(prices[-1].get("price", 0.5))
         return 0.5
 
+    @staticmethod
+    def parse_token_ids(value) -> List[str]:
+        """clobTokenIds as a list (Gamma returns it as a JSON-encoded string)."""
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                return []
+        return [str(token_id) for token_id in value or []]
+
     @staticmethod
     def extract_token_id(market: Dict, outcome: str = "Yes") -> Optional[str]:
         """Extracts the CLOB token ID for a specific outcome."""
-        clob_ids = market.get("clobTokenIds", [])
+        clob_ids = PolymarketService.parse_token_ids(market.get("clobTokenIds", []))
         if not clob_ids: return None
         
         # Typically Index 0 is YES, Index 1 is NO for binary markets
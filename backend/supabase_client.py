@@ -1,19 +1,24 @@
 import os
-from supabase import create_client, Client
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 load_dotenv()
 
 supabase_url = os.environ.get("SUPABASE_URL")
 supabase_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 
-_client: Client = None
+_client: "Client" = None
 
-def get_supabase_client() -> Client:
-    """Returns a singleton Supabase Client."""
+def get_supabase_client() -> "Client":
+    """Returns a singleton Supabase Client (the supabase package is imported on first use)."""
     global _client
     if _client is None:
         if not supabase_url or not supabase_key:
             raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set in .env")
+        from supabase import create_client
+
         _client = create_client(supabase_url, supabase_key)
     return _client
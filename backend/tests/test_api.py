@@ -1,4 +1,7 @@
+import subprocess
+import sys
 import pytest
+from pathlib import Path
 from unittest.mock import patch
 
 def test_root(api_client):
@@ -45,6 +48,7 @@ def test_analyze_url_logged_out(mock_analyze, mock_details, api_client):
     assert data["is_teaser"] is True
     assert data["action"] == "LOCKED"
     assert "Sign in with Clerk" in data["reasoning"]
+    assert mock_analyze.call_args.kwargs["mode"] == "signal"  # teasers only decode the fast signal
 
 @patch("backend.main.PolymarketService.get_market_details")
 @patch("backend.main.AnalysisOrchestrator.analyze_market_live")
@@ -69,3 +73,60 @@ def test_analyze_url_logged_in(mock_analyze, mock_details, api_client):
     assert "is_teaser" not in data
     assert data["edge_percentage"] == 12.5
     assert data["reasoning"] == "Strong news"
+    assert mock_analyze.call_args.kwargs["mode"] == "full"
+
+@patch("backend.main.PolymarketService.get_market_details")
+@patch("backend.main.AnalysisOrchestrator.analyze_market_live")
+def test_analyze_url_teaser_without_edge(mock_analyze, mock_details, api_client):
+    mock_details.return_value = {"conditionId": "0x123", "question": "Will BTC reach $100k?", "volume": 1000000}
+    # Fast signal cut off before edge_percentage
+    mock_analyze.return_value = {"market_probability": 45, "edge_percentage": None, "action": None}
+
+    response = api_client.post("/analyze-url", json={"url": "https://polymarket.com/event/will-btc-reach-100k"})
+
+    assert response.status_code == 200
+    assert response.json()["edge_detected"] is False
+
+@patch("backend.main.read_status")
+def test_scan_all_requires_worker(mock_status, api_client):
+    mock_status.return_value = {"state": "offline"}
+    assert api_client.post("/scan-all").status_code == 503
+
+    mock_status.return_value = {"state": "idle", "markets_done": 0}
+    with patch("backend.main.request_scan") as mock_request:
+        response = api_client.post("/scan-all?limit=5")
+    assert response.status_code == 200
+    mock_request.assert_called_once_with(limit=5)
+    assert api_client.get("/scan-status").json()["state"] == "idle"
+
+@patch("backend.main.PolymarketService.get_market_details")
+@patch("backend.main.AnalysisOrchestrator.analyze_market_live")
+def test_analyze_url_queue_full(mock_analyze, mock_details, api_client):
+    from backend.main import INTERACTIVE, QueueFull
+    mock_details.return_value = {"conditionId": "0x123", "question": "Will BTC reach $100k?", "volume": 1000000}
+    mock_analyze.side_effect = QueueFull("interactive queue is full")
+
+    response = api_client.post("/analyze-url", json={"url": "https://polymarket.com/event/will-btc-reach-100k"})
+
+    assert response.status_code == 503
+    assert mock_analyze.call_args.kwargs["lane"] == INTERACTIVE
+
+@patch("backend.main.readiness")
+def test_ready_waits_for_warm_model(mock_readiness, api_client):
+    mock_readiness.return_value = {"mode": "local", "state": "warming", "load_seconds": 12.5, "warmup_seconds": {}}
+    response = api_client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["detail"]["state"] == "warming"
+
+    mock_readiness.return_value = {"mode": "local", "state": "ready", "load_seconds": 12.5, "warmup_seconds": {"256": 0.4}}
+    response = api_client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["warmup_seconds"] == {"256": 0.4}
+
+def test_api_import_stays_light():
+    """Model, signing, Supabase and pandas stacks load only in the code paths that use them."""
+    heavy = ["torch", "unsloth", "transformers", "eth_account", "supabase", "pandas"]
+    code = f"import sys, main; print([m for m in {heavy!r} if m in sys.modules])"
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent.parent, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
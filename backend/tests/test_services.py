@@ -1,8 +1,32 @@
+import os
+import threading
+import time
+import numpy as np
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch, MagicMock
+from backend.services import context_service
 from backend.services.context_service import ContextService
 from backend.services.betting_service import BettingService
 from backend.utils.prompt_builder import PromptBuilder
+from backend.utils.keyword_engine import KeywordEngine, gdelt_query
+from backend.utils.relevance import HashingEmbedder, rank_items
+from backend.services.execution_engine import ClobVenue, ExecutionEngine, OrderIntent
+from backend.services.paper_exchange import PaperExchange
+from backend.services.polymarket_service import PolymarketService
+from backend.services.inference_queue import BACKGROUND, INTERACTIVE, InferenceScheduler, LaneConfig, QueueFull, default_lanes
+from backend.services.order_signer import NEG_RISK_CTF_EXCHANGE, ClobOrder, domain_separator, sign_batch, sign_order, signer_address
+from backend.model_server import ModelServer
+from backend.services.inference_backends import FakeModelBackend, LlamaCppBackend
+from backend.services.model_client import ModelClient, ModelUnavailable
+from backend.services.model_service import FAST_SIGNAL, FULL_ANALYSIS, SIGNAL_FIELDS, ModelService
+from backend.scanner_worker import ScanLease, ScannerWorker, read_status, request_scan
+from backend.services.context_sources import ContextSource, SourceRegistry, SourceRequest, SourceResult, _parse_disabled
+from backend.utils.context_models import ContextItem, MarketContext
+from backend.utils.order_book import OrderBook, OrderBookCache
+from backend.utils.price_features import PriceHistoryCache, compute_features
+from backend.utils.speculative import NgramDrafter, speculative_generate
 
 def test_context_formatting():
     """Test that the God-Tier context formatting correctly tiers news/tweets."""
@@ -65,3 +89,618 @@ def test_bet_size_calculation():
     assert BettingService.calculate_bet_size(max_usd, 50) == 500.0
     # 0% confidence
     assert BettingService.calculate_bet_size(max_usd, 0) == 0.0
+
+def test_keyword_engine_entities():
+    """Test trie matching of aliases, longest match and ranking."""
+    engine = KeywordEngine.default()
+
+    assert engine.keywords("Will Bitcoin reach $125,000 by December 31, 2025?")[:2] == ["Bitcoin", "BTC"]
+    # Longest alias wins: one team hit, not "Los Angeles" + "Lakers"
+    lakers = engine.analyze("Will the Los Angeles Lakers win the 2025 NBA Finals?")
+    assert lakers[0].entity.name == "Los Angeles Lakers"
+    # Short aliases only match when capitalized ("US" the country, not "us")
+    assert engine.keywords("Will the US strike Iran?") == ["United States", "Iran"]
+    assert engine.keywords("will this happen to us") == []
+    # Unknown proper nouns fall back to capitalized runs
+    assert "Nikki Haley" in engine.keywords("Will Nikki Haley win the nomination?")
+
+def test_keyword_engine_queries():
+    """Test Twitter and GDELT query formatting."""
+    engine = KeywordEngine.default()
+
+    query = engine.twitter_query("Will the Fed cut rates in March?")
+    assert query.startswith('"Federal Reserve" OR Fed OR FOMC')
+    assert engine.twitter_query("will it rain", default="Polymarket") == "Polymarket"
+    assert gdelt_query(["Federal Reserve", "Fed", "FOMC"]) == '("Federal Reserve" OR FOMC)'
+    assert gdelt_query(["BTC"]) == "(BTC)"
+
+def test_context_index_shares_fetches(tmp_path):
+    """Sibling markets are served from the local index after the first upstream fetch."""
+    index = context_service.ContextIndex(tmp_path / "index.sqlite")
+    article = {"url": "https://reuters.com/btc", "domain": "reuters.com", "title": "Bitcoin ETF inflows surge"}
+    fetch_gdelt = MagicMock(return_value=[article])
+
+    with patch.object(context_service.ContextIndex, "_default", index), \
+            patch.object(ContextService, "_fetch_gdelt", fetch_gdelt), \
+            patch.object(ContextService, "_fetch_tweets", return_value=None):
+        first = ContextService.get_market_context("Will BTC hit 100k?")
+        second = ContextService.get_market_context("Will Bitcoin hit 110k?")
+
+    assert fetch_gdelt.call_count == 1
+    assert "Bitcoin ETF inflows surge" in first
+    assert "Bitcoin ETF inflows surge" in second
+
+def test_capped_fetch_leaves_older_gap_open(tmp_path):
+    """A fetch that hits the upstream cap only covers back to its oldest item; coverage rows are merged and pruned."""
+    index = context_service.ContextIndex(tmp_path / "index.sqlite", retention=7 * 24 * 3600)
+    oldest = datetime.now(timezone.utc) - timedelta(hours=6)
+    articles = [
+        {"url": f"https://reuters.com/{i}", "domain": "reuters.com", "title": f"Bitcoin headline {i}",
+         "seendate": (oldest + timedelta(minutes=i)).strftime("%Y%m%dT%H%M%SZ")}
+        for i in range(ContextService.GDELT_MAX_RECORDS)
+    ]
+    fetch_gdelt = MagicMock(side_effect=[articles, []])
+
+    with patch.object(context_service.ContextIndex, "_default", index), \
+            patch.object(ContextService, "_fetch_gdelt", fetch_gdelt), \
+            patch.object(ContextService, "_fetch_tweets", return_value=None):
+        ContextService.get_market_context("Will BTC hit 100k?")
+        ContextService.get_market_context("Will BTC hit 100k?")
+        ContextService.get_market_context("Will BTC hit 100k?")
+
+    assert fetch_gdelt.call_count == 2
+    second_end = fetch_gdelt.call_args_list[1].args[2]
+    assert abs(second_end.timestamp() - oldest.timestamp()) < 1
+    assert index.conn.execute("SELECT COUNT(*) FROM coverage").fetchone()[0] == 1
+
+    index.mark_covered(context_service.ContextIndex.ARTICLE, "stale", 0, 3600)
+    assert index.conn.execute("SELECT COUNT(*) FROM coverage WHERE query = 'stale'").fetchone()[0] == 0
+
+def test_relevance_ranking_and_dedup():
+    """Context items are ranked by similarity to the question and near-duplicates dropped."""
+    articles = [
+        {"url": "a", "title": "Lakers beat Celtics in overtime"},
+        {"url": "b", "title": "Fed cuts rates by 25 basis points"},
+        {"url": "c", "title": "Fed cuts rates by 25 basis points, signals more cuts"},
+        {"url": "d", "title": "Powell says inflation is cooling"},
+    ]
+    embedder = HashingEmbedder()
+
+    ranked = rank_items(
+        "Will the Fed cut rates in March? Federal Reserve FOMC interest rate",
+        articles, lambda a: a["title"], lambda a: a["url"], embedder=embedder,
+    )
+
+    assert ranked[0]["url"] == "b"
+    assert "c" not in [a["url"] for a in ranked]
+    assert ranked[-1]["url"] in ("a", "d")
+    assert embedder.misses == 4 and embedder.hits == 0
+
+def test_prompt_packing_budget():
+    """Packed prompts fit the token budget, keep higher tiers first and match the contract when nothing is cut."""
+    news = [{"domain": "reuters.com", "title": f"Fed headline {i}"} for i in range(10)]
+    tweets = [
+        {"author": {"userName": f"user{i}", "isBlueVerified": i < 3}, "text": "rates " * 30}
+        for i in range(40)
+    ]
+
+    context = MarketContext.from_raw(news, tweets)
+    packed = PromptBuilder.build_packed_input("Test Question?", 0.44, 1000.0, context, max_seq_length=1200)
+
+    assert packed.prompt_tokens <= 1200 - PromptBuilder.RESPONSE_TOKENS
+    assert packed.items_dropped > 0
+    assert "@user0 (verified)" in packed.input_text
+    assert "TIER 4/5" in packed.input_text
+    assert "@user39" not in packed.input_text
+
+    small = PromptBuilder.build_packed_input("Test Question?", 0.44, 1000.0, MarketContext.from_raw(news[:2], tweets[:2]))
+    expected = PromptBuilder.build_analysis_input(
+        "Test Question?", 0.44, 1000.0, ContextService._format_context(news[:2], tweets[:2])
+    )
+    assert small.input_text == expected
+    assert small.items_dropped == 0
+
+def test_context_records():
+    """Headlines and sentiment are computed from records, in prompt order."""
+    news = [{"domain": "reuters.com", "title": "Bitcoin rally continues", "url": "https://reuters.com/1"}]
+    tweets = [
+        {"id": 1, "author": {"userName": "random_guy", "isBlueVerified": False}, "text": "Sell now, big drop", "likeCount": 3},
+        {"id": 2, "author": {"userName": "whale_quanter", "isBlueVerified": True}, "text": "Huge buy incoming", "likeCount": 10, "retweetCount": 5},
+    ]
+
+    context = MarketContext.from_raw(news, tweets)
+    headlines = context.top_headlines()
+
+    assert [h["source"] for h in headlines] == ["@whale_quanter (verified)", "reuters.com", "@random_guy"]
+    assert [h["tier"] for h in headlines] == [1, 3, 4]
+    assert headlines[1]["url"] == "https://reuters.com/1"
+    assert context.items[1].engagement == 15
+    assert context.sentiment() == 0.0
+    assert PromptBuilder.render_context(context) == ContextService._format_context(news, tweets)
+
+def test_context_latency_budget(tmp_path):
+    """Sources are fetched in parallel; one that misses the deadline is reported, not waited for."""
+    index = context_service.ContextIndex(tmp_path / "index.sqlite")
+    article = {"url": "https://reuters.com/btc", "domain": "reuters.com", "title": "Bitcoin ETF inflows surge"}
+
+    def slow_tweets(question, start_dt, end_dt):
+        time.sleep(2)
+        return []
+
+    with patch.object(context_service.ContextIndex, "_default", index), \
+            patch.object(ContextService, "_fetch_gdelt", return_value=[article]), \
+            patch.object(ContextService, "_fetch_tweets", side_effect=slow_tweets):
+        started = time.monotonic()
+        context = ContextService.get_context("Will BTC hit 100k?", budget=0.5)
+        elapsed = time.monotonic() - started
+
+    assert elapsed < 1.5
+    assert [m.name for m in context.missing] == ["X/Twitter"]
+    formatted = PromptBuilder.render_context(context)
+    assert "Bitcoin ETF inflows surge" in formatted
+    assert "[SOURCE UNAVAILABLE] X/Twitter" in formatted
+
+def test_late_context_is_ingested(tmp_path):
+    """A source answering after the deadline still fills the index; paid sources are not hedged."""
+    index = context_service.ContextIndex(tmp_path / "index.sqlite")
+    article = {"url": "https://reuters.com/btc", "domain": "reuters.com", "title": "Bitcoin ETF inflows surge"}
+    fetch_gdelt = MagicMock(side_effect=lambda question, start_dt, end_dt: time.sleep(0.6) or [article])
+    fetch_tweets = MagicMock(side_effect=lambda question, start_dt, end_dt: time.sleep(0.6) or [])
+
+    with patch.object(context_service.ContextIndex, "_default", index), \
+            patch.object(ContextService, "HEDGE_MIN_DELAY", 0.1), patch.object(ContextService, "HEDGE_MAX_DELAY", 0.1), \
+            patch.object(ContextService, "_fetch_gdelt", fetch_gdelt), \
+            patch.object(ContextService, "_fetch_tweets", fetch_tweets):
+        first = ContextService.get_context("Will BTC hit 100k?", budget=0.3)
+        time.sleep(0.8)
+        second = ContextService.get_context("Will BTC hit 100k?", budget=0.3)
+
+    assert {m.name for m in first.missing} == {"GDELT news", "X/Twitter"}
+    assert fetch_gdelt.call_count == 2  # original + hedge, late answer ingested
+    assert fetch_tweets.call_count == 1  # paid: never hedged, covered by the late answer
+    assert not second.missing
+    assert "Bitcoin ETF inflows surge" in PromptBuilder.render_context(second)
+
+def test_source_registry_fan_out():
+    """Registered sources are merged into tiers; disabled and failing ones are reported missing."""
+    item = ContextItem.from_article({"url": "https://apnews.com/1", "domain": "apnews.com", "title": "Finals tonight"})
+
+    def failing(request):
+        raise RuntimeError("boom")
+
+    registry = SourceRegistry(_parse_disabled("Sports=twitter"))
+    registry.register(ContextSource("twitter", "X/Twitter", (1, 4), lambda request: SourceResult([]), cost=0.003))
+    registry.register(ContextSource("news", "News", (3,), lambda request: SourceResult([item])))
+    registry.register(ContextSource("flaky", "Flaky", (3,), failing))
+    request = SourceRequest("Will the Celtics win?", "sports", (), "Celtics", "Celtics", datetime.now(), datetime.now(), time.monotonic() + 1)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        context = registry.fan_out(request, pool)
+
+    assert context.tier(3) == [item]
+    assert [(m.name, m.reason) for m in context.missing] == [
+        ("X/Twitter", "disabled for sports markets"),
+        ("Flaky", "upstream unavailable"),
+    ]
+    stats = registry.stats_snapshot()
+    assert stats["twitter"]["skipped"] == 1 and stats["twitter"]["calls"] == 0
+    assert stats["news"]["hit_rate"] == 1.0
+    assert stats["flaky"]["errors"] == 1
+
+def test_price_features():
+    """Price-history features are vectorized across markets and cached with incremental appends."""
+    now = 1_700_000_000.0
+    ts = now - 3600 * np.arange(48)[::-1]
+    prices = np.full(48, 0.40)
+    prices[-10:] = 0.50
+
+    columns = compute_features([(ts, prices), (np.empty(0), np.empty(0))], now)
+    assert columns["change_24h"][0] == pytest.approx(0.10)
+    assert columns["hours_since_big_move"][0] == pytest.approx(9.0)
+    assert np.isnan(columns["last_price"][1])
+
+    cache = PriceHistoryCache()
+    raw = {"history": [{"t": t, "p": p} for t, p in zip(ts, prices)]}
+    assert cache.extend("m1", {"history": raw["history"][:40]}) == 40
+    assert cache.extend("m1", raw) == 8
+    assert cache.last_ts("m1") == now
+    features = cache.features("m1", now)
+    assert features.last_price == 0.5 and features.low_7d == 0.4
+    assert cache.features_batch(["m1", "unknown"], now)[0] == features
+
+    block = PromptBuilder.format_price_signals(features)
+    assert block.splitlines()[1] == "PRICE SIGNALS"
+    assert "24h +10.0 pts" in block
+    assert "Last big move: +10.0 pts, 9h ago" in block
+    assert PromptBuilder.format_price_signals(cache.features("unknown", now)) == ""
+
+    with patch("backend.services.polymarket_service.requests.get") as mock_get:
+        mock_get.return_value.json.return_value = raw
+        assert PolymarketService.get_price_history("yes-token", now - 60) == raw
+    assert mock_get.call_args.kwargs["params"]["market"] == "yes-token"  # keyed by CLOB token id
+    assert mock_get.call_args.kwargs["params"]["startTs"] == int(now) - 59 and mock_get.call_args.kwargs["timeout"]
+
+def test_order_book_signals():
+    """Books are parsed into sorted arrays; depth, slippage and sizing caps come from them."""
+    raw = {
+        "asset_id": "yes-token",
+        "bids": [{"price": "0.48", "size": "100"}, {"price": "0.49", "size": "200"}, {"price": "0.45", "size": "1000"}],
+        "asks": [{"price": "0.52", "size": "50"}, {"price": "0.51", "size": "100"}, {"price": "0.60", "size": "1000"}],
+    }
+    book = OrderBook.from_raw(raw)
+    assert (book.best_bid, book.best_ask) == (0.49, 0.51)
+    bids, asks = book.depth((0.01, 0.05))
+    assert list(bids) == pytest.approx([98.0, 596.0])
+    assert list(asks) == pytest.approx([51.0, 77.0])
+
+    fills = book.simulate_buy([51.0, 77.0, 10_000.0])
+    assert list(fills.shares[:2]) == pytest.approx([100.0, 150.0])
+    assert fills.slippage[0] == pytest.approx(0.0)
+    assert fills.filled_usd[2] == pytest.approx(677.0)
+
+    cap = book.max_buy_within(0.01)
+    assert book.simulate_buy(cap).slippage[0] == pytest.approx(0.01)
+    assert BettingService.calculate_bet_size(1000.0, 100, book=book) == pytest.approx(book.max_buy_within(BettingService.MAX_SLIPPAGE))
+    assert BettingService.calculate_bet_size(10.0, 100, book=book) == 10.0
+
+    block = PromptBuilder.format_order_book(book.signals())
+    assert "Bid 49% / Ask 51% | spread 2.0 pts" in block
+    assert "$1,000 exceeds visible book" in block
+
+    cache = OrderBookCache(ttl=60)
+    fetch = MagicMock(return_value=[raw])
+    assert cache.get_many(["yes-token", "no-token"], fetch)["yes-token"].best_ask == 0.51
+    cache.get_many(["yes-token"], fetch)
+    fetch.assert_called_once_with(["yes-token", "no-token"])
+
+def test_kelly_sizing_across_users():
+    """Every user is sized in one pass: thresholds, fractional Kelly, max bet and book depth."""
+    profiles = [
+        {"id": "a", "bankroll": 10_000, "max_bet_size": 5_000, "kelly_fraction": 0.5, "min_edge_threshold": 5, "min_confidence_threshold": 70},
+        {"id": "b", "bankroll": 10_000, "max_bet_size": 25, "kelly_fraction": 0.5, "min_edge_threshold": 5, "min_confidence_threshold": 70},
+        {"id": "c", "bankroll": 10_000, "max_bet_size": 5_000, "kelly_fraction": 0.5, "min_edge_threshold": 20, "min_confidence_threshold": 70},
+        {"id": "d"},
+    ]
+    prediction = {"action": "BUY_YES", "market_probability": 0.5, "fair_probability": 0.7, "edge_percentage": 20.0, "confidence": 100}
+
+    sizing = BettingService.size_for_users(prediction, profiles)
+    # Full Kelly at p=0.5, q=0.7 is 40% of bankroll; half Kelly of $10k = $2,000
+    assert list(sizing.size) == pytest.approx([2000.0, 25.0, 2000.0, 50.0])
+
+    prediction["edge_percentage"] = 10.0
+    sizing = BettingService.size_for_users(prediction, profiles)
+    assert sizing.size[2] == 0.0 and sizing.size[0] > 0
+    assert [o["user_id"] for o in sizing.orders([p["id"] for p in profiles])] == ["a", "b", "d"]
+
+    # A thin book caps sizes at what it can fill within MAX_SLIPPAGE
+    book = OrderBook.from_raw({"asks": [{"price": "0.50", "size": "200"}, {"price": "0.60", "size": "5000"}]})
+    sizing = BettingService.size_for_users(prediction, profiles, book)
+    assert sizing.size[0] == pytest.approx(book.max_buy_within(BettingService.MAX_SLIPPAGE))
+    assert sizing.size[1] == 25.0
+
+    assert not BettingService.size_for_users({**prediction, "action": "HOLD"}, profiles).size.any()
+
+def test_auto_bet_reads_credentials_only_for_sized_users():
+    """Alert/sizing reads skip credential columns; keys are fetched only for users getting an order."""
+    from backend.services.analysis_orchestrator import AnalysisOrchestrator
+    profiles = [
+        {"id": "a", "bankroll": 10_000, "max_bet_size": 100, "kelly_fraction": 0.5, "min_edge_threshold": 5, "min_confidence_threshold": 70},
+        {"id": "b", "bankroll": 10_000, "max_bet_size": 100, "kelly_fraction": 0.5, "min_edge_threshold": 50, "min_confidence_threshold": 70},
+    ]
+    prediction = {"action": "BUY_YES", "market_probability": 0.5, "fair_probability": 0.7, "edge_percentage": 20.0, "confidence": 100}
+    supabase = MagicMock()
+    table = supabase.table.return_value
+    table.select.return_value.eq.return_value.execute.return_value.data = profiles
+    table.select.return_value.in_.return_value.execute.return_value.data = [{"id": "a", "polymarket_private_key": "0xkey"}]
+    engine = MagicMock()
+
+    with patch("backend.services.analysis_orchestrator.get_supabase_client", return_value=supabase), \
+            patch("backend.services.analysis_orchestrator.ExecutionEngine.default", return_value=engine):
+        AnalysisOrchestrator._trigger_automated_workflows(prediction, "m1", "yes", prediction_id="p1")
+
+    assert [c.args[0] for c in table.select.call_args_list] == [
+        AnalysisOrchestrator.PROFILE_COLUMNS, AnalysisOrchestrator.CREDENTIAL_COLUMNS,
+    ]
+    assert "private_key" not in AnalysisOrchestrator.PROFILE_COLUMNS
+    table.select.return_value.in_.assert_called_once_with("id", ["a"])
+    (intents,), _ = engine.submit_many.call_args
+    assert [(i.user_id, i.credentials["private_key"]) for i in intents] == [("a", "0xkey")]
+
+def test_execution_engine_paper_fills():
+    """Intents are aggregated per token/side, filled on the paper exchange, and never double-filled."""
+    venue = PaperExchange()
+    venue.load_raw({"asset_id": "yes", "asks": [{"price": "0.50", "size": "100"}, {"price": "0.60", "size": "100"}]})
+    engine = ExecutionEngine(venue, aggregate=True, batch_window=0.05, rate_per_account=1000).start()
+
+    intents = [
+        OrderIntent("a", "yes", 30.0, limit_price=0.55, signal_id="p1"),
+        OrderIntent("b", "yes", 10.0, limit_price=0.55, signal_id="p1"),
+    ]
+    futures = engine.submit_many(intents)
+    retry = engine.submit(OrderIntent("a", "yes", 30.0, limit_price=0.55, signal_id="p1"))
+    results = [f.result(timeout=5) for f in futures]
+    assert retry is futures[0]
+
+    # One venue order for both users; $40 at 0.50 fits in the first level
+    assert [r.batch_size for r in results] == [2, 2]
+    assert [r.shares for r in results] == pytest.approx([60.0, 20.0])
+    assert results[0].status == "filled" and results[0].avg_price == pytest.approx(0.50)
+
+    # Only $10 of the 0.50 level is left and the limit excludes 0.60
+    late = engine.submit(OrderIntent("c", "yes", 50.0, limit_price=0.55, signal_id="p1")).result(timeout=5)
+    assert late.status == "partial" and late.filled_usd == pytest.approx(10.0)
+
+    engine.stop()
+    stats = engine.stats()
+    assert stats["venue_orders"] == 2 and stats["duplicates"] == 1
+    assert stats["latency"]["count"] == 3
+
+    # No signal id: never deduplicated; executed keys expire past the cap/TTL
+    assert OrderIntent("a", "yes", 5.0).key != OrderIntent("a", "yes", 5.0).key
+    capped = ExecutionEngine(PaperExchange(), batch_window=0.01, rate_per_account=1000, max_done_keys=1).start()
+    first = capped.submit(OrderIntent("a", "yes", 5.0, signal_id="p1"))
+    first.result(timeout=5)
+    capped.submit(OrderIntent("b", "yes", 5.0, signal_id="p1")).result(timeout=5)
+    again = capped.submit(OrderIntent("a", "yes", 5.0, signal_id="p1"))  # oldest key "a" was evicted
+    assert again is not first and again.result(timeout=5).key == "a:yes:BUY:p1"
+    assert len(capped._futures) == 2  # "b" plus the new "a"
+    capped.stop()
+
+def test_order_signing_vectors():
+    """Cached-digest signatures match fixed vectors and eth_account's generic EIP-712 signer."""
+    from eth_account import Account
+    from eth_account.messages import encode_typed_data
+
+    key = "0x" + "11" * 32
+    assert signer_address(key) == "0x19E7E376E7C213B7E7e7e46cc70A5dD086DAff2A"
+    assert domain_separator().hex() == "1a573e3617c78403b5b4b892827992f027b03d4eaf570048b8ee8cdd84d151be"
+
+    buy = ClobOrder.limit(
+        signer_address(key), "71321045679252212594626385532706912750332728571942532289631379312455583992563",
+        0.55, 100, "BUY", salt=12345,
+    )
+    assert (buy.maker_amount, buy.taker_amount) == (55_000_000, 100_000_000)
+    assert buy.digest().hex() == "413f5bf89a87c6ba2849d94b6ba2573e9a039a5057dc4b828d65777cb81fc411"
+    assert sign_order(buy, key) == (
+        "0x94d351d4c4a716d74b5ab096bb7885ca1a35d1aabd467d732a7ddc4ae206648f"
+        "0d2a68e27c7fca4ce49005519a6e5b6a8a0d0f2e1f808f96f476c96923ba06d11b"
+    )
+
+    sell = ClobOrder.limit(signer_address(key), "1", 0.3, 50, "SELL", salt=1, expiration=1700000000, nonce=3, fee_rate_bps=10)
+    reference = Account.sign_message(encode_typed_data(full_message=sell.typed_data(NEG_RISK_CTF_EXCHANGE)), private_key=key)
+    assert sign_order(sell, key, NEG_RISK_CTF_EXCHANGE) == reference.signature.to_0x_hex()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        signatures = sign_batch([(buy, key), (sell, key), (buy, key)], pool=pool)
+    assert signatures == [sign_order(buy, key), sign_order(sell, key), sign_order(buy, key)]
+
+    # Live venue: each batch flush is signed up front, then sent with the signed bodies
+    from services.betting_service import BettingService
+    credentials = {"api_key": "k", "secret": "s", "passphrase": "p", "private_key": key}
+    engine = ExecutionEngine(ClobVenue(), batch_window=0.05, rate_per_account=1000).start()
+    with patch.object(BettingService, "place_limit_order", wraps=BettingService.place_limit_order) as place:
+        results = [f.result(timeout=5) for f in engine.submit_many([
+            OrderIntent("a", "1", 11.0, limit_price=0.55, signal_id="p1", credentials=credentials),
+            OrderIntent("b", "2", 5.5, limit_price=0.55, signal_id="p1", credentials=credentials),
+        ])]
+    engine.stop()
+    assert [r.status for r in results] == ["submitted", "submitted"]
+    signed = sorted((c.args[5] for c in place.call_args_list), key=lambda body: body["tokenId"])
+    assert [(body["tokenId"], body["makerAmount"], body["signer"]) for body in signed] == [
+        ("1", "11000000", signer_address(key)), ("2", "5500000", signer_address(key)),
+    ]
+
+    # Retries of the same client order id (e.g. after a restart) sign the identical order
+    first = BettingService.place_limit_order("1", 0.55, 20.0, "BUY", credentials, client_order_id="k1")
+    retry = BettingService.place_limit_order("1", 0.55, 20.0, "BUY", credentials, client_order_id="k1")
+    other = BettingService.place_limit_order("1", 0.55, 20.0, "BUY", credentials, client_order_id="k2")
+    assert first["order"]["signed_order"] == retry["order"]["signed_order"]
+    assert other["order"]["signed_order"]["salt"] != first["order"]["signed_order"]["salt"]
+
+    # A malformed key is a rejected order, not an exception
+    bad = {**credentials, "private_key": "0xnot-a-key"}
+    assert BettingService.place_limit_order("1", 0.55, 20.0, "BUY", bad) is None
+    engine = ExecutionEngine(ClobVenue(), batch_window=0.05, rate_per_account=1000).start()
+    rejected = engine.submit(OrderIntent("c", "1", 11.0, limit_price=0.55, signal_id="p2", credentials=bad)).result(timeout=5)
+    engine.stop()
+    assert rejected.status == "rejected"
+
+def test_scanner_worker_lease_and_status(tmp_path):
+    """Only one worker holds the lease; scans report progress and stop cleanly."""
+    lock = tmp_path / "scanner.lock"
+    first, second = ScanLease(lock, ttl=30), ScanLease(lock, ttl=30)
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+    expired = ScanLease(lock, ttl=-1)
+    assert expired.acquire()
+    assert first.acquire()  # an expired lease can be taken over
+    first.release()
+
+    seen = []
+
+    def fake_scan(limit, progress, should_stop):
+        markets = [{"question": f"Market {i}?"} for i in range(limit)]
+        for i, market in enumerate(markets):
+            progress(i, len(markets), market)
+            seen.append(read_status(tmp_path / "status.json")["markets_done"])
+        progress(len(markets), len(markets), None)
+        return markets
+
+    worker = ScannerWorker(
+        fake_scan, interval=3600, limit=3, lease=ScanLease(lock, ttl=30),
+        status_path=tmp_path / "status.json", request_path=tmp_path / "request.json",
+    )
+    worker.run(max_scans=1)
+
+    status = read_status(tmp_path / "status.json")
+    assert seen == [0, 1, 2]
+    assert status["state"] == "offline"
+    assert status["last_scan"]["processed"] == 3 and not status["last_scan"]["interrupted"]
+    assert ScanLease(lock).acquire()  # released on exit
+
+    request_scan(limit=1, path=tmp_path / "request.json")
+    assert worker._take_request()["limit"] == 1
+    assert worker._take_request() is None
+
+def test_inference_scheduler_lanes():
+    """Interactive jobs go ahead of queued scan work; aging and depth limits apply per lane."""
+    lanes = {INTERACTIVE: LaneConfig(0.0, 1, 2), BACKGROUND: LaneConfig(10.0, 1, 10)}
+    scheduler = InferenceScheduler(slots=1, lanes=lanes)
+    gate, order = threading.Event(), []
+    blocker = scheduler.submit(BACKGROUND, gate.wait)
+    time.sleep(0.05)  # the only slot is now busy
+    futures = [scheduler.submit(BACKGROUND, order.append, f"scan-{i}") for i in range(3)]
+    futures.append(scheduler.submit(INTERACTIVE, order.append, "user"))
+    scheduler.submit(INTERACTIVE, order.append, "user-2")
+    with pytest.raises(QueueFull):
+        scheduler.submit(INTERACTIVE, order.append, "user-3")
+    gate.set()
+    scheduler.shutdown()
+    assert blocker.done()
+    assert order == ["user", "user-2", "scan-0", "scan-1", "scan-2"]
+    stats = scheduler.stats()
+    assert stats[INTERACTIVE]["rejected"] == 1 and stats[BACKGROUND]["completed"] == 4
+    assert stats[INTERACTIVE]["wait"]["count"] == 2
+
+    # With fast aging, a scan job that has waited long enough outranks a new user request
+    scheduler = InferenceScheduler(slots=1, lanes=lanes, aging_rate=1000.0)
+    gate.clear()
+    order.clear()
+    scheduler.submit(BACKGROUND, gate.wait)
+    time.sleep(0.05)
+    scheduler.submit(BACKGROUND, order.append, "old-scan")
+    time.sleep(0.05)
+    scheduler.submit(INTERACTIVE, order.append, "user")
+    gate.set()
+    failed = scheduler.submit(INTERACTIVE, lambda: 1 / 0)
+    scheduler.shutdown()
+    assert order == ["old-scan", "user"]
+    with pytest.raises(ZeroDivisionError):
+        failed.result()
+
+    # By default scans leave one slot free, so a user never waits behind them
+    assert default_lanes(1)[BACKGROUND].max_concurrency == 1
+    scheduler = InferenceScheduler(slots=2)
+    gate.clear()
+    for _ in range(3):
+        scheduler.submit(BACKGROUND, gate.wait)
+    time.sleep(0.05)
+    started = time.monotonic()
+    assert scheduler.submit(INTERACTIVE, time.monotonic).result(timeout=1) - started < 0.5
+    gate.set()
+    scheduler.shutdown()
+
+def test_model_server_handshake(tmp_path):
+    """API workers reach the model over the socket; predict waits for the ready handshake."""
+    client = ModelClient(tmp_path / "model.sock", authkey=b"test")
+    assert client.health()["state"] == "offline"
+
+    server = ModelServer(FakeModelBackend(load_seconds=0.3), socket_path=tmp_path / "model.sock", authkey=b"test").start()
+    try:
+        assert client.health()["state"] == "loading"
+        with pytest.raises(ModelUnavailable):
+            client.predict_edge("Market: Will it rain?")
+
+        status = client.wait_ready(timeout=5, interval=0.05)
+        assert status["state"] == "ready" and status["backend"] == "fake"
+        assert status["load_seconds"] >= 0.3 and "fake" in status["warmup_seconds"]
+        first = client.predict_edge("Market: Will it rain?", INTERACTIVE)
+        assert first == client.predict_edge("Market: Will it rain?")
+        assert first["action"] in ("BUY_YES", "BUY_NO", "HOLD")
+        assert client.stats()["inference_queue"][INTERACTIVE]["completed"] == 1
+        assert ModelClient(tmp_path / "model.sock", authkey=b"wrong").health()["state"] == "offline"
+    finally:
+        server.stop()
+
+def test_llama_cpp_backend_prompts_and_batches():
+    """GGUF backend: single BOS, stops at <|eot_id|>, batches run prefix-sorted but return in order."""
+    seen = []
+
+    def fake_llm(prompt, max_tokens, temperature, stop):
+        seen.append(prompt)
+        fair = 0.7 if "rain" in prompt else 0.4
+        return {"choices": [{"text": f'{{"fair_probability": {fair}, "action": "BUY", "valid": True}}'}], "usage": {"completion_tokens": 12}}
+
+    backend = LlamaCppBackend(model_path="unused.gguf", n_threads=2)
+    backend._llm = fake_llm
+    results = backend.predict_batch(["Question: Will it snow?", "Question: Will it rain?"])
+
+    assert [r["fair_probability"] for r in results] == [0.4, 0.7]
+    assert results[0]["valid"] is True
+    assert "rain" in seen[0]  # sorted so shared prefixes run back to back
+    assert not seen[0].startswith("<|begin_of_text|>") and seen[0].endswith("<|end_header_id|>\n\n")
+    assert backend.n_threads == 2 and backend.readiness()["state"] == "cold"
+
+def test_fast_signal_decode():
+    """Fast signal: greedy, stops before the reasoning, closes the JSON, counts tokens per path."""
+    head = '{"market_probability": 45, "fair_probability": 60, "edge_percentage": 15, "action": "BUY_YES", "confidence": 80, "edge_quality": "strong"'
+    assert ModelService.parse_signal(head + ', "reasoning"')["edge_quality"] == "strong"  # HF: stop string included
+    assert ModelService.parse_signal(head + ', ')["action"] == "BUY_YES"  # llama.cpp: stop string removed
+    full = ModelService.parse_signal(head + ', "signal_agreement": "mixed", "reasoning": "Long", "risk_factors": []}<|eot_id|>')
+    assert list(full) == list(SIGNAL_FIELDS) and full["fair_probability"] == 60
+    # Token cap hit mid-value: the partial field is dropped, earlier ones kept
+    cut_value = ModelService.parse_signal(head[:head.index('"action"') + len('"action": "BU')])
+    assert cut_value["edge_percentage"] == 15 and cut_value["action"] is None
+    cut_early = ModelService.parse_signal('{"market_probability": 45, "fair_probability": 6')
+    assert cut_early["market_probability"] == 45 and cut_early["fair_probability"] is None
+    assert cut_early["edge_percentage"] is None
+
+    calls = []
+
+    def fake_llm(prompt, max_tokens, temperature, stop):
+        calls.append((max_tokens, temperature, stop))
+        time.sleep(0.001)
+        text = head + ", " if '"reasoning"' in stop else head + ', "reasoning": "Long"}'
+        return {"choices": [{"text": text}], "usage": {"completion_tokens": 60 if '"reasoning"' in stop else 400}}
+
+    backend = LlamaCppBackend(model_path="unused.gguf", n_threads=2)
+    backend._llm = fake_llm
+    assert backend.predict_mode("Question: Will it rain?", FAST_SIGNAL)["confidence"] == 80
+    assert backend.predict_mode("Question: Will it rain?", FULL_ANALYSIS)["reasoning"] == "Long"
+    assert calls[0][:2] == (ModelService.SIGNAL_NEW_TOKENS, 0.0) and calls[1][1] == 0.1
+    decode = backend.readiness()["decode"]
+    assert decode[FAST_SIGNAL]["tokens_per_request"] == 60 and decode[FULL_ANALYSIS]["tokens_per_request"] == 400
+    assert decode[FAST_SIGNAL]["tokens_per_second"] > 0
+    assert backend.n_threads_batch == len(os.sched_getaffinity(0))
+    assert set(FakeModelBackend().predict_signal("Market: Will it rain?")) == set(SIGNAL_FIELDS)
+
+def test_llama_cpp_backend_real_model():
+    """Runs the exported GGUF model end to end (set POLYEDGE_TEST_GGUF to enable)."""
+    path = os.getenv("POLYEDGE_TEST_GGUF")
+    if not path:
+        pytest.skip("POLYEDGE_TEST_GGUF not set")
+    pytest.importorskip("llama_cpp")
+    backend = LlamaCppBackend(model_path=path)
+    assert backend.preload()["state"] == "ready"
+    prediction = backend.predict(PromptBuilder.build_analysis_input("Will BTC reach $100k?", 0.45, 1_000_000, ""))
+    assert prediction is None or "action" in prediction
+
+def test_ngram_drafter():
+    """Drafts continue the latest earlier occurrence of the longest matching tail, then the corpus."""
+    drafter = NgramDrafter(corpus=[7, 8, 9, 10], draft_tokens=3)
+    assert drafter.propose([1, 2, 3, 4, 5, 1, 2]) == [3, 4, 5]
+    assert drafter.propose([1, 2, 3, 4, 5, 1, 2, 3, 9, 9, 2, 3]) == [9, 9, 2]  # latest "2 3" wins
+    assert drafter.propose([42, 8]) == [9, 10]  # from the corpus
+    assert drafter.propose([42, 43]) == []
+
+def test_speculative_decoding_matches_greedy():
+    """Prompt-lookup speculative decoding emits exactly the greedy tokens."""
+    torch = pytest.importorskip("torch")
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=128, hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=4, max_position_embeddings=256)
+    model = LlamaForCausalLM(config).eval()
+    input_ids = torch.randint(0, 128, (1, 12)).repeat(1, 4)
+
+    greedy = model.generate(input_ids, max_new_tokens=40, do_sample=False, pad_token_id=0)[0, 48:].tolist()
+    output, stats = speculative_generate(model, input_ids, 40, NgramDrafter())
+
+    assert output == greedy
+    assert stats.generated == 40 and stats.drafted > 0
+    assert stats.passes < 41  # fewer forward passes than one per token
@@ -0,0 +1,179 @@
+"""
+Vectorized, slippage-aware Kelly sizing for auto-bets.
+
+A signal is sized for every Pro user in one NumPy pass.
+
+For a binary share bought at price p that we believe pays out with
+probability q, the Kelly fraction of bankroll is (q - p) / (1 - p). q is
+the model's fair probability, shrunk toward the price by its confidence.
+Each user bets their own fraction of full Kelly (kelly_fraction, e.g.
+0.25). The result is clipped to their max bet, to zero for users whose
+edge/confidence thresholds aren't met, and to what the book can absorb
+within the slippage limit.
+
+The Kelly size is then re-evaluated once at the average fill price it
+would actually get (one vectorized book sweep for all users), so a thin
+book shrinks the bet instead of just capping it.
+
+UserArrays.from_profiles converts profile rows to column arrays once. The
+result can be reused for every signal in a scan.
+
+Usage:
+    python -m utils.bet_sizing --benchmark   (from backend/)
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.order_book import OrderBook
+
+# Profile defaults (match schema.sql)
+DEFAULT_BANKROLL = 1000.0
+DEFAULT_MAX_BET = 50.0
+DEFAULT_KELLY_FRACTION = 0.25
+DEFAULT_MIN_EDGE = 10.0
+DEFAULT_MIN_CONFIDENCE = 70.0
+MAX_SLIPPAGE = 0.02
+# Orders below this are not worth placing (CLOB minimum is $1)
+MIN_ORDER_USD = 1.0
+
+
+def _probability(value: Any, default: float) -> float:
+    """Probabilities come back as 0.58 or 58 depending on the model run."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return value / 100.0 if value > 1.0 else value
+
+
+def _column(profiles: Sequence[Dict], key: str, default: float) -> np.ndarray:
+    return np.array([float(p.get(key) if p.get(key) is not None else default) for p in profiles], dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class UserArrays:
+    user_ids: List[str]
+    bankroll: np.ndarray
+    max_bet: np.ndarray
+    kelly_fraction: np.ndarray
+    min_edge: np.ndarray
+    min_confidence: np.ndarray
+
+    @classmethod
+    def from_profiles(cls, profiles: Sequence[Dict]) -> "UserArrays":
+        return cls(
+            user_ids=[p.get("id") for p in profiles],
+            bankroll=_column(profiles, "bankroll", DEFAULT_BANKROLL),
+            max_bet=_column(profiles, "max_bet_size", DEFAULT_MAX_BET),
+            kelly_fraction=_column(profiles, "kelly_fraction", DEFAULT_KELLY_FRACTION),
+            min_edge=_column(profiles, "min_edge_threshold", DEFAULT_MIN_EDGE),
+            min_confidence=_column(profiles, "min_confidence_threshold", DEFAULT_MIN_CONFIDENCE),
+        )
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+
+@dataclass(frozen=True)
+class Sizing:
+    side: Optional[str]
+    price: Optional[float]
+    # Per user, aligned with UserArrays.user_ids
+    size: np.ndarray
+    avg_price: np.ndarray
+    eligible: np.ndarray
+
+    def orders(self, user_ids: Sequence[str]) -> List[Dict]:
+        """Non-zero sizes as {user_id, side, size, avg_price} rows."""
+        return [
+            {"user_id": user_ids[i], "side": self.side, "size": round(float(self.size[i]), 2), "avg_price": round(float(self.avg_price[i]), 4)}
+            for i in np.flatnonzero(self.size > 0)
+        ]
+
+
+def size_orders(
+    prediction: Dict,
+    users: UserArrays,
+    book: Optional[OrderBook] = None,
+    max_slippage: float = MAX_SLIPPAGE,
+) -> Sizing:
+    """
+    Order sizes (USD) for every user. The book must be the one for the side
+    being bought (NO token for BUY_NO). Without a book the model's market
+    probability is taken as the fill price and only max_bet caps the size.
+    """
+    n = len(users)
+    zeros = np.zeros(n)
+    action = str(prediction.get("action") or "").upper()
+    if action == "HOLD" or not n:
+        return Sizing(None, None, zeros, zeros, np.zeros(n, dtype=bool))
+
+    side = "NO" if action == "BUY_NO" else "YES"
+    market = _probability(prediction.get("market_probability"), 0.5)
+    fair = _probability(prediction.get("fair_probability"), market)
+    confidence = float(prediction.get("confidence") or 0)
+    edge = float(prediction.get("edge_percentage") or 0)
+    if side == "NO":
+        market, fair = 1.0 - market, 1.0 - fair
+
+    price = book.best_ask if book is not None and book.best_ask is not None else market
+    # Shrink the model's view toward the price by its confidence
+    belief = price + (fair - price) * min(max(confidence, 0.0), 100.0) / 100.0
+
+    eligible = (edge >= users.min_edge) & (confidence >= users.min_confidence)
+
+    def kelly(at_price):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            f = np.where(at_price < 1.0, (belief - at_price) / (1.0 - at_price), 0.0)
+        return np.clip(f, 0.0, 1.0) * users.kelly_fraction * users.bankroll
+
+    size = np.minimum(kelly(np.full(n, price)), users.max_bet)
+    avg_price = np.full(n, price)
+    if book is not None:
+        size = np.minimum(size, book.max_buy_within(max_slippage))
+        # Re-size at the price each order would actually average
+        fills = book.simulate_buy(size)
+        avg_price = np.where(np.isnan(fills.avg_price), price, fills.avg_price)
+        size = np.minimum(size, kelly(avg_price))
+
+    size = np.where(eligible & (size >= MIN_ORDER_USD), size, 0.0)
+    return Sizing(side, price, size, avg_price, eligible)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Bet sizing benchmark")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--users", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    profiles = [
+        {
+            "id": f"user_{i}",
+            "bankroll": float(rng.uniform(100, 50_000)),
+            "max_bet_size": float(rng.choice([25, 50, 100, 500, 1000])),
+            "kelly_fraction": float(rng.choice([0.1, 0.25, 0.5])),
+            "min_edge_threshold": float(rng.uniform(3, 15)),
+            "min_confidence_threshold": float(rng.uniform(50, 90)),
+        }
+        for i in range(args.users)
+    ]
+    asks = [{"price": f"{0.58 + 0.001 * i:.3f}", "size": f"{rng.uniform(50, 2000):.2f}"} for i in range(200)]
+    book = OrderBook.from_raw({"asset_id": "bench", "bids": [], "asks": asks})
+    prediction = {"action": "BUY_YES", "market_probability": 0.58, "fair_probability": 0.72, "edge_percentage": 14.0, "confidence": 88}
+
+    start = time.perf_counter()
+    users = UserArrays.from_profiles(profiles)
+    converted = time.perf_counter() - start
+    start = time.perf_counter()
+    sizing = size_orders(prediction, users, book)
+    sized = time.perf_counter() - start
+
+    print(f"profiles -> arrays ({args.users:,} users): {converted * 1000:.1f} ms")
+    print(f"size_orders ({args.users:,} users): {sized * 1000:.2f} ms, {int((sizing.size > 0).sum()):,} orders")
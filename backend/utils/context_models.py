@@ -0,0 +1,169 @@
+"""
+Typed context records passed between ContextService, PromptBuilder and the
+orchestrator.
+
+Raw GDELT/TwitterAPI.io dicts are converted once into compact, immutable
+ContextItem records (tier, source, text, engagement, timestamp). The tier
+rules of the God-Tier prompt are applied at construction, so formatting,
+headline extraction and sentiment all read the same records and nobody has
+to re-parse the formatted prompt text. Records are frozen and hashable, so
+any stage keyed on a MarketContext can be cached.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+ARTICLE = "article"
+TWEET = "tweet"
+
+# Tier numbers as they appear in the prompt headers
+TIER_VERIFIED = 1
+TIER_NEWS = 3
+TIER_REGULAR = 4
+
+# Only the first N tweets are scanned for verified authors, and only the first
+# N articles are shown (matches the training data format)
+MAX_VERIFIED_SCAN = 10
+MAX_ARTICLES = 10
+
+BULLISH_WORDS = {"bullish", "high", "rally", "gain", "buy", "success", "yes"}
+BEARISH_WORDS = {"bearish", "low", "dip", "drop", "sell", "fail", "no"}
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Unix time from a GDELT seendate, a Twitter createdAt or an RFC 2822 date."""
+    if not value:
+        return None
+    try:
+        # GDELT seendate: 20250101T120000Z
+        return datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        pass
+    try:
+        # Twitter createdAt: Tue Dec 10 07:00:30 +0000 2024
+        return datetime.strptime(value, "%a %b %d %H:%M:%S %z %Y").timestamp()
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class ContextItem:
+    kind: str
+    id: Optional[str]
+    tier: int
+    source: Optional[str]
+    text: Optional[str]
+    url: Optional[str] = None
+    timestamp: Optional[float] = None
+    engagement: int = 0
+
+    @classmethod
+    def from_article(cls, article: Dict) -> "ContextItem":
+        return cls(
+            kind=ARTICLE,
+            id=article.get("url"),
+            tier=TIER_NEWS,
+            source=article.get("domain"),
+            text=article.get("title"),
+            url=article.get("url"),
+            timestamp=parse_timestamp(article.get("seendate")),
+        )
+
+    @classmethod
+    def from_tweet(cls, tweet: Dict, tier: int) -> "ContextItem":
+        author = tweet.get("author", {})
+        engagement = sum(tweet.get(k) or 0 for k in ("likeCount", "retweetCount", "replyCount"))
+        return cls(
+            kind=TWEET,
+            id=str(tweet["id"]) if tweet.get("id") else None,
+            tier=tier,
+            source=author.get("userName"),
+            text=tweet["text"],
+            url=tweet.get("url"),
+            timestamp=parse_timestamp(tweet.get("createdAt")),
+            engagement=int(engagement),
+        )
+
+    @property
+    def display_source(self) -> str:
+        if self.kind == ARTICLE:
+            return f"{self.source}"
+        return f"@{self.source} (verified)" if self.tier == TIER_VERIFIED else f"@{self.source}"
+
+    @property
+    def display_text(self) -> str:
+        if self.kind == ARTICLE:
+            return f"{self.text}"
+        return self.text[:200] if self.tier == TIER_VERIFIED else self.text[:150]
+
+
+def tweet_items(tweets: List[Dict]) -> List[ContextItem]:
+    """Ranked raw tweets -> records; verified authors count only within the first MAX_VERIFIED_SCAN."""
+    items = []
+    for i, tweet in enumerate(tweets):
+        verified = tweet.get("author", {}).get("isBlueVerified")
+        if not verified:
+            items.append(ContextItem.from_tweet(tweet, TIER_REGULAR))
+        elif i < MAX_VERIFIED_SCAN:
+            items.append(ContextItem.from_tweet(tweet, TIER_VERIFIED))
+    return items
+
+
+def article_items(news: List[Dict]) -> List[ContextItem]:
+    """Ranked raw GDELT articles -> records (first MAX_ARTICLES)."""
+    return [ContextItem.from_article(a) for a in news[:MAX_ARTICLES]]
+
+
+@dataclass(frozen=True, slots=True)
+class MissingSource:
+    """A source that returned nothing usable before the context deadline."""
+
+    name: str
+    tiers: Tuple[int, ...]
+    reason: str
+
+
+@dataclass(frozen=True, slots=True)
+class MarketContext:
+    """Context items in relevance order, each already assigned to its prompt tier."""
+
+    items: Tuple[ContextItem, ...] = ()
+    missing: Tuple[MissingSource, ...] = ()
+
+    @classmethod
+    def from_raw(cls, news: List[Dict], tweets: List[Dict], missing: Tuple[MissingSource, ...] = ()) -> "MarketContext":
+        return cls(tuple(tweet_items(tweets) + article_items(news)), tuple(missing))
+
+    def tier(self, tier: int) -> List[ContextItem]:
+        return [item for item in self.items if item.tier == tier]
+
+    def missing_for(self, tier: int) -> List[MissingSource]:
+        return [m for m in self.missing if tier in m.tiers]
+
+    def prompt_order(self) -> List[ContextItem]:
+        """Items in the order they appear in the prompt (tier 1, 3, 4/5)."""
+        return self.tier(TIER_VERIFIED) + self.tier(TIER_NEWS) + self.tier(TIER_REGULAR)
+
+    def top_headlines(self, n: int = 3) -> List[Dict]:
+        """First n items of the prompt, for the dashboard cards."""
+        return [
+            {"source": item.display_source, "title": item.display_text, "tier": item.tier, "url": item.url}
+            for item in self.prompt_order()[:n]
+        ]
+
+    def sentiment(self) -> float:
+        """Rough bullish/bearish word balance in -1.0..1.0 for the UI heatmap."""
+        score = 0
+        for item in self.items:
+            for word in _WORD_RE.findall((item.text or "").lower()):
+                score += (word in BULLISH_WORDS) - (word in BEARISH_WORDS)
+        return max(-1.0, min(1.0, score / (abs(score) + 1)))
@@ -0,0 +1,196 @@
+"""
+Shared entity/keyword engine for building news and Twitter search queries.
+
+Market questions are tokenized once and scanned against a word-level trie
+compiled from entity_aliases.json (tickers, people, teams, leagues,
+countries, orgs, recurring topics). The longest alias wins at each
+position, so "Los Angeles Lakers" is one hit rather than "Los Angeles" +
+"Lakers". Matched entities are ranked by type and specificity; runs of
+capitalized words the dictionary doesn't know are kept as lower-ranked
+fallback terms. Results are memoized per question.
+
+Used by ContextService (live context), scripts/fetch_gdelt_news.py and
+scripts/fetch_twitter_data.py so all three build the same queries.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+ALIASES_FILE = Path(__file__).parent / "entity_aliases.json"
+
+TYPE_WEIGHTS = {
+    "crypto": 3.0,
+    "person": 3.0,
+    "team": 3.0,
+    "org": 2.5,
+    "league": 2.0,
+    "event": 2.0,
+    "country": 2.0,
+    "topic": 1.5,
+    "proper_noun": 1.0,
+}
+
+# Capitalized words that are never worth searching for on their own
+STOPWORDS = {
+    "will", "the", "and", "but", "for", "has", "does", "can", "who", "what", "when", "which", "how",
+    "yes", "any", "before", "after", "end", "than", "more", "less", "over", "under", "between",
+    "january", "february", "march", "april", "may", "june", "july", "august", "september",
+    "october", "november", "december", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep",
+    "sept", "oct", "nov", "dec", "monday", "tuesday", "wednesday", "thursday", "friday",
+    "saturday", "sunday", "q1", "q2", "q3", "q4", "et", "pm", "am", "utc",
+}
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+(?:[.&'-][A-Za-z0-9]+)*")
+_END = ""
+
+
+@dataclass(frozen=True)
+class Entity:
+    name: str
+    type: str
+    terms: Tuple[str, ...]
+    twitter: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Match:
+    entity: Entity
+    text: str
+    position: int
+    score: float
+
+
+def tokenize(text: str) -> List[str]:
+    """Word tokens with case preserved; possessive 's is dropped."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token.endswith(("'s", "'S")):
+            token = token[:-2]
+        tokens.append(token)
+    return tokens
+
+
+def _quote(term: str) -> str:
+    return f'"{term}"' if " " in term and not term.startswith('"') else term
+
+
+def gdelt_query(terms: Sequence[str]) -> str:
+    """
+    OR query in GDELT DOC syntax: phrases are quoted and single words under
+    four characters are dropped (GDELT rejects them) unless nothing else is left.
+    """
+    kept = [_quote(t) for t in terms if " " in t or len(t) >= 4]
+    if not kept:
+        kept = [terms[0]] if terms else ["news"]
+    return "(" + " OR ".join(kept) + ")"
+
+
+class KeywordEngine:
+    def __init__(self, entities: List[Dict], cache_size: int = 100_000):
+        self.entities: List[Entity] = []
+        self.trie: Dict = {}
+        for spec in entities:
+            entity = Entity(
+                name=spec["name"],
+                type=spec["type"],
+                terms=tuple(spec.get("terms") or [spec["name"]]),
+                twitter=tuple(_quote(t) for t in spec.get("twitter") or spec.get("terms") or [spec["name"]]),
+            )
+            self.entities.append(entity)
+            for alias in spec["aliases"]:
+                self._insert(tokenize(alias.lower()), entity)
+        self.analyze = lru_cache(maxsize=cache_size)(self._analyze)
+
+    def _insert(self, tokens: List[str], entity: Entity):
+        if not tokens:
+            return
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # First definition wins so the JSON order resolves alias collisions
+        node.setdefault(_END, entity)
+
+    @classmethod
+    @lru_cache(maxsize=1)
+    def default(cls) -> "KeywordEngine":
+        with open(ALIASES_FILE) as f:
+            return cls(json.load(f)["entities"])
+
+    def _scan(self, tokens: List[str]) -> List[Tuple[int, int, Entity]]:
+        """Longest alias match at each position, left to right, non-overlapping."""
+        lowered = [t.lower() for t in tokens]
+        hits = []
+        i, n = 0, len(tokens)
+        while i < n:
+            node, j, best = self.trie, i, None
+            while j < n and lowered[j] in node:
+                node = node[lowered[j]]
+                j += 1
+                if _END in node:
+                    best = (j, node[_END])
+            # Short one-word aliases (US, UN, SOL, Fed) must not be lowercase in the question
+            if best and best[0] - i == 1 and len(lowered[i]) <= 3 and tokens[i].islower():
+                best = None
+            if best:
+                hits.append((i, best[0], best[1]))
+                i = best[0]
+            else:
+                i += 1
+        return hits
+
+    def _analyze(self, question: str) -> Tuple[Match, ...]:
+        tokens = tokenize(question)
+        hits = self._scan(tokens)
+        covered = set()
+        matches: Dict[str, Match] = {}
+        for start, end, entity in hits:
+            covered.update(range(start, end))
+            score = TYPE_WEIGHTS.get(entity.type, 1.0) + 0.5 * (end - start - 1)
+            if entity.name not in matches or score > matches[entity.name].score:
+                matches[entity.name] = Match(entity, " ".join(tokens[start:end]), start, score)
+
+        # Runs of capitalized words the dictionary doesn't know ("Nikki Haley")
+        run: List[str] = []
+        for i, token in enumerate(tokens + [""]):
+            keep = (
+                i not in covered
+                and token[:1].isupper()
+                and len(token) > 2
+                and token.lower() not in STOPWORDS
+            )
+            if keep:
+                run.append(token)
+                continue
+            if run:
+                phrase = " ".join(run)
+                if phrase not in matches:
+                    entity = Entity(phrase, "proper_noun", (phrase,), (_quote(phrase),))
+                    score = TYPE_WEIGHTS["proper_noun"] + 0.25 * (len(run) - 1)
+                    matches[phrase] = Match(entity, phrase, i - len(run), score)
+                run = []
+
+        return tuple(sorted(matches.values(), key=lambda m: (-m.score, m.position)))
+
+    def keywords(self, question: str, limit: int = 5) -> List[str]:
+        """Ranked, de-duplicated news search terms."""
+        seen, terms = set(), []
+        for match in self.analyze(question):
+            for term in match.entity.terms:
+                if term.lower() not in seen:
+                    seen.add(term.lower())
+                    terms.append(term)
+        return terms[:limit]
+
+    def twitter_query(self, question: str, max_terms: int = 6, default: Optional[str] = None) -> Optional[str]:
+        """OR'd Twitter advanced-search query (handles, cashtags, hashtags), or default if nothing matched."""
+        seen, terms = set(), []
+        for match in self.analyze(question):
+            for term in match.entity.twitter:
+                if term.lower() not in seen:
+                    seen.add(term.lower())
+                    terms.append(term)
+        return " OR ".join(terms[:max_terms]) if terms else default
@@ -0,0 +1,78 @@
+"""
+Thread-safe fixed-bucket latency histograms for upstream calls and model decoding.
+"""
+
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+# Upper bounds in seconds; the last bucket is open-ended
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.total += 1
+            self.sum += seconds
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile (None if empty or in the open bucket)."""
+        with self._lock:
+            if not self.total:
+                return None
+            target = q * self.total
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    return self.buckets[i] if i < len(self.buckets) else None
+        return None
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            labels: List[str] = [f"<={b:g}s" for b in self.buckets] + [f">{self.buckets[-1]:g}s"]
+            return {
+                "count": self.total,
+                "mean": round(self.sum / self.total, 3) if self.total else None,
+                "buckets": dict(zip(labels, self.counts)),
+            }
+
+
+class GenerationStats:
+    """Requests, generated tokens and latency for one decode path."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.latency = LatencyHistogram(buckets)
+        self.requests = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, tokens: int):
+        self.latency.observe(seconds)
+        with self._lock:
+            self.requests += 1
+            self.tokens += tokens
+            self.seconds += seconds
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            requests, tokens, seconds = self.requests, self.tokens, self.seconds
+        return {
+            "requests": requests,
+            "tokens_per_request": round(tokens / requests, 1) if requests else None,
+            # Generated tokens over whole-request time (prompt processing included)
+            "tokens_per_second": round(tokens / seconds, 1) if seconds else None,
+            "latency_p50": self.latency.percentile(0.5),
+            "latency_p95": self.latency.percentile(0.95),
+            "latency": self.latency.snapshot(),
+        }
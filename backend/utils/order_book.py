@@ -0,0 +1,274 @@
+"""
+Order book microstructure signals from CLOB books.
+
+A raw /book response is parsed once into sorted NumPy arrays (bids best
+first, asks best first) with cumulative share and USD columns. Spread,
+depth in price bands around the mid, imbalance and the fill price of any
+number of buy sizes are then searchsorted lookups on those columns.
+Simulating every candidate bet size for every Pro user is a single
+vectorized call per book.
+
+OrderBookCache holds parsed books for a few seconds and fetches everything
+missing or expired in one bulk request (POST /books).
+
+Usage:
+    python utils/order_book.py --benchmark
+"""
+
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Half-widths around the mid (in price units, 0.01 = 1 cent) for depth and imbalance
+DEPTH_BANDS = (0.01, 0.02, 0.05)
+IMBALANCE_BAND = 0.05
+# Buy sizes (USD) whose slippage is shown to the model
+SLIPPAGE_SIZES = (100.0, 1000.0)
+BOOK_TTL_SECONDS = 5.0
+
+
+def _levels(levels: Optional[List[Dict]], descending: bool) -> Tuple[np.ndarray, np.ndarray]:
+    prices = np.array([float(level["price"]) for level in levels or []], dtype=np.float64)
+    sizes = np.array([float(level["size"]) for level in levels or []], dtype=np.float64)
+    order = np.argsort(-prices if descending else prices, kind="stable")
+    prices, sizes = prices[order], sizes[order]
+    keep = sizes > 0
+    return prices[keep], sizes[keep]
+
+
+@dataclass(frozen=True, slots=True)
+class Fills:
+    """Result of simulating buys of several USD amounts (one entry per amount)."""
+
+    usd: np.ndarray
+    filled_usd: np.ndarray
+    shares: np.ndarray
+    avg_price: np.ndarray
+    # Average price above the best ask, relative to it (0.02 = paid 2% over the touch)
+    slippage: np.ndarray
+
+
+@dataclass(frozen=True, slots=True)
+class BookSignals:
+    """Scalar summary of one book for prompts and dashboards. Depths are USD notionals per DEPTH_BANDS."""
+
+    best_bid: Optional[float]
+    best_ask: Optional[float]
+    mid: Optional[float]
+    spread: Optional[float]
+    bid_depth: Tuple[float, ...]
+    ask_depth: Tuple[float, ...]
+    imbalance: Optional[float]
+    slippage: Tuple[Optional[float], ...]
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+class OrderBook:
+    __slots__ = ("token_id", "timestamp", "bid_prices", "bid_sizes", "ask_prices", "ask_sizes", "_ask_shares", "_ask_cost")
+
+    def __init__(self, token_id: Optional[str], bids: Tuple[np.ndarray, np.ndarray], asks: Tuple[np.ndarray, np.ndarray], timestamp: Optional[float] = None):
+        self.token_id = token_id
+        self.timestamp = timestamp
+        self.bid_prices, self.bid_sizes = bids
+        self.ask_prices, self.ask_sizes = asks
+        # Cumulative shares / USD spent when sweeping the asks from the best level
+        self._ask_shares = np.cumsum(self.ask_sizes)
+        self._ask_cost = np.cumsum(self.ask_prices * self.ask_sizes)
+
+    @classmethod
+    def from_raw(cls, raw: Dict) -> "OrderBook":
+        """From a CLOB /book response ({"asset_id", "bids": [{"price", "size"}], "asks": [...]})."""
+        timestamp = raw.get("timestamp")
+        return cls(
+            raw.get("asset_id"),
+            _levels(raw.get("bids"), descending=True),
+            _levels(raw.get("asks"), descending=False),
+            float(timestamp) / 1000 if timestamp else None,
+        )
+
+    @property
+    def best_bid(self) -> Optional[float]:
+        return float(self.bid_prices[0]) if len(self.bid_prices) else None
+
+    @property
+    def best_ask(self) -> Optional[float]:
+        return float(self.ask_prices[0]) if len(self.ask_prices) else None
+
+    @property
+    def mid(self) -> Optional[float]:
+        if self.best_bid is None or self.best_ask is None:
+            return self.best_bid if self.best_ask is None else self.best_ask
+        return (self.best_bid + self.best_ask) / 2
+
+    @property
+    def spread(self) -> Optional[float]:
+        if self.best_bid is None or self.best_ask is None:
+            return None
+        return self.best_ask - self.best_bid
+
+    def depth(self, bands: Sequence[float] = DEPTH_BANDS) -> Tuple[np.ndarray, np.ndarray]:
+        """USD notional resting within each band of the mid: (bid_depths, ask_depths)."""
+        bands = np.asarray(bands, dtype=np.float64)
+        mid = self.mid
+        if mid is None:
+            return np.zeros(len(bands)), np.zeros(len(bands))
+        bid_cost = np.concatenate(([0.0], np.cumsum(self.bid_prices * self.bid_sizes)))
+        ask_cost = np.concatenate(([0.0], self._ask_cost))
+        # Bids are descending, so search on negated prices
+        bid_n = np.searchsorted(-self.bid_prices, -(mid - bands) + 1e-12, side="right")
+        ask_n = np.searchsorted(self.ask_prices, mid + bands + 1e-12, side="right")
+        return bid_cost[bid_n], ask_cost[ask_n]
+
+    def imbalance(self, band: float = IMBALANCE_BAND) -> Optional[float]:
+        """(bid - ask) / (bid + ask) depth within band of the mid, in -1..1 (positive = buyers heavier)."""
+        bids, asks = self.depth((band,))
+        total = bids[0] + asks[0]
+        return float((bids[0] - asks[0]) / total) if total else None
+
+    def simulate_buy(self, usd: Union[float, Sequence[float], np.ndarray]) -> Fills:
+        """
+        Sweeps the asks for each USD amount. Amounts beyond the visible book are
+        filled only up to its total (filled_usd < usd).
+        """
+        usd = np.atleast_1d(np.asarray(usd, dtype=np.float64))
+        if not len(self.ask_prices):
+            zeros = np.zeros_like(usd)
+            nan = np.full_like(usd, np.nan)
+            return Fills(usd, zeros, zeros, nan, nan)
+        total_cost = self._ask_cost[-1]
+        filled = np.minimum(usd, total_cost)
+        # Level where each amount runs out, and what was bought before reaching it
+        level = np.minimum(np.searchsorted(self._ask_cost, filled, side="left"), len(self.ask_prices) - 1)
+        cost_before = np.where(level > 0, self._ask_cost[level - 1], 0.0)
+        shares_before = np.where(level > 0, self._ask_shares[level - 1], 0.0)
+        shares = shares_before + (filled - cost_before) / self.ask_prices[level]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg = np.where(shares > 0, filled / shares, self.ask_prices[0])
+        return Fills(usd, filled, shares, avg, avg / self.ask_prices[0] - 1.0)
+
+    def max_buy_within(self, max_slippage: float) -> float:
+        """Largest USD buy whose average price stays within max_slippage of the best ask."""
+        if not len(self.ask_prices):
+            return 0.0
+        target = self.ask_prices[0] * (1.0 + max_slippage)
+        level_avg = self._ask_cost / self._ask_shares
+        # First level whose full sweep would average above the target
+        k = int(np.searchsorted(level_avg, target, side="right"))
+        if k >= len(self.ask_prices):
+            return float(self._ask_cost[-1])
+        cost_before = self._ask_cost[k - 1] if k else 0.0
+        shares_before = self._ask_shares[k - 1] if k else 0.0
+        price = self.ask_prices[k]
+        # Solve A / (S + (A - C) / p) = target for A within level k
+        amount = target * (shares_before * price - cost_before) / (price - target)
+        return float(max(cost_before, amount))
+
+    def signals(self, bands: Sequence[float] = DEPTH_BANDS, sizes: Sequence[float] = SLIPPAGE_SIZES) -> BookSignals:
+        bids, asks = self.depth(bands)
+        fills = self.simulate_buy(sizes)
+        slippage = tuple(
+            None if np.isnan(s) or f < u else round(float(s), 4)
+            for s, f, u in zip(fills.slippage, fills.filled_usd, fills.usd)
+        )
+
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value, 4)
+
+        return BookSignals(
+            best_bid=rounded(self.best_bid),
+            best_ask=rounded(self.best_ask),
+            mid=rounded(self.mid),
+            spread=rounded(self.spread),
+            bid_depth=tuple(round(float(d), 2) for d in bids),
+            ask_depth=tuple(round(float(d), 2) for d in asks),
+            imbalance=rounded(self.imbalance()),
+            slippage=slippage,
+        )
+
+
+class OrderBookCache:
+    """Parsed books keyed by token id, refreshed in bulk after a short TTL."""
+
+    _default: Optional["OrderBookCache"] = None
+
+    def __init__(self, ttl: float = BOOK_TTL_SECONDS):
+        self.ttl = ttl
+        self._books: Dict[str, Tuple[float, OrderBook]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def default(cls) -> "OrderBookCache":
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def get_many(self, token_ids: Iterable[str], fetch_many: Callable[[List[str]], List[Dict]]) -> Dict[str, OrderBook]:
+        """
+        Books for token_ids; those missing or older than the TTL are fetched
+        with a single fetch_many(token_ids) call. Tokens the upstream didn't
+        return are left out.
+        """
+        now = time.monotonic()
+        wanted = list(dict.fromkeys(t for t in token_ids if t))
+        result: Dict[str, OrderBook] = {}
+        stale: List[str] = []
+        with self._lock:
+            for token_id in wanted:
+                cached = self._books.get(token_id)
+                if cached and now - cached[0] < self.ttl:
+                    result[token_id] = cached[1]
+                    self.hits += 1
+                else:
+                    stale.append(token_id)
+                    self.misses += 1
+        if stale:
+            fetched = {}
+            for raw in fetch_many(stale) or []:
+                book = OrderBook.from_raw(raw)
+                if book.token_id in stale:
+                    fetched[book.token_id] = book
+            with self._lock:
+                for token_id, book in fetched.items():
+                    self._books[token_id] = (now, book)
+            result.update(fetched)
+        return result
+
+    def get(self, token_id: str, fetch_many: Callable[[List[str]], List[Dict]]) -> Optional[OrderBook]:
+        return self.get_many([token_id], fetch_many).get(token_id)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Order book slippage benchmark")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--levels", type=int, default=200)
+    parser.add_argument("--sizes", type=int, default=100_000, help="candidate bet sizes (users x sizes)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    asks = [{"price": f"{0.50 + 0.001 * i:.3f}", "size": f"{rng.uniform(10, 2000):.2f}"} for i in range(args.levels)]
+    bids = [{"price": f"{0.49 - 0.001 * i:.3f}", "size": f"{rng.uniform(10, 2000):.2f}"} for i in range(args.levels)]
+    raw = {"asset_id": "bench", "bids": bids, "asks": asks}
+
+    start = time.perf_counter()
+    book = OrderBook.from_raw(raw)
+    parsed = time.perf_counter() - start
+    sizes = rng.uniform(1, 5000, args.sizes)
+    start = time.perf_counter()
+    book.simulate_buy(sizes)
+    simulated = time.perf_counter() - start
+    start = time.perf_counter()
+    book.signals()
+    summarized = time.perf_counter() - start
+
+    print(f"parse {args.levels * 2} levels: {parsed * 1000:.2f} ms")
+    print(f"simulate {args.sizes:,} buy sizes: {simulated * 1000:.1f} ms")
+    print(f"signals: {summarized * 1000:.2f} ms")
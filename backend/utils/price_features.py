@@ -0,0 +1,278 @@
+"""
+Vectorized price-history features for the PRICE SIGNALS prompt block.
+
+Polymarket's prices-history endpoint returns the whole YES price series,
+but only its last point used to reach the model. This module turns the
+series into a handful of compact signals: point changes over 1h/24h/7d,
+realized volatility, momentum against the 24h average, time since the
+last big move and 24h/7d average prices and ranges.
+
+All markets are computed in one pass. The series are concatenated into
+flat arrays and each market is a segment of them; windows come from one
+searchsorted over segment-shifted timestamps, and sums come from prefix
+sums. No per-market Python loop is needed.
+
+The history carries no per-point volume, so the "VWAP-style" aggregates
+are time averages over the sampled points. The CLOB samples at a fixed
+fidelity, so this equals a TWAP.
+
+PriceHistoryCache keeps each market's recent series, only appends points
+newer than the last one it has (so refreshes can ask the API for just
+those), and recomputes a market's features only when it changed.
+
+Usage:
+    python utils/price_features.py --benchmark
+"""
+
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+HOUR = 3600.0
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+# A single-sample change at least this large (in price units, 0.05 = 5 pts) counts as a big move
+BIG_MOVE = 0.05
+# Points older than this are dropped from the cache (the 7d window plus a margin)
+MAX_HISTORY_SECONDS = 8 * DAY
+
+Series = Tuple[np.ndarray, np.ndarray]
+
+
+def parse_history(raw: Union[Dict, List, None]) -> Series:
+    """
+    (timestamps, prices) float64 arrays sorted by time, from a prices-history
+    response: {"history": [{"t", "p"}, ...]} or a bare list of {"t"/"timestamp", "p"/"price"}.
+    """
+    points = raw.get("history", []) if isinstance(raw, dict) else raw or []
+    ts, prices = [], []
+    for point in points:
+        t = point.get("t", point.get("timestamp"))
+        p = point.get("p", point.get("price"))
+        if t is None or p is None:
+            continue
+        ts.append(float(t))
+        prices.append(float(p))
+    ts_arr, p_arr = np.asarray(ts, dtype=np.float64), np.asarray(prices, dtype=np.float64)
+    order = np.argsort(ts_arr, kind="stable")
+    return ts_arr[order], p_arr[order]
+
+
+@dataclass(frozen=True, slots=True)
+class PriceFeatures:
+    """Signals for one market. Prices and changes are in price units (0-1); None means not enough history."""
+
+    points: int
+    last_price: Optional[float] = None
+    change_1h: Optional[float] = None
+    change_24h: Optional[float] = None
+    change_7d: Optional[float] = None
+    volatility_24h: Optional[float] = None
+    momentum: Optional[float] = None
+    twap_24h: Optional[float] = None
+    twap_7d: Optional[float] = None
+    low_7d: Optional[float] = None
+    high_7d: Optional[float] = None
+    last_big_move: Optional[float] = None
+    hours_since_big_move: Optional[float] = None
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+def compute_features(histories: Sequence[Series], now: Union[float, np.ndarray, None] = None) -> Dict[str, np.ndarray]:
+    """
+    Feature columns for many markets at once (one row per history, NaN where
+    a market has no points). Windows end at `now`, or at each market's last
+    point if not given.
+    """
+    n = len(histories)
+    lengths = np.fromiter((len(ts) for ts, _ in histories), dtype=np.int64, count=n)
+    nan = np.full(n, np.nan)
+    columns = {name: nan.copy() for name in PriceFeatures.__dataclass_fields__ if name != "points"}
+    columns["points"] = lengths
+    if not lengths.any():
+        return columns
+
+    ts = np.concatenate([h[0] for h in histories])
+    p = np.concatenate([h[1] for h in histories])
+    total = len(ts)
+    has = lengths > 0
+    seg = np.repeat(np.arange(n), lengths)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    last = starts + lengths - 1
+    # Keep empty segments' indices in range; their rows are masked out at the end
+    last_safe = np.clip(last, 0, total - 1)
+    starts_safe = np.minimum(starts, last_safe)
+
+    anchor = ts[last_safe] if now is None else np.broadcast_to(np.asarray(now, dtype=np.float64), (n,))
+
+    # Shift each segment far past the previous one so one searchsorted serves all markets
+    t0 = min(ts.min(), float(np.min(anchor)) - WEEK)
+    offset = max(ts.max(), float(np.max(anchor))) - t0 + 1.0
+    shifted = ts - t0 + seg * offset
+    base = np.arange(n) * offset - t0
+
+    def at_or_before(window: float) -> np.ndarray:
+        """Index of the last point at or before anchor - window (the first point if none)."""
+        idx = np.searchsorted(shifted, anchor - window + base, side="right") - 1
+        return np.clip(idx, starts_safe, last_safe)
+
+    def first_within(window: float) -> np.ndarray:
+        """Index of the first point after anchor - window (the last point if none)."""
+        idx = np.searchsorted(shifted, anchor - window + base, side="right")
+        return np.clip(idx, starts_safe, last_safe)
+
+    last_p = p[last_safe]
+    price_cum = np.concatenate(([0.0], np.cumsum(p)))
+
+    # Per-sample changes; the first point of each segment has none
+    diff = np.zeros(total)
+    diff[1:] = p[1:] - p[:-1]
+    diff[starts[has]] = 0.0
+    diff_sq_cum = np.concatenate(([0.0], np.cumsum(diff * diff)))
+
+    out = {
+        "last_price": last_p,
+        "change_1h": last_p - p[at_or_before(HOUR)],
+        "change_24h": last_p - p[at_or_before(DAY)],
+        "change_7d": last_p - p[at_or_before(WEEK)],
+    }
+
+    day_from = first_within(DAY)
+    week_from = first_within(WEEK)
+    out["twap_24h"] = (price_cum[last_safe + 1] - price_cum[day_from]) / (last_safe + 1 - day_from)
+    out["twap_7d"] = (price_cum[last_safe + 1] - price_cum[week_from]) / (last_safe + 1 - week_from)
+    out["momentum"] = last_p - out["twap_24h"]
+    # Realized volatility: root of summed squared changes inside the window
+    out["volatility_24h"] = np.sqrt(diff_sq_cum[last_safe + 1] - diff_sq_cum[day_from + 1])
+
+    # Segmented min/max over the 7d window (pairs of [from, to) indices; a sentinel keeps to < len)
+    bounds = np.stack([week_from, last_safe + 1], axis=1).ravel()
+    out["high_7d"] = np.maximum.reduceat(np.append(p, -np.inf), bounds)[::2]
+    out["low_7d"] = np.minimum.reduceat(np.append(p, np.inf), bounds)[::2]
+
+    # Most recent big move at or before each segment's last point
+    big = np.where(np.abs(diff) >= BIG_MOVE - 1e-12, np.arange(total), -1)
+    latest_big = np.maximum.accumulate(big)[last_safe]
+    found = latest_big >= starts_safe
+    move_idx = np.where(found, latest_big, 0)
+    out["last_big_move"] = np.where(found, diff[move_idx], np.nan)
+    out["hours_since_big_move"] = np.where(found, (anchor - ts[move_idx]) / HOUR, np.nan)
+
+    for name, values in out.items():
+        columns[name] = np.where(has, values, np.nan)
+    return columns
+
+
+def features_for(history: Series, now: Optional[float] = None) -> PriceFeatures:
+    """Features for a single market."""
+    return _row(compute_features([history], now), 0)
+
+
+def _row(columns: Dict[str, np.ndarray], i: int) -> PriceFeatures:
+    values = {}
+    for name, column in columns.items():
+        value = column[i]
+        if name == "points":
+            values[name] = int(value)
+        else:
+            values[name] = None if np.isnan(value) else round(float(value), 4)
+    return PriceFeatures(**values)
+
+
+class PriceHistoryCache:
+    """Per-market recent price series with incremental appends and cached features."""
+
+    _default: Optional["PriceHistoryCache"] = None
+
+    def __init__(self, max_age: float = MAX_HISTORY_SECONDS):
+        self.max_age = max_age
+        self._series: Dict[str, Series] = {}
+        self._features: Dict[str, Tuple[float, PriceFeatures]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "PriceHistoryCache":
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def last_ts(self, market_id: str) -> Optional[float]:
+        with self._lock:
+            ts, _ = self._series.get(market_id, (None, None))
+            return float(ts[-1]) if ts is not None and len(ts) else None
+
+    def extend(self, market_id: str, raw: Union[Dict, List, None]) -> int:
+        """Appends points newer than what is cached; returns how many were added."""
+        new_ts, new_p = parse_history(raw)
+        with self._lock:
+            ts, p = self._series.get(market_id, (np.empty(0), np.empty(0)))
+            if len(ts):
+                newer = new_ts > ts[-1]
+                new_ts, new_p = new_ts[newer], new_p[newer]
+            if not len(new_ts):
+                return 0
+            ts, p = np.concatenate([ts, new_ts]), np.concatenate([p, new_p])
+            keep = ts >= ts[-1] - self.max_age
+            self._series[market_id] = (ts[keep], p[keep])
+            self._features.pop(market_id, None)
+            return len(new_ts)
+
+    def refresh(self, market_id: str, fetch: Callable[[Optional[float]], Union[Dict, List, None]]) -> PriceFeatures:
+        """
+        Fetches only points after the last cached one (fetch(start_ts), None on
+        first use) and returns the market's features.
+        """
+        self.extend(market_id, fetch(self.last_ts(market_id)))
+        return self.features(market_id)
+
+    def features(self, market_id: str, now: Optional[float] = None) -> PriceFeatures:
+        now = time.time() if now is None else now
+        with self._lock:
+            cached = self._features.get(market_id)
+            # Windows slide with time, so a cached row is only reused within the same minute
+            if cached and now - cached[0] < 60:
+                return cached[1]
+            history = self._series.get(market_id, (np.empty(0), np.empty(0)))
+        features = features_for(history, now)
+        with self._lock:
+            self._features[market_id] = (now, features)
+        return features
+
+    def features_batch(self, market_ids: Sequence[str], now: Optional[float] = None) -> List[PriceFeatures]:
+        """Features for many markets in one vectorized pass (e.g. for a full scan)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            histories = [self._series.get(m, (np.empty(0), np.empty(0))) for m in market_ids]
+        columns = compute_features(histories, now)
+        return [_row(columns, i) for i in range(len(market_ids))]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Price feature benchmark")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--markets", type=int, default=10_000)
+    parser.add_argument("--points", type=int, default=200, help="hourly points per market")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    now = time.time()
+    histories = []
+    for _ in range(args.markets):
+        n = int(rng.integers(1, args.points + 1))
+        ts = now - HOUR * np.arange(n)[::-1]
+        prices = np.clip(0.5 + np.cumsum(rng.normal(0, 0.02, n)), 0.01, 0.99)
+        histories.append((ts, prices))
+
+    start = time.perf_counter()
+    columns = compute_features(histories, now)
+    elapsed = time.perf_counter() - start
+    total = int(columns["points"].sum())
+    print(f"{args.markets} markets, {total:,} points: {elapsed * 1000:.0f} ms")
@@ -1,4 +1,44 @@
-from typing import List, Dict
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+
+from utils.context_models import TIER_NEWS, TIER_REGULAR, TIER_VERIFIED, ContextItem, MarketContext
+from utils.order_book import DEPTH_BANDS, SLIPPAGE_SIZES, BookSignals
+from utils.price_features import PriceFeatures
+from utils.token_counter import TokenCounter, get_estimating_counter
+
+SEPARATOR = "============================================================"
+
+# Sections in prompt order; packing priority follows the same order
+TIER_SECTIONS = [
+    (TIER_VERIFIED, "TIER 1: VERIFIED SOURCES [WEIGHT: 3x, RELIABILITY: 95%]"),
+    (TIER_NEWS, "TIER 3: PROFESSIONAL NEWS [WEIGHT: 2x, RELIABILITY: 80%]"),
+    (TIER_REGULAR, "TIER 4/5: REGULAR & SUSPICIOUS [WEIGHT: 0x-1x]"),
+]
+
+# Llama 3.1 Instruct wrapper (must match training/pretokenize.PROMPT_TEMPLATE)
+MODEL_PROMPT_TEMPLATE = """<|begin_of_text|><|start_header_id|>user<|end_header_id|>
+
+{input}
+
+RESPONSE FORMAT (JSON ONLY):
+- "market_probability", "fair_probability", "edge_percentage"
+- "action", "confidence", "edge_quality", "signal_agreement"
+- "reasoning", "key_signals", "ignored_signals", "risk_factors"
+<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+
+"""
+
+
+@dataclass
+class PackedPrompt:
+    input_text: str
+    context: str
+    kept: MarketContext
+    prompt_tokens: int
+    exact: bool
+    items_kept: int
+    items_dropped: int
+
 
 class PromptBuilder:
     """
@@ -6,12 +46,16 @@ class PromptBuilder:
     Ensures that live data is formatted EXACTLY like the training data.
     """
     
+    MAX_SEQ_LENGTH = 2048
+    RESPONSE_TOKENS = 500
+
     @staticmethod
     def build_analysis_input(
         question: str, 
         current_price: float, 
         volume: float, 
-        news_context: str
+        news_context: str,
+        price_signals: str = ""
     ) -> str:
         """
         Formats raw market data into the 'input' string the model expects.
@@ -22,12 +66,149 @@ class PromptBuilder:
         input_text += f"Current YES Price: {int(current_price * 100)}%\n"
         input_text += f"Volume: ${volume:,.2f}\n\n"
         
+        # Optional PRICE SIGNALS block (format_price_signals) ahead of the tiers
+        if price_signals:
+            input_text += price_signals + "\n"
+        
         # news_context should already contain the Tiered formatting 
         # (e.g., TIER 1: VERIFIED SOURCES...)
         input_text += news_context
         
         return input_text
 
+    @staticmethod
+    def format_model_prompt(input_text: str) -> str:
+        """Wraps the analysis input in the chat template the model was fine-tuned on."""
+        return MODEL_PROMPT_TEMPLATE.format(input=input_text)
+
+    @staticmethod
+    def format_price_signals(features: Optional[PriceFeatures]) -> str:
+        """Compact PRICE SIGNALS block from price-history features (empty without history)."""
+        if features is None or not features.points:
+            return ""
+
+        def pct(value: Optional[float]) -> str:
+            return "n/a" if value is None else f"{value * 100:.0f}%"
+
+        def pts(value: Optional[float]) -> str:
+            return "n/a" if value is None else f"{value * 100:+.1f} pts"
+
+        lines = [
+            f"- Change: 1h {pts(features.change_1h)} | 24h {pts(features.change_24h)} | 7d {pts(features.change_7d)}\n",
+            f"- 24h average: {pct(features.twap_24h)} (momentum {pts(features.momentum)}) | 7d average: {pct(features.twap_7d)}\n",
+            f"- 7d range: {pct(features.low_7d)}-{pct(features.high_7d)} | 24h volatility: {(features.volatility_24h or 0) * 100:.1f} pts\n",
+        ]
+        if features.last_big_move is not None:
+            lines.append(f"- Last big move: {pts(features.last_big_move)}, {features.hours_since_big_move:.0f}h ago\n")
+        else:
+            lines.append("- Last big move: none in the last 7d\n")
+        return f"{SEPARATOR}\nPRICE SIGNALS\n{SEPARATOR}\n" + "".join(lines)
+
+    @staticmethod
+    def format_order_book(signals: Optional[BookSignals]) -> str:
+        """Compact ORDER BOOK block for the YES token (empty without a book)."""
+        if signals is None or signals.mid is None:
+            return ""
+
+        def pct(value: Optional[float]) -> str:
+            return "none" if value is None else f"{value * 100:.0f}%"
+
+        bands = "/".join(f"{band * 100:g}" for band in DEPTH_BANDS)
+        bids = "/".join(f"${depth:,.0f}" for depth in signals.bid_depth)
+        asks = "/".join(f"${depth:,.0f}" for depth in signals.ask_depth)
+        spread = "n/a" if signals.spread is None else f"{signals.spread * 100:.1f} pts"
+        imbalance = "n/a" if signals.imbalance is None else f"{signals.imbalance:+.2f}"
+        slippage = " | ".join(
+            f"${size:,.0f} " + ("exceeds visible book" if slip is None else f"{slip * 100:+.1f}%")
+            for size, slip in zip(SLIPPAGE_SIZES, signals.slippage)
+        )
+        lines = [
+            f"- Bid {pct(signals.best_bid)} / Ask {pct(signals.best_ask)} | spread {spread}\n",
+            f"- Depth within {bands} pts of mid: bids {bids} | asks {asks}\n",
+            f"- Imbalance: {imbalance} (positive = more bids)\n",
+            f"- Slippage to buy YES: {slippage}\n",
+        ]
+        return f"{SEPARATOR}\nORDER BOOK\n{SEPARATOR}\n" + "".join(lines)
+
+    @staticmethod
+    def format_item(item: ContextItem) -> str:
+        """One context line, exactly as in the training data."""
+        return f"- {item.display_source}: \"{item.display_text}\"\n"
+
+    @staticmethod
+    def render_context(context: MarketContext) -> str:
+        """Formats the God-Tier context block. Section headers are always present."""
+        blocks = []
+        for tier, header in TIER_SECTIONS:
+            lines = "".join(PromptBuilder.format_item(item) for item in context.tier(tier))
+            # Tell the model when a section is empty because a source failed, not because it was quiet
+            lines += "".join(f"- [SOURCE UNAVAILABLE] {m.name}: {m.reason}\n" for m in context.missing_for(tier))
+            blocks.append(f"{SEPARATOR}\n{header}\n{SEPARATOR}\n" + lines)
+        return "\n".join(blocks)
+
+    @classmethod
+    def format_context(cls, news: List[Dict], tweets: List[Dict]) -> str:
+        """Formats raw GDELT articles and TwitterAPI.io tweets."""
+        return cls.render_context(MarketContext.from_raw(news, tweets))
+
+    @classmethod
+    def build_packed_input(
+        cls,
+        question: str,
+        current_price: float,
+        volume: float,
+        context: MarketContext,
+        counter: Optional[TokenCounter] = None,
+        max_seq_length: int = MAX_SEQ_LENGTH,
+        response_tokens: int = RESPONSE_TOKENS,
+        price_signals: str = "",
+    ) -> PackedPrompt:
+        """
+        Builds the analysis input with as many context items as fit in
+        max_seq_length minus room for the response. Items are taken in
+        tier order (1, 3, 4/5) and, within a tier, in relevance order;
+        the prompt keeps its normal section layout.
+        """
+        counter = counter or get_estimating_counter()
+        limit = max_seq_length - response_tokens
+
+        def render(kept: MarketContext):
+            context_text = cls.render_context(kept)
+            return cls.build_analysis_input(question, current_price, volume, context_text, price_signals), context_text
+
+        budget = limit - counter.count_prompt(cls.format_model_prompt(render(MarketContext(missing=context.missing))[0]))
+
+        # Greedy fill from cached per-line counts, in prompt (= priority) order
+        priority = {tier: rank for rank, (tier, _) in enumerate(TIER_SECTIONS)}
+        order = sorted(range(len(context.items)), key=lambda i: priority[context.items[i].tier])
+        chosen: List[int] = []
+        used = 0
+        for i in order:
+            cost = counter.count(cls.format_item(context.items[i]))
+            if used + cost <= budget:
+                chosen.append(i)
+                used += cost
+
+        # Line counts are additive only up to BPE merges at line boundaries,
+        # so verify once on the real prompt and shed lowest-priority lines if needed
+        while True:
+            kept = MarketContext(tuple(context.items[i] for i in sorted(chosen)), context.missing)
+            input_text, context_text = render(kept)
+            prompt_tokens = counter.count_prompt(cls.format_model_prompt(input_text))
+            if prompt_tokens <= limit or not chosen:
+                break
+            chosen.pop()
+
+        return PackedPrompt(
+            input_text=input_text,
+            context=context_text,
+            kept=kept,
+            prompt_tokens=prompt_tokens,
+            exact=counter.exact,
+            items_kept=len(chosen),
+            items_dropped=len(context.items) - len(chosen),
+        )
+
     @staticmethod
     def format_news_snippet(source: str, tier: int, content: str, engagement: str = "") -> str:
         """
@@ -0,0 +1,155 @@
+"""
+CPU relevance ranking and near-duplicate removal for context items.
+
+Items (headlines, tweets) are embedded with a signed hashing vectorizer
+over word unigrams + bigrams (log TF, L2-normalized), so there is no model
+to load and no vocabulary to fit. Similarity is a NumPy dot product.
+Items are ranked by cosine similarity to the market question (expanded
+with the keyword engine's terms, so "BTC" also scores "Bitcoin" tweets),
+then greedily de-duplicated: an item is dropped if it is too close to one
+already kept. Embeddings are cached by item id.
+
+Usage:
+    python utils/relevance.py --benchmark
+"""
+
+import re
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+DIM = 2 ** 12
+DEDUP_THRESHOLD = 0.8
+
+_WORD_RE = re.compile(r"[a-z0-9$#@]+(?:['.][a-z0-9]+)*")
+# Words that carry no topical signal and only inflate similarity between unrelated items
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "of", "to", "in", "on", "at", "by", "for", "with", "is", "are",
+    "was", "were", "be", "been", "will", "it", "its", "this", "that", "as", "from", "has", "have", "had",
+    "not", "rt", "just", "i", "you", "we", "they", "he", "she", "my", "our", "your", "their", "his", "her",
+}
+
+
+def _features(text: str) -> List[str]:
+    words = [w.lstrip("$#@") for w in _WORD_RE.findall(text.lower())]
+    words = [w for w in words if w and w not in _STOPWORDS and not w.startswith("http")]
+    # Crude plural folding ("ETFs" ~ "ETF") is enough for headline dedup
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words]
+    return words + [a + " " + b for a, b in zip(words, words[1:])]
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int = DIM, cache_size: int = 50_000):
+        self.dim = dim
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        features = _features(text)
+        if not features:
+            return vec
+        hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vec, hashes % self.dim, signs)
+        # Sublinear TF, then unit length so dot product == cosine
+        vec = np.sign(vec) * np.log1p(np.abs(vec))
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed(self, texts: Sequence[str], ids: Optional[Sequence[str]] = None) -> np.ndarray:
+        """(len(texts), dim) float32 matrix; rows for known ids come from the cache."""
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            key = ids[i] if ids is not None and ids[i] else None
+            if key is not None and key in self._cache:
+                self._cache.move_to_end(key)
+                out[i] = self._cache[key]
+                self.hits += 1
+                continue
+            out[i] = self._embed_one(text)
+            if key is not None:
+                self.misses += 1
+                self._cache[key] = out[i].copy()
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return out
+
+
+_embedder: Optional[HashingEmbedder] = None
+
+
+def get_embedder() -> HashingEmbedder:
+    global _embedder
+    if _embedder is None:
+        _embedder = HashingEmbedder()
+    return _embedder
+
+
+def rank_items(
+    query: str,
+    items: List[Dict],
+    text_fn: Callable[[Dict], str],
+    id_fn: Callable[[Dict], Optional[str]] = lambda item: None,
+    k: Optional[int] = None,
+    dedup_threshold: float = DEDUP_THRESHOLD,
+    embedder: Optional[HashingEmbedder] = None,
+) -> List[Dict]:
+    """
+    Returns items ordered by similarity to query with near-duplicates removed
+    (cosine >= dedup_threshold to a better-ranked item), truncated to k.
+    Ties keep their incoming order.
+    """
+    if not items:
+        return []
+    embedder = embedder or get_embedder()
+    vectors = embedder.embed([text_fn(item) or "" for item in items], [id_fn(item) for item in items])
+    query_vec = embedder.embed([query])[0]
+    scores = vectors @ query_vec
+
+    order = np.argsort(-scores, kind="stable")
+    kept: List[int] = []
+    for idx in order:
+        if kept and float((vectors[kept] @ vectors[idx]).max()) >= dedup_threshold:
+            continue
+        kept.append(int(idx))
+        if k is not None and len(kept) >= k:
+            break
+    return [items[i] for i in kept]
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import time
+
+    parser = argparse.ArgumentParser(description="Relevance ranking benchmark")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--items", type=int, default=5000)
+    args = parser.parse_args()
+
+    vocab = (
+        "bitcoin btc etf inflows fed rate cut powell inflation cpi trump tariffs china election polls "
+        "lakers nba finals ukraine russia ceasefire price surge drop record high low market crypto whale"
+    ).split()
+    rng = random.Random(0)
+    items = [
+        {"id": str(i), "text": " ".join(rng.choice(vocab) for _ in range(rng.randint(8, 30)))}
+        for i in range(args.items)
+    ]
+    embedder = HashingEmbedder()
+    question = "Will Bitcoin reach $125,000 by December 31, 2025? Bitcoin BTC cryptocurrency"
+
+    start = time.perf_counter()
+    rank_items(question, items, lambda t: t["text"], lambda t: t["id"], k=20, embedder=embedder)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    rank_items(question, items, lambda t: t["text"], lambda t: t["id"], k=20, embedder=embedder)
+    warm = time.perf_counter() - start
+
+    print(f"{args.items} items, cold cache: {cold * 1000:.0f} ms ({args.items / cold:,.0f} items/s)")
+    print(f"{args.items} items, warm cache: {warm * 1000:.0f} ms ({args.items / warm:,.0f} items/s)")
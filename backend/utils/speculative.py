@@ -0,0 +1,262 @@
+"""
+Speculative decoding with n-gram (prompt lookup) drafting.
+
+The model's answer is formulaic JSON. Its keys, enum values and many
+phrases already appear in the prompt (the RESPONSE FORMAT block, headlines)
+or in the schema skeleton. NgramDrafter proposes the tokens that followed
+the most recent earlier occurrence of the last n generated tokens. It
+searches the sequence so far first, then a tokenized response skeleton.
+speculative_generate feeds the current token plus the draft through the
+model in one forward pass and keeps the longest prefix of the draft that
+matches the model's own greedy choices.
+
+Every emitted token is the model's argmax given the tokens before it, so
+the output is the same as greedy decoding. Low-precision kernels can
+still flip near-ties, because a token is scored inside a multi-token
+pass instead of alone. No draft model is needed, and a rejected draft
+costs only the extra positions in a forward pass that runs anyway.
+
+Usage:
+    python -m utils.speculative --benchmark [--model ./polyedge-model-merged]
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Same key order as the RESPONSE FORMAT in the prompt and json.dumps in training
+RESPONSE_SKELETON = json.dumps({
+    "market_probability": 50,
+    "fair_probability": 50,
+    "edge_percentage": 0,
+    "action": "HOLD",
+    "confidence": 50,
+    "edge_quality": "moderate",
+    "signal_agreement": "",
+    "reasoning": "",
+    "key_signals": [""],
+    "ignored_signals": [""],
+    "risk_factors": [""],
+})
+MAX_NGRAM = 3
+MIN_NGRAM = 1
+DRAFT_TOKENS = 8
+
+
+@dataclass
+class SpeculativeStats:
+    generated: int = 0
+    drafted: int = 0
+    accepted: int = 0
+    # Model forward passes, prefill included
+    passes: int = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    @property
+    def tokens_per_pass(self) -> float:
+        return self.generated / max(1, self.passes - 1)
+
+    def add(self, other: "SpeculativeStats"):
+        self.generated += other.generated
+        self.drafted += other.drafted
+        self.accepted += other.accepted
+        self.passes += other.passes
+
+    def as_dict(self) -> Dict:
+        return {
+            "generated": self.generated,
+            "drafted": self.drafted,
+            "accepted": self.accepted,
+            "passes": self.passes,
+            "acceptance_rate": round(self.acceptance_rate, 3),
+            "tokens_per_pass": round(self.tokens_per_pass, 2),
+        }
+
+
+class NgramDrafter:
+    """
+    Prompt-lookup drafter over one growing token sequence plus a fixed
+    corpus (e.g. the tokenized RESPONSE_SKELETON). Lookups are dict hits: every
+    n-gram maps to the position right after its latest occurrence, and the
+    index is extended incrementally as tokens are appended.
+    """
+
+    def __init__(
+        self,
+        corpus: Sequence[int] = (),
+        max_ngram: int = MAX_NGRAM,
+        min_ngram: int = MIN_NGRAM,
+        draft_tokens: int = DRAFT_TOKENS,
+    ):
+        self.max_ngram = max_ngram
+        self.min_ngram = min_ngram
+        self.draft_tokens = draft_tokens
+        self.corpus = list(corpus)
+        self._corpus_index = self._build_index(self.corpus, 0, len(self.corpus))
+        self._index: Dict[int, Dict[Tuple[int, ...], int]] = {}
+        self._indexed = 0
+
+    def _build_index(self, tokens: List[int], start: int, end: int, index=None) -> Dict[int, Dict[Tuple[int, ...], int]]:
+        index = index if index is not None else {n: {} for n in range(self.min_ngram, self.max_ngram + 1)}
+        for position in range(max(start, 1), end):
+            for n in range(self.min_ngram, min(self.max_ngram, position) + 1):
+                index[n][tuple(tokens[position - n:position])] = position
+        return index
+
+    def propose(self, tokens: List[int]) -> List[int]:
+        """Up to draft_tokens continuation tokens for `tokens` (empty when no n-gram matches)."""
+        if len(tokens) < self._indexed or not self._index:
+            self._index, self._indexed = self._build_index(tokens, 0, 0), 0
+        # Positions whose continuation token exists (the last token has none yet)
+        self._build_index(tokens, self._indexed, len(tokens), self._index)
+        self._indexed = len(tokens)
+
+        for n in range(min(self.max_ngram, len(tokens)), self.min_ngram - 1, -1):
+            tail = tuple(tokens[-n:])
+            position = self._index[n].get(tail)
+            if position is not None:
+                draft = tokens[position:position + self.draft_tokens]
+                if draft:
+                    return draft
+            position = self._corpus_index[n].get(tail) if self.corpus else None
+            if position is not None:
+                return self.corpus[position:position + self.draft_tokens]
+        return []
+
+
+def speculative_generate(
+    model,
+    input_ids,
+    max_new_tokens: int,
+    drafter: NgramDrafter,
+    stop_token_ids: Iterable[int] = (),
+) -> Tuple[List[int], SpeculativeStats]:
+    """
+    Greedy generation for one sequence (input_ids of shape (1, L)) with
+    drafted tokens verified in parallel. Returns the generated token ids
+    (stop token included, prompt excluded) and draft statistics.
+    """
+    import torch
+    from transformers import DynamicCache
+
+    stop = set(stop_token_ids)
+    stats = SpeculativeStats()
+    cache = DynamicCache()
+    tokens = input_ids[0].tolist()
+    generated: List[int] = []
+
+    with torch.no_grad():
+        logits = model(input_ids=input_ids, past_key_values=cache, use_cache=True).logits
+        stats.passes += 1
+        next_token = int(logits[0, -1].argmax())
+        while True:
+            generated.append(next_token)
+            tokens.append(next_token)
+            if next_token in stop or len(generated) >= max_new_tokens:
+                break
+            draft = drafter.propose(tokens)[: max_new_tokens - len(generated)]
+            verify = torch.tensor([[next_token] + draft], device=input_ids.device)
+            # Cache holds everything before next_token; this pass scores next_token and the draft
+            predicted = model(input_ids=verify, past_key_values=cache, use_cache=True).logits[0].argmax(-1).tolist()
+            stats.passes += 1
+            stats.drafted += len(draft)
+
+            accepted = 0
+            while accepted < len(draft) and draft[accepted] == predicted[accepted]:
+                accepted += 1
+            stats.accepted += accepted
+            # Drop the cache entries of rejected draft tokens (negative = count to remove)
+            if accepted < len(draft):
+                cache.crop(accepted - len(draft))
+
+            stopped = False
+            for token in draft[:accepted]:
+                generated.append(token)
+                tokens.append(token)
+                if token in stop:
+                    stopped = True
+                    break
+            if stopped or len(generated) >= max_new_tokens:
+                break
+            next_token = predicted[accepted]
+
+    stats.generated = len(generated)
+    return generated, stats
+
+
+def skeleton_drafter(tokenizer) -> NgramDrafter:
+    """Drafter whose corpus is the tokenized response skeleton."""
+    return NgramDrafter(corpus=tokenizer(RESPONSE_SKELETON, add_special_tokens=False)["input_ids"])
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import torch
+
+    parser = argparse.ArgumentParser(description="Speculative (prompt lookup) vs plain greedy decoding")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--model", help="HF model directory (e.g. ./polyedge-model-merged); a tiny random Llama if omitted")
+    parser.add_argument("--prompts", type=int, default=4)
+    parser.add_argument("--max-new-tokens", type=int, default=200)
+    args = parser.parse_args()
+    torch.manual_seed(0)
+
+    if args.model:
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        from utils.prompt_builder import PromptBuilder
+
+        tokenizer = AutoTokenizer.from_pretrained(args.model)
+        model = AutoModelForCausalLM.from_pretrained(args.model, torch_dtype="auto", device_map="auto").eval()
+        prompts = [
+            tokenizer(
+                PromptBuilder.format_model_prompt(PromptBuilder.build_analysis_input(
+                    f"Will candidate #{i} win the election?", 0.3 + 0.1 * i, 250_000.0,
+                    "TIER 1: VERIFIED SOURCES\n- [reuters.com] Polls tighten ahead of the vote\n",
+                )),
+                return_tensors="pt", add_special_tokens=False,
+            )["input_ids"].to(model.device)
+            for i in range(args.prompts)
+        ]
+        drafter_for = lambda: skeleton_drafter(tokenizer)
+        stop_ids = [tokenizer.convert_tokens_to_ids("<|eot_id|>"), tokenizer.eos_token_id]
+        label = args.model
+    else:
+        from transformers import LlamaConfig, LlamaForCausalLM
+
+        config = LlamaConfig(vocab_size=512, hidden_size=256, intermediate_size=688, num_hidden_layers=4,
+                             num_attention_heads=4, num_key_value_heads=4, max_position_embeddings=2048)
+        model = LlamaForCausalLM(config).eval()
+        # Repetitive prompts, like the templated analysis inputs
+        prompts = [torch.randint(0, 512, (1, 40)).repeat(1, 8) for _ in range(args.prompts)]
+        drafter_for = NgramDrafter
+        stop_ids = []
+        label = "tiny random Llama (4 layers, d=256) - mechanics only, not representative acceptance"
+
+    total = SpeculativeStats()
+    greedy_seconds = speculative_seconds = 0.0
+    identical = True
+    for input_ids in prompts:
+        started = time.perf_counter()
+        reference = model.generate(input_ids, max_new_tokens=args.max_new_tokens, do_sample=False,
+                                   eos_token_id=stop_ids or None, pad_token_id=0)[0, input_ids.shape[1]:].tolist()
+        greedy_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        output, stats = speculative_generate(model, input_ids, args.max_new_tokens, drafter_for(), stop_ids)
+        speculative_seconds += time.perf_counter() - started
+        total.add(stats)
+        identical &= output == reference[:len(output)] and len(output) == len(reference)
+
+    print(f"model: {label}")
+    print(f"outputs identical to greedy: {identical}")
+    print(f"draft acceptance {total.acceptance_rate:.1%}, {total.tokens_per_pass:.2f} tokens per decode pass")
+    print(
+        f"greedy {total.generated / greedy_seconds:.1f} tok/s, speculative {total.generated / speculative_seconds:.1f} tok/s "
+        f"({greedy_seconds / speculative_seconds:.2f}x)"
+    )
@@ -0,0 +1,53 @@
+"""
+Cached token counting for prompt packing.
+
+Uses the model's tokenizer when one is available, so counts are exact;
+otherwise falls back to a ~4 characters/token estimate (exact=False).
+Counts of individual context lines are memoized, so a headline or tweet
+is tokenized once no matter how many prompts it ends up in.
+"""
+
+import math
+from functools import lru_cache
+from typing import Optional
+
+
+class TokenCounter:
+    def __init__(self, tokenizer=None, cache_size: int = 100_000):
+        self.tokenizer = tokenizer
+        self.exact = tokenizer is not None
+        self._count = lru_cache(maxsize=cache_size)(self._count_uncached)
+
+    @classmethod
+    def from_pretrained(cls, model_path: str) -> "TokenCounter":
+        """Loads only the tokenizer (no weights); falls back to estimates if that fails."""
+        try:
+            from transformers import AutoTokenizer
+
+            return cls(AutoTokenizer.from_pretrained(model_path))
+        except Exception as e:
+            print(f"Token counts will be estimated, could not load tokenizer from {model_path}: {e}")
+            return cls()
+
+    def _count_uncached(self, text: str, add_special_tokens: bool) -> int:
+        if self.tokenizer is None:
+            return math.ceil(len(text) / 4)
+        return len(self.tokenizer(text, add_special_tokens=add_special_tokens)["input_ids"])
+
+    def count(self, text: str) -> int:
+        """Tokens in a fragment of a prompt (no BOS)."""
+        return self._count(text, False)
+
+    def count_prompt(self, prompt: str) -> int:
+        """Tokens in a full prompt, exactly as ModelService tokenizes it (the template carries its own BOS)."""
+        return self._count(prompt, False)
+
+
+_default: Optional[TokenCounter] = None
+
+
+def get_estimating_counter() -> TokenCounter:
+    global _default
+    if _default is None:
+        _default = TokenCounter()
+    return _default
@@ -0,0 +1,265 @@
+"""
+Columnar (Parquet/Arrow) data layer for markets, news and tweets.
+
+Markets are converted once from the raw polymarket_markets.csv dump into a
+typed Parquet file (outcomes and token ids become real lists; outcomePrices
+stays the dump's raw string, the hindsight text for data generation). News
+and tweet fetch results are stored with articles/tweets as nested
+list<struct> columns instead of JSON strings. load_markets reads only the
+requested columns and pushes id/volume/end-date filters down into the scan.
+
+The backend scanner keeps its pandas CSV fallback: backend/ is deliberately
+kept off pyarrow and off scripts/.
+
+Usage:
+    python scripts/datastore.py convert    # CSV dump -> Parquet
+    python scripts/datastore.py benchmark  # read_csv vs. Parquet loads
+"""
+
+import json
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+MARKETS_CSV = DATA_DIR / "raw" / "polymarket_markets.csv"
+MARKETS_PARQUET = DATA_DIR / "raw" / "polymarket_markets.parquet"
+NEWS_PARQUET = DATA_DIR / "news" / "news.parquet"
+TWEETS_PARQUET = DATA_DIR / "tweets" / "tweets.parquet"
+
+# Typed columns of the market dump; any other CSV column is kept as a string
+MARKET_COLUMNS = {
+    "id": pa.string(),
+    "question": pa.string(),
+    "event_slug": pa.string(),
+    "category": pa.string(),
+    "volume": pa.float64(),
+    "outcomes": pa.list_(pa.string()),
+    # Raw text ('["1", "0"]'): resolution_map serves it verbatim
+    "outcomePrices": pa.string(),
+    "clobTokenIds": pa.list_(pa.string()),
+    "startDate": pa.timestamp("us", tz="UTC"),
+    "endDate": pa.timestamp("us", tz="UTC"),
+}
+
+ARTICLE_TYPE = pa.struct([
+    ("title", pa.string()),
+    ("source", pa.string()),
+    ("url", pa.string()),
+    ("date", pa.string()),
+    ("language", pa.string()),
+    ("source_country", pa.string()),
+    ("tone", pa.float64()),
+    ("image", pa.string()),
+])
+
+TWEET_TYPE = pa.struct([
+    ("id", pa.string()),
+    ("text", pa.string()),
+    ("author_name", pa.string()),
+    ("author_username", pa.string()),
+    ("author_verified", pa.bool_()),
+    ("author_followers", pa.int64()),
+    ("created_at", pa.string()),
+    ("retweets", pa.int64()),
+    ("likes", pa.int64()),
+    ("replies", pa.int64()),
+    ("views", pa.int64()),
+    ("url", pa.string()),
+])
+
+NEWS_SCHEMA = pa.schema([
+    ("question", pa.string()),
+    ("analysis_date", pa.date32()),
+    ("keywords", pa.list_(pa.string())),
+    ("article_count", pa.int32()),
+    ("articles", pa.list_(ARTICLE_TYPE)),
+    ("formatted_news", pa.string()),
+])
+
+TWEETS_SCHEMA = pa.schema([
+    ("question", pa.string()),
+    ("analysis_date", pa.date32()),
+    ("search_query", pa.string()),
+    ("tweet_count", pa.int32()),
+    ("verified_count", pa.int32()),
+    ("high_engagement_count", pa.int32()),
+    ("tweets", pa.list_(TWEET_TYPE)),
+    ("formatted_tweets", pa.string()),
+])
+
+DateLike = Union[str, date, None]
+
+
+def to_date(value: DateLike) -> Optional[date]:
+    return None if value is None else pd.Timestamp(value).date()
+
+
+def _parse_list(value) -> Optional[list]:
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        parsed = json.loads(value)
+    except json.JSONDecodeError:
+        # Some dumps use Python reprs ("['Yes', 'No']")
+        try:
+            parsed = json.loads(value.replace("'", '"'))
+        except json.JSONDecodeError:
+            return None
+    return parsed if isinstance(parsed, list) else None
+
+
+def _market_chunk_to_table(chunk: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    arrays = []
+    for field in schema:
+        col = chunk[field.name] if field.name in chunk else pd.Series([None] * len(chunk))
+        if pa.types.is_list(field.type):
+            values = [_parse_list(v) for v in col]
+            if pa.types.is_floating(field.type.value_type):
+                values = [[float(x) for x in v] if v else v for v in values]
+            else:
+                values = [[str(x) for x in v] if v else v for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        elif pa.types.is_timestamp(field.type):
+            arrays.append(pa.array(pd.to_datetime(col, errors="coerce", utc=True), type=field.type))
+        elif pa.types.is_floating(field.type):
+            arrays.append(pa.array(pd.to_numeric(col, errors="coerce"), type=field.type))
+        else:
+            arrays.append(pa.array([None if pd.isna(v) else str(v) for v in col], type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def convert_markets_csv(csv_path: Path = MARKETS_CSV, parquet_path: Path = MARKETS_PARQUET, chunksize: int = 50_000) -> Path:
+    """Converts the raw market CSV into a typed Parquet file, chunk by chunk."""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    fields = [pa.field(name, MARKET_COLUMNS.get(name, pa.string())) for name in header]
+    fields += [pa.field(name, t) for name, t in MARKET_COLUMNS.items() if name not in header]
+    schema = pa.schema(fields)
+
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = parquet_path.with_suffix(".parquet.tmp")
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        for chunk in pd.read_csv(csv_path, dtype=str, chunksize=chunksize):
+            writer.write_table(_market_chunk_to_table(chunk, schema))
+    tmp_path.replace(parquet_path)
+    return parquet_path
+
+
+def _schema_current(parquet_path: Path) -> bool:
+    schema = pq.read_schema(parquet_path)
+    return all(schema.field(name).type == t for name, t in MARKET_COLUMNS.items() if name in schema.names)
+
+
+def markets_parquet(csv_path: Path = MARKETS_CSV) -> Path:
+    """Returns the Parquet copy of a market CSV, converting it if missing, stale or written with an older schema."""
+    csv_path = Path(csv_path)
+    parquet_path = csv_path.with_suffix(".parquet")
+    if (
+        not parquet_path.exists()
+        or (csv_path.exists() and csv_path.stat().st_mtime > parquet_path.stat().st_mtime)
+        or not _schema_current(parquet_path)
+    ):
+        print(f"Converting {csv_path} -> {parquet_path} ...")
+        convert_markets_csv(csv_path, parquet_path)
+    return parquet_path
+
+
+def _and(expr, cond):
+    return cond if expr is None else expr & cond
+
+
+def _read(path: Path, columns: Optional[List[str]], expr) -> pd.DataFrame:
+    dataset = ds.dataset(path, format="parquet")
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
+def load_markets(
+    columns: Optional[List[str]] = None,
+    market_ids: Optional[Iterable[str]] = None,
+    min_volume: Optional[float] = None,
+    end_after: DateLike = None,
+    end_before: DateLike = None,
+    csv_path: Path = MARKETS_CSV,
+) -> pd.DataFrame:
+    """Loads markets, reading only `columns` and pushing id/volume/end-date filters into the scan."""
+    expr = None
+    if market_ids is not None:
+        expr = _and(expr, ds.field("id").isin(list(market_ids)))
+    if min_volume is not None:
+        expr = _and(expr, ds.field("volume") > min_volume)
+    if end_after is not None:
+        expr = _and(expr, ds.field("endDate") >= pd.Timestamp(end_after, tz="UTC"))
+    if end_before is not None:
+        expr = _and(expr, ds.field("endDate") <= pd.Timestamp(end_before, tz="UTC"))
+    return _read(markets_parquet(csv_path), columns, expr)
+
+
+def markets_for_fetch(
+    min_volume: Optional[float] = None,
+    end_after: DateLike = None,
+    end_before: DateLike = None,
+    limit: Optional[int] = None,
+    csv_path: Path = MARKETS_CSV,
+) -> pd.DataFrame:
+    """
+    Questions and analysis dates (the day before each market ended) for the
+    fetch scripts' batch mode, highest volume first.
+    """
+    df = load_markets(["question", "volume", "endDate"], None, min_volume, end_after, end_before, csv_path)
+    df = df[df["question"].notna() & df["endDate"].notna()].sort_values("volume", ascending=False)
+    if limit is not None:
+        df = df.head(limit)
+    analysis_dates = (df["endDate"] - pd.Timedelta(days=1)).dt.strftime("%Y-%m-%d")
+    return pd.DataFrame({"question": df["question"].values, "analysis_date": analysis_dates.values})
+
+
+def resolution_map(csv_path: Path = MARKETS_CSV) -> Dict[str, str]:
+    """
+    Maps market question -> final outcome prices exactly as written in the
+    dump (e.g. '["1", "0"]'), the hindsight text for data generation.
+    """
+    df = load_markets(["question", "outcomePrices"], csv_path=csv_path)
+    df = df[df["question"].notna() & df["outcomePrices"].notna()]
+    return dict(zip(df["question"], df["outcomePrices"]))
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="PolyEdge columnar data layer")
+    parser.add_argument("command", choices=["convert", "benchmark"])
+    parser.add_argument("--csv", type=str, default=str(MARKETS_CSV), help="Market CSV dump")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        print(f"Markets: {convert_markets_csv(Path(args.csv), Path(args.csv).with_suffix('.parquet'))}")
+    else:
+        start = time.perf_counter()
+        csv_df = pd.read_csv(args.csv, low_memory=False)
+        csv_time, csv_mem = time.perf_counter() - start, csv_df.memory_usage(deep=True).sum()
+        del csv_df
+
+        markets_parquet(Path(args.csv))
+        start = time.perf_counter()
+        pq_df = load_markets(columns=["id", "question", "volume", "outcomePrices"], csv_path=Path(args.csv))
+        pq_time, pq_mem = time.perf_counter() - start, pq_df.memory_usage(deep=True).sum()
+
+        start = time.perf_counter()
+        df = pd.read_csv(args.csv, usecols=["question", "outcomePrices"], dtype=str).dropna()
+        dict(zip(df["question"], df["outcomePrices"]))
+        csv_map_time = time.perf_counter() - start
+        start = time.perf_counter()
+        resolution_map(Path(args.csv))
+        pq_map_time = time.perf_counter() - start
+
+        print(f"read_csv (all columns, low_memory=False): {csv_time:.2f}s, {csv_mem / 1e6:.0f} MB")
+        print(f"Parquet load_markets (4 columns)        : {pq_time:.2f}s, {pq_mem / 1e6:.0f} MB")
+        print(f"resolution map: read_csv {csv_map_time:.2f}s -> Parquet {pq_map_time:.2f}s")
@@ -0,0 +1,224 @@
+"""
+Concurrent fetch engine shared by the GDELT and Twitter batch fetchers.
+
+- AdaptiveLimiter: per-API concurrency cap plus an AIMD request rate. Every
+  success nudges the rate up additively; a 429 halves it, and slow responses
+  (above target_latency) trim it, so each API settles near its real limit.
+- with_retries: exponential backoff with jitter for 429s, 5xx and network errors.
+- ParquetSink: appends result rows to a Parquet file in small row groups as
+  they complete instead of one final to_csv.
+- run_concurrent: fans items out over a thread pool with a live progress/ETA line.
+"""
+
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import requests
+
+
+class RateLimited(Exception):
+    """Upstream answered 429 (or an equivalent throttle message)."""
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        initial_rate: float,
+        min_rate: float = 0.1,
+        max_rate: float = 50.0,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        target_latency: float = 5.0,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.calls = 0
+        self.throttled = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._next_send = 0.0
+
+    def _wait_for_turn(self):
+        with self._lock:
+            now = time.monotonic()
+            send_at = max(now, self._next_send)
+            self._next_send = send_at + 1.0 / self.rate
+        if send_at > now:
+            time.sleep(send_at - now)
+
+    def _on_success(self, latency: float):
+        with self._lock:
+            if latency > self.target_latency:
+                self.rate = max(self.min_rate, self.rate * 0.9)
+            else:
+                # ~`increase` req/s per second of traffic, independent of current rate
+                self.rate = min(self.max_rate, self.rate + self.increase / max(self.rate, 1.0))
+
+    def _on_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._next_send = max(self._next_send, time.monotonic() + 1.0 / self.rate)
+
+    def call(self, method: Callable[..., requests.Response], *args, **kwargs) -> requests.Response:
+        """Sends one request under the limiter and feeds its outcome back into the rate."""
+        with self._slots:
+            self._wait_for_turn()
+            start = time.monotonic()
+            response = method(*args, **kwargs)
+            latency = time.monotonic() - start
+        with self._lock:
+            self.calls += 1
+        if response.status_code == 429:
+            self._on_throttle()
+            raise RateLimited(f"{self.name} returned 429")
+        self._on_success(latency)
+        return response
+
+    def report_throttle(self):
+        """For APIs that signal throttling in the body rather than with a 429."""
+        self._on_throttle()
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (RateLimited, requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return False
+
+
+def with_retries(fn: Callable[..., Any], *args, retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0, **kwargs) -> Any:
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries or not _is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random())
+            time.sleep(delay)
+
+
+class Progress:
+    def __init__(self, total: int, label: str, stream=sys.stderr):
+        self.total = total
+        self.label = label
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.start = time.monotonic()
+        self._lock = threading.Lock()
+        self._last_print = 0.0
+
+    def update(self, failed: bool = False):
+        with self._lock:
+            self.done += 1
+            self.failed += failed
+            now = time.monotonic()
+            if now - self._last_print < 0.5 and self.done < self.total:
+                return
+            self._last_print = now
+            elapsed = now - self.start
+            rate = self.done / elapsed if elapsed else 0.0
+            eta = (self.total - self.done) / rate if rate else 0.0
+            self.stream.write(
+                f"\r{self.label}: {self.done}/{self.total} | {rate:.1f}/s | "
+                f"ETA {int(eta // 60):02d}:{int(eta % 60):02d} | failed {self.failed}"
+            )
+            if self.done == self.total:
+                self.stream.write("\n")
+            self.stream.flush()
+
+
+class ParquetSink:
+    """Appends rows to a Parquet file in row groups of flush_every rows."""
+
+    def __init__(self, path: Path, schema=None, flush_every: int = 50):
+        self.path = Path(path)
+        self.schema = schema
+        self.flush_every = flush_every
+        self.rows_written = 0
+        self._buffer: List[Dict] = []
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def write(self, row: Dict):
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._buffer:
+            return
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            table = pa.Table.from_pylist(self._buffer, schema=self.schema)
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+        else:
+            table = pa.Table.from_pylist(self._buffer, schema=self._writer.schema)
+        self._writer.write_table(table)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._writer is not None:
+                self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_concurrent(
+    items: Sequence[Any],
+    worker: Callable[[Any], Dict],
+    max_workers: int,
+    label: str,
+    sink: Optional[ParquetSink] = None,
+    on_error: Optional[Callable[[Any, Exception], Dict]] = None,
+) -> List[Dict]:
+    """
+    Runs worker over items on a thread pool and returns results in input order.
+    Each result is streamed to sink as soon as it completes. Failed items are
+    turned into rows by on_error (or dropped if it is None).
+    """
+    progress = Progress(len(items), label)
+    results: List[Optional[Dict]] = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(worker, item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            i = futures[future]
+            failed = False
+            try:
+                row = future.result()
+            except Exception as e:
+                failed = True
+                print(f"\n{label} item {i} failed: {e}")
+                row = on_error(items[i], e) if on_error else None
+            if row is not None:
+                results[i] = row
+                if sink is not None:
+                    sink.write(row)
+            progress.update(failed)
+    return [r for r in results if r is not None]
@@ -13,6 +13,7 @@ for Polymarket price history data.
 
 import requests
 import json
+import sys
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -20,9 +21,19 @@ from typing import List, Dict, Optional
 from urllib.parse import quote
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).parent))
+from request_cache import RequestCache
+from datastore import NEWS_PARQUET, NEWS_SCHEMA, markets_for_fetch, to_date
+from fetch_engine import AdaptiveLimiter, ParquetSink, RateLimited, run_concurrent, with_retries
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+from utils.keyword_engine import KeywordEngine, gdelt_query
+
 GDELT_DOC_API = "https://api.gdeltproject.org/api/v2/doc/doc"
 OUTPUT_DIR = Path(__file__).parent.parent / "data" / "news"
 CACHE_DIR = OUTPUT_DIR / "cache"
+CACHE = RequestCache(CACHE_DIR / "gdelt.sqlite")
+# GDELT throttles aggressively; start slow and let AIMD find the ceiling
+LIMITER = AdaptiveLimiter("GDELT", max_concurrency=2, initial_rate=0.5, max_rate=4.0, target_latency=10.0)
 
 
 def extract_keywords(question: str) -> List[str]:
@@ -33,47 +44,7 @@ def extract_keywords(question: str) -> List[str]:
         "Will Bitcoin reach $125,000 by December 31, 2025?"
         -> ["Bitcoin", "BTC", "cryptocurrency"]
     """
-    keyword_mappings = {
-        "bitcoin": ["Bitcoin", "BTC", "cryptocurrency"],
-        "ethereum": ["Ethereum", "ETH", "cryptocurrency"],
-        "solana": ["Solana", "SOL", "cryptocurrency"],
-        "crypto": ["cryptocurrency", "crypto", "digital currency"],
-        "fed": ["Federal Reserve", "Fed", "interest rate", "FOMC"],
-        "trump": ["Trump", "Donald Trump", "president"],
-        "biden": ["Biden", "Joe Biden", "president"],
-        "lakers": ["Lakers", "Los Angeles Lakers", "NBA"],
-        "celtics": ["Celtics", "Boston Celtics", "NBA"],
-        "nba": ["NBA", "basketball"],
-        "nfl": ["NFL", "football"],
-        "super bowl": ["Super Bowl", "NFL", "football"],
-        "election": ["election", "vote", "voting"],
-        "russia": ["Russia", "Ukraine", "Putin"],
-        "ukraine": ["Ukraine", "Russia", "Zelenskyy"],
-    }
-    
-    question_lower = question.lower()
-    keywords = []
-    
-    for key, values in keyword_mappings.items():
-        if key in question_lower:
-            keywords.extend(values)
-    
-    words = question.split()
-    for word in words:
-        clean_word = word.strip("?.,!\"'()[]")
-        if clean_word and clean_word[0].isupper() and len(clean_word) > 2:
-            if clean_word not in ["Will", "The", "And", "But", "For", "Has", "Does"]:
-                if clean_word not in keywords:
-                    keywords.append(clean_word)
-    
-    seen = set()
-    unique_keywords = []
-    for kw in keywords:
-        if kw.lower() not in seen:
-            seen.add(kw.lower())
-            unique_keywords.append(kw)
-    
-    return unique_keywords[:5]      
+    return KeywordEngine.default().keywords(question, limit=5)
 
 
 def fetch_gdelt_articles(
@@ -110,17 +81,7 @@ def fetch_gdelt_articles(
     start_gdelt = start_dt.strftime("%Y%m%d%H%M%S")
     end_gdelt = end_dt.strftime("%Y%m%d%H%M%S")
     
-    terms = []
-    for kw in keywords:
-        if " " in kw:
-            terms.append(f'"{kw}"') 
-        elif len(kw) >= 4:
-            terms.append(kw) 
-    
-    if not terms:
-        terms = [keywords[0]] if keywords else ["news"]
-    
-    query = "(" + " OR ".join(terms) + ")"
+    query = gdelt_query(keywords)
     
     params = {
         "query": query,
@@ -134,42 +95,70 @@ def fetch_gdelt_articles(
     if language.lower() == "english":
         params["sourcelang"] = "eng"
     
+    cache_params = {"maxrecords": max_records, "sourcelang": params.get("sourcelang"), "sort": "relevance"}
+    cached = CACHE.get(GDELT_DOC_API, query, start_date, end_date, cache_params)
+    if cached is not None:
+        return _parse_articles(cached)
+    if CACHE.offline:
+        return []
+    
+    # Empty-body, HTML and error answers are cached as no articles (short TTL) so
+    # a rerun doesn't ask again; throttling and connection errors are not. A
+    # parsed answer with no articles is a real result and keeps normal freshness
+    def cache_empty():
+        CACHE.set(GDELT_DOC_API, query, start_date, end_date, {"articles": []}, cache_params, failed=True)
+        return []
+
     try:
-        response = requests.get(GDELT_DOC_API, params=params, timeout=30)
-        response.raise_for_status()
+        response = with_retries(_request_gdelt, params)
         
         if not response.text or not response.text.strip():
-            return []
+            return cache_empty()
         
         if response.text.strip().startswith("<!") or response.text.strip().startswith("<html"):
             print(f"GDELT returned HTML error page")
-            return []
+            return cache_empty()
         
         data = response.json()
+        CACHE.set(GDELT_DOC_API, query, start_date, end_date, data, cache_params)
         
-        articles = []
-        for article in data.get("articles", []):
-            articles.append({
-                "title": article.get("title", ""),
-                "source": article.get("domain", article.get("source", "")),
-                "url": article.get("url", ""),
-                "date": article.get("seendate", ""),
-                "language": article.get("language", ""),
-                "source_country": article.get("sourcecountry", ""),
-                "tone": article.get("tone", 0),  
-                "image": article.get("socialimage", "")
-            })
-        
-        time.sleep(0.5)
+        return _parse_articles(data)
         
-        return articles
-        
-    except requests.exceptions.RequestException as e:
+    except requests.exceptions.HTTPError as e:
+        print(f"GDELT API error: {e}")
+        return cache_empty()
+    except (requests.exceptions.RequestException, RateLimited) as e:
         print(f"GDELT API error: {e}")
         return []
     except json.JSONDecodeError as e:
         print(f"GDELT API error: {e}")
-        return []
+        return cache_empty()
+
+
+def _request_gdelt(params: Dict) -> requests.Response:
+    response = LIMITER.call(requests.get, GDELT_DOC_API, params=params, timeout=30)
+    response.raise_for_status()
+    # GDELT sometimes throttles with a 200 and a plain-text notice
+    if response.text and response.text.lstrip().startswith("Please limit requests"):
+        LIMITER.report_throttle()
+        raise RateLimited("GDELT asked to slow down")
+    return response
+
+
+def _parse_articles(data: Dict) -> List[Dict]:
+    articles = []
+    for article in data.get("articles", []):
+        articles.append({
+            "title": article.get("title", ""),
+            "source": article.get("domain", article.get("source", "")),
+            "url": article.get("url", ""),
+            "date": article.get("seendate", ""),
+            "language": article.get("language", ""),
+            "source_country": article.get("sourcecountry", ""),
+            "tone": article.get("tone", 0),  
+            "image": article.get("socialimage", "")
+        })
+    return articles
 
 
 def fetch_news_for_market(
@@ -281,8 +270,6 @@ def test_gdelt():
         
         if result["articles"]:
             print(f"  Sample article: {result['articles'][0]['title'][:60]}...")
-        
-        time.sleep(1) 
     
     print("\n" + "="*60)
     print("GDELT TEST COMPLETE")
@@ -290,25 +277,22 @@ def test_gdelt():
     print("\nGDELT is ready to use for training data generation!")
 
 
-def fetch_news_batch(markets_df: pd.DataFrame, output_file: Path = None) -> pd.DataFrame:
+def fetch_news_batch(markets_df: pd.DataFrame, output_file: Path = None, max_workers: int = 8) -> pd.DataFrame:
     """
-    Fetch news for a batch of markets.
+    Fetch news for a batch of markets concurrently.
     
     Args:
         markets_df: DataFrame with 'question' and 'analysis_date' columns
-        output_file: Optional path to save results
+        output_file: Optional path; results stream into its .parquet sibling as they complete
+        max_workers: Worker threads (API concurrency itself is capped by LIMITER)
     
     Returns:
         DataFrame with news data added
     """
-    results = []
-    
-    for idx, row in markets_df.iterrows():
+    def fetch_one(row: Dict) -> Dict:
         question = row.get("question", "")
         analysis_date = row.get("analysis_date", "2025-08-01")
         
-        print(f"[{idx+1}/{len(markets_df)}] Fetching news for: {question[:40]}...")
-        
         news = fetch_news_for_market(
             question=question,
             analysis_date=analysis_date,
@@ -316,25 +300,30 @@ def fetch_news_batch(markets_df: pd.DataFrame, output_file: Path = None) -> pd.D
             max_articles=15
         )
         
-        results.append({
+        return {
             "question": question,
-            "analysis_date": analysis_date,
-            "keywords": json.dumps(news["keywords"]),
+            "analysis_date": to_date(analysis_date),
+            "keywords": news["keywords"],
             "article_count": news["article_count"],
-            "articles_json": json.dumps(news["articles"]),
+            "articles": news["articles"],
             "formatted_news": format_news_for_training(news)
-        })
-        
-        time.sleep(0.5) 
-    
-    results_df = pd.DataFrame(results)
-    
-    if output_file:
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        results_df.to_csv(output_file, index=False)
-        print(f"\nSaved to: {output_file}")
+        }
     
-    return results_df
+    sink = ParquetSink(output_file.with_suffix(".parquet"), NEWS_SCHEMA) if output_file else None
+    start = time.monotonic()
+    try:
+        results = run_concurrent(markets_df.to_dict("records"), fetch_one, max_workers, "GDELT", sink)
+    finally:
+        if sink:
+            sink.close()
+    elapsed = time.monotonic() - start
+    
+    print(f"GDELT {CACHE.stats()} | API calls: {LIMITER.calls}, throttled: {LIMITER.throttled}, "
+          f"final rate: {LIMITER.rate:.2f} req/s | {len(results) / max(elapsed, 1e-9):.1f} markets/s")
+    if sink:
+        print(f"\nSaved to: {sink.path}")
+    
+    return pd.DataFrame(results)
 
 
 if __name__ == "__main__":
@@ -344,10 +333,20 @@ if __name__ == "__main__":
     parser.add_argument("--test", action="store_true", help="Run test queries")
     parser.add_argument("--question", type=str, help="Single question to fetch news for")
     parser.add_argument("--date", type=str, default="2025-08-15", help="Analysis date (YYYY-MM-DD)")
+    parser.add_argument("--markets", type=int, help="Batch mode: fetch for the N highest-volume markets in the dump")
+    parser.add_argument("--min-volume", type=float, default=10000, help="Batch mode: minimum market volume")
+    parser.add_argument("--end-after", type=str, help="Batch mode: markets ending on/after this date")
+    parser.add_argument("--end-before", type=str, help="Batch mode: markets ending on/before this date")
+    parser.add_argument("--offline", action="store_true", help="Only read the local response cache, never call GDELT")
     args = parser.parse_args()
+    CACHE.offline = args.offline
     
     if args.test:
         test_gdelt()
+    elif args.markets:
+        markets = markets_for_fetch(args.min_volume, args.end_after, args.end_before, limit=args.markets)
+        print(f"Fetching news for {len(markets)} markets...")
+        fetch_news_batch(markets, NEWS_PARQUET)
     elif args.question:
         print(f"Fetching news for: {args.question}")
         result = fetch_news_for_market(args.question, args.date)
@@ -359,3 +358,4 @@ if __name__ == "__main__":
         print("Usage:")
         print("  python fetch_gdelt_news.py --test")
         print("  python fetch_gdelt_news.py --question 'Will Bitcoin hit $125k?' --date 2025-08-15")
+        print("  python fetch_gdelt_news.py --markets 500 --end-after 2025-01-01")
@@ -1,6 +1,8 @@
 import os
 import requests
 import json
+import sys
+import threading
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -8,11 +10,25 @@ from typing import List, Dict, Optional
 from dotenv import load_dotenv
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).parent))
+from request_cache import RequestCache
+from datastore import TWEETS_PARQUET, TWEETS_SCHEMA, markets_for_fetch, to_date
+from fetch_engine import AdaptiveLimiter, ParquetSink, RateLimited, run_concurrent, with_retries
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+from utils.keyword_engine import KeywordEngine
+
 load_dotenv()
 
 TWITTER_API_IO_KEY = os.getenv("TWITTER_API_IO_KEY")
 TWITTER_API_IO_BASE = "https://api.twitterapi.io/twitter"
 OUTPUT_DIR = Path(__file__).parent.parent / "data" / "tweets"
+CACHE = RequestCache(OUTPUT_DIR / "cache" / "twitter.sqlite")
+COST_PER_1K_TWEETS = 0.15
+LIMITER = AdaptiveLimiter("TwitterAPI.io", max_concurrency=8, initial_rate=5.0, max_rate=20.0, target_latency=8.0)
+
+# Billed usage: TwitterAPI.io charges per tweet returned, not per tweet kept
+USAGE = {"calls": 0, "tweets": 0}
+_usage_lock = threading.Lock()
 
 
 def check_api_key():
@@ -40,11 +56,14 @@ def search_tweets(
     Returns:
         List of tweet dictionaries
     """
-    if not TWITTER_API_IO_KEY:
-        return []
-    
     url = f"{TWITTER_API_IO_BASE}/tweet/advanced_search"
     
+    cached = CACHE.get(url, query, start_date, end_date)
+    if cached is not None:
+        return _parse_tweets(cached, max_results)
+    if CACHE.offline or not TWITTER_API_IO_KEY:
+        return []
+    
     headers = {
         "X-API-Key": TWITTER_API_IO_KEY
     }
@@ -57,63 +76,17 @@ def search_tweets(
     }
     
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=30)
-        response.raise_for_status()
-        
+        response = with_retries(_request_tweets, url, headers, params)
         data = response.json()
-        tweets = []
-        
-        for tweet in data.get("tweets", [])[:max_results]:
-            author = tweet.get("author", {})
-            
-            tweets.append({
-                "id": tweet.get("id", ""),
-                "text": tweet.get("text", ""),
-                "author_name": author.get("name", ""),
-                "author_username": author.get("userName", ""),
-                "author_verified": author.get("isBlueVerified", False),
-                "author_followers": author.get("followers", 0),
-                "created_at": tweet.get("createdAt", ""),
-                "retweets": tweet.get("retweetCount", 0),
-                "likes": tweet.get("likeCount", 0),
-                "replies": tweet.get("replyCount", 0),
-                "views": tweet.get("viewCount", 0),
-                "url": tweet.get("url", "")
-            })
         
-        time.sleep(1)
+        with _usage_lock:
+            USAGE["calls"] += 1
+            USAGE["tweets"] += len(data.get("tweets", []))
+        CACHE.set(url, query, start_date, end_date, data)
         
-        return tweets
+        return _parse_tweets(data, max_results)
         
-    except requests.exceptions.RequestException as e:
-        if "429" in str(e):
-            print(f"Rate limited - waiting 5 seconds...")
-            time.sleep(5)
-            try:
-                response = requests.get(url, headers=headers, params=params, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-                tweets = []
-                for tweet in data.get("tweets", [])[:max_results]:
-                    author = tweet.get("author", {})
-                    tweets.append({
-                        "id": tweet.get("id", ""),
-                        "text": tweet.get("text", ""),
-                        "author_name": author.get("name", ""),
-                        "author_username": author.get("userName", ""),
-                        "author_verified": author.get("isBlueVerified", False),
-                        "author_followers": author.get("followers", 0),
-                        "created_at": tweet.get("createdAt", ""),
-                        "retweets": tweet.get("retweetCount", 0),
-                        "likes": tweet.get("likeCount", 0),
-                        "replies": tweet.get("replyCount", 0),
-                        "views": tweet.get("viewCount", 0),
-                        "url": tweet.get("url", "")
-                    })
-                time.sleep(1)
-                return tweets
-            except:
-                pass
+    except (requests.exceptions.RequestException, RateLimited) as e:
         print(f"TwitterAPI.io error: {e}")
         return []
     except json.JSONDecodeError:
@@ -121,43 +94,42 @@ def search_tweets(
         return []
 
 
+def _request_tweets(url: str, headers: Dict, params: Dict) -> requests.Response:
+    response = LIMITER.call(requests.get, url, headers=headers, params=params, timeout=30)
+    response.raise_for_status()
+    return response
+
+
+def _parse_tweets(data: Dict, max_results: int) -> List[Dict]:
+    tweets = []
+    for tweet in data.get("tweets", [])[:max_results]:
+        author = tweet.get("author", {})
+        
+        tweets.append({
+            "id": tweet.get("id", ""),
+            "text": tweet.get("text", ""),
+            "author_name": author.get("name", ""),
+            "author_username": author.get("userName", ""),
+            "author_verified": author.get("isBlueVerified", False),
+            "author_followers": author.get("followers", 0),
+            "created_at": tweet.get("createdAt", ""),
+            "retweets": tweet.get("retweetCount", 0),
+            "likes": tweet.get("likeCount", 0),
+            "replies": tweet.get("replyCount", 0),
+            "views": tweet.get("viewCount", 0),
+            "url": tweet.get("url", "")
+        })
+    return tweets
+
+
 def extract_search_terms(question: str) -> str:
     """
     Extract search terms from a market question.
     Returns a Twitter search query string.
     """
-    keyword_mappings = {
-        "bitcoin": "Bitcoin OR BTC OR #Bitcoin",
-        "ethereum": "Ethereum OR ETH OR #Ethereum",
-        "solana": "Solana OR SOL OR #Solana",
-        "fed": "Federal Reserve OR Fed OR FOMC OR \"interest rate\"",
-        "trump": "Trump OR @realDonaldTrump",
-        "biden": "Biden OR @POTUS",
-        "lakers": "Lakers OR @Lakers OR #Lakers",
-        "nba": "NBA OR #NBA",
-        "nfl": "NFL OR #NFL",
-        "super bowl": "\"Super Bowl\" OR #SuperBowl",
-        "election": "election OR voting OR polls",
-    }
-    
-    question_lower = question.lower()
-    
-    for key, query in keyword_mappings.items():
-        if key in question_lower:
-            return query
-    
-    keywords = []
-    words = question.split()
-    for word in words:
-        clean_word = word.strip("?.,!\"'()[]")
-        if clean_word and clean_word[0].isupper() and len(clean_word) > 2:
-            if clean_word not in ["Will", "The", "And", "But", "For", "Has", "Does", "Can"]:
-                keywords.append(clean_word)
-    
-    if keywords:
-        return " OR ".join(keywords[:3])
-    
-    return " ".join(words[1:4])
+    # Falls back to a plain phrase from the question when no entity is recognized
+    fallback = " ".join(question.split()[1:4])
+    return KeywordEngine.default().twitter_query(question, default=fallback)
 
 
 def fetch_tweets_for_market(
@@ -299,8 +271,6 @@ def test_twitter_api():
         
         if result["tweets"]:
             print(f"  Sample tweet: {result['tweets'][0]['text'][:60]}...")
-        
-        time.sleep(1)
     
     print("\n" + "="*60)
     print("TWITTER API.IO TEST COMPLETE")
@@ -310,32 +280,34 @@ def test_twitter_api():
 def estimate_cost(num_markets: int, tweets_per_market: int = 50) -> float:
     """Estimate the cost for fetching tweets."""
     total_tweets = num_markets * tweets_per_market
-    cost = (total_tweets / 1000) * 0.15
+    cost = (total_tweets / 1000) * COST_PER_1K_TWEETS
     return cost
 
 
-def fetch_tweets_batch(markets_df: pd.DataFrame, output_file: Path = None) -> pd.DataFrame:
+def actual_cost(tweets_billed: int) -> float:
+    """Cost of tweets actually returned by the API."""
+    return (tweets_billed / 1000) * COST_PER_1K_TWEETS
+
+
+def fetch_tweets_batch(markets_df: pd.DataFrame, output_file: Path = None, max_workers: int = 16) -> pd.DataFrame:
     """
-    Fetch tweets for a batch of markets.
+    Fetch tweets for a batch of markets concurrently.
     
     Args:
         markets_df: DataFrame with 'question' and 'analysis_date' columns
-        output_file: Optional path to save results
+        output_file: Optional path; results stream into its .parquet sibling as they complete
+        max_workers: Worker threads (API concurrency itself is capped by LIMITER)
     
     Returns:
         DataFrame with tweet data added
     """
-    if not check_api_key():
+    if not CACHE.offline and not check_api_key():
         return pd.DataFrame()
     
-    results = []
-    
-    for idx, row in markets_df.iterrows():
+    def fetch_one(row: Dict) -> Dict:
         question = row.get("question", "")
         analysis_date = row.get("analysis_date", "2025-08-01")
         
-        print(f"[{idx+1}/{len(markets_df)}] Fetching tweets for: {question[:40]}...")
-        
         tweet_data = fetch_tweets_for_market(
             question=question,
             analysis_date=analysis_date,
@@ -343,27 +315,38 @@ def fetch_tweets_batch(markets_df: pd.DataFrame, output_file: Path = None) -> pd
             max_tweets=50
         )
         
-        results.append({
+        return {
             "question": question,
-            "analysis_date": analysis_date,
+            "analysis_date": to_date(analysis_date),
             "search_query": tweet_data["search_query"],
             "tweet_count": tweet_data["tweet_count"],
             "verified_count": len(tweet_data["verified_tweets"]),
             "high_engagement_count": len(tweet_data["high_engagement_tweets"]),
-            "tweets_json": json.dumps(tweet_data["tweets"]),
+            "tweets": tweet_data["tweets"],
             "formatted_tweets": format_tweets_for_training(tweet_data)
-        })
-        
-        time.sleep(0.5) 
-    
-    results_df = pd.DataFrame(results)
-    
-    if output_file:
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        results_df.to_csv(output_file, index=False)
-        print(f"\nSaved to: {output_file}")
+        }
     
-    return results_df
+    usage_before = dict(USAGE)
+    sink = ParquetSink(output_file.with_suffix(".parquet"), TWEETS_SCHEMA) if output_file else None
+    start = time.monotonic()
+    try:
+        results = run_concurrent(markets_df.to_dict("records"), fetch_one, max_workers, "Twitter", sink)
+    finally:
+        if sink:
+            sink.close()
+    elapsed = time.monotonic() - start
+    
+    calls = USAGE["calls"] - usage_before["calls"]
+    tweets_billed = USAGE["tweets"] - usage_before["tweets"]
+    print(f"Twitter {CACHE.stats()} | throttled: {LIMITER.throttled}, final rate: {LIMITER.rate:.2f} req/s | "
+          f"{len(results) / max(elapsed, 1e-9):.1f} markets/s")
+    print(f"Cost check: estimate_cost({len(markets_df)}) = ${estimate_cost(len(markets_df)):.2f} | "
+          f"actual: {calls} API calls, {tweets_billed} tweets billed = ${actual_cost(tweets_billed):.2f} "
+          f"({tweets_billed / max(calls, 1):.1f} tweets/call)")
+    if sink:
+        print(f"\nSaved to: {sink.path}")
+    
+    return pd.DataFrame(results)
 
 
 if __name__ == "__main__":
@@ -375,7 +358,13 @@ if __name__ == "__main__":
     parser.add_argument("--estimate", type=int, help="Estimate cost for N markets")
     parser.add_argument("--question", type=str, help="Single question to fetch tweets for")
     parser.add_argument("--date", type=str, default="2025-08-15", help="Analysis date (YYYY-MM-DD)")
+    parser.add_argument("--markets", type=int, help="Batch mode: fetch for the N highest-volume markets in the dump")
+    parser.add_argument("--min-volume", type=float, default=10000, help="Batch mode: minimum market volume")
+    parser.add_argument("--end-after", type=str, help="Batch mode: markets ending on/after this date")
+    parser.add_argument("--end-before", type=str, help="Batch mode: markets ending on/before this date")
+    parser.add_argument("--offline", action="store_true", help="Only read the local response cache, never call the API")
     args = parser.parse_args()
+    CACHE.offline = args.offline
     
     if args.check:
         check_api_key()
@@ -384,8 +373,12 @@ if __name__ == "__main__":
         print(f"Estimated cost for {args.estimate} markets: ${cost:.2f}")
     elif args.test:
         test_twitter_api()
+    elif args.markets:
+        markets = markets_for_fetch(args.min_volume, args.end_after, args.end_before, limit=args.markets)
+        print(f"Fetching tweets for {len(markets)} markets...")
+        fetch_tweets_batch(markets, TWEETS_PARQUET)
     elif args.question:
-        if not check_api_key():
+        if not args.offline and not check_api_key():
             exit(1)
         print(f"Fetching tweets for: {args.question}")
         result = fetch_tweets_for_market(args.question, args.date)
@@ -399,3 +392,4 @@ if __name__ == "__main__":
         print("  python fetch_twitter_data.py --estimate 105  # Estimate cost")
         print("  python fetch_twitter_data.py --test      # Run test queries")
         print("  python fetch_twitter_data.py --question 'Will Bitcoin hit $125k?' --date 2025-08-15")
+        print("  python fetch_twitter_data.py --markets 100 --end-after 2025-01-01")
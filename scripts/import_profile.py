@@ -0,0 +1,83 @@
+"""
+Import-time profile for backend entry points (python -X importtime).
+
+Imports the module in a fresh interpreter from backend/ (the way uvicorn
+and the workers run it), then reports total import time, the slowest
+packages by cumulative time, and whether any of the heavy optional
+dependencies were pulled in at import time.
+
+Usage:
+    python scripts/import_profile.py [--module main] [--top 20] [--runs 5]
+    python scripts/import_profile.py --output scripts/import_profile.txt
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+# Only the code paths that use these should load them
+HEAVY_MODULES = ("torch", "unsloth", "transformers", "eth_account", "eth_keys", "supabase", "pandas", "pyarrow")
+
+
+def profile_once(module: str) -> Tuple[float, List[Tuple[str, float, int]]]:
+    """(total seconds, [(module, cumulative seconds, depth)]) for one cold import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(cumulative) / 1e6, depth))
+    total = next(seconds for name, seconds, depth in reversed(rows) if name == module and depth == 0)
+    return total, rows
+
+
+def report(module: str, top: int, runs: int) -> str:
+    totals, rows = [], []
+    for _ in range(runs):
+        total, rows = profile_once(module)
+        totals.append(total)
+    loaded = {name.split(".")[0] for name, _, _ in rows}
+    # Cumulative time of each top-level package (its first, outermost import)
+    by_package: Dict[str, float] = {}
+    for name, seconds, _ in rows:
+        root = name.split(".")[0]
+        # `site` is interpreter startup, not part of the import being profiled
+        if name == root and root not in (module, "site"):
+            by_package[root] = max(by_package.get(root, 0.0), seconds)
+
+    lines = [
+        f"import {module} (from backend/, {runs} cold runs)",
+        f"  median {statistics.median(totals):.3f}s  min {min(totals):.3f}s  max {max(totals):.3f}s",
+        "",
+        "slowest packages (cumulative, last run):",
+    ]
+    for name, seconds in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"  {seconds * 1000:8.1f} ms  {name}")
+    lines += ["", "heavy dependencies imported:"]
+    lines += [f"  {name}: {'YES' if name in loaded else 'no'}" for name in HEAVY_MODULES]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time profile of a backend module")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="also write the report here")
+    args = parser.parse_args()
+
+    text = report(args.module, args.top, args.runs)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n")
@@ -0,0 +1,104 @@
+"""
+Shared on-disk response cache for the data fetch scripts (GDELT, TwitterAPI.io).
+
+Responses are keyed on a normalized (endpoint, query, date range, params)
+tuple and stored zlib-compressed in a small SQLite file. Freshness rules:
+
+- Historical windows (ending more than `settle_days` ago) never expire;
+  upstream data for them doesn't change any more.
+- Recent windows expire after `recent_ttl` so new articles/tweets show up.
+- Empty or error responses are cached too, for `failure_ttl`, so a rerun
+  doesn't hit upstream again for them but a hiccup isn't remembered forever.
+
+In offline mode only the cache is read; misses return None and no request
+is made.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Case-folds and sorts OR'd terms so equivalent queries share a cache entry."""
+    terms = [t.strip().lower() for t in query.strip("() ").split(" OR ")]
+    return " OR ".join(sorted(set(t for t in terms if t)))
+
+
+class RequestCache:
+    def __init__(
+        self,
+        path: Path,
+        recent_ttl: timedelta = timedelta(hours=6),
+        settle_days: int = 2,
+        failure_ttl: timedelta = timedelta(hours=1),
+        offline: bool = False,
+    ):
+        self.path = Path(path)
+        self.recent_ttl = recent_ttl
+        self.failure_ttl = failure_ttl
+        self.settle_days = settle_days
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, endpoint TEXT, query TEXT, start_date TEXT, end_date TEXT, "
+                "fetched_at REAL, expires_at REAL, body BLOB)"
+            )
+        return self._conn
+
+    @staticmethod
+    def make_key(endpoint: str, query: str, start_date: str, end_date: str, params: Optional[Dict] = None) -> str:
+        payload = json.dumps(
+            [endpoint, normalize_query(query), start_date, end_date, params or {}], sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _expires_at(self, end_date: str) -> Optional[float]:
+        end_dt = datetime.strptime(end_date[:10], "%Y-%m-%d")
+        if end_dt < datetime.now() - timedelta(days=self.settle_days):
+            return None
+        return time.time() + self.recent_ttl.total_seconds()
+
+    def get(self, endpoint: str, query: str, start_date: str, end_date: str, params: Optional[Dict] = None) -> Optional[Any]:
+        key = self.make_key(endpoint, query, start_date, end_date, params)
+        with self._lock:
+            row = self.conn.execute("SELECT expires_at, body FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and (row[0] is None or row[0] > time.time()):
+                self.hits += 1
+                return json.loads(zlib.decompress(row[1]))
+            self.misses += 1
+        return None
+
+    def set(
+        self, endpoint: str, query: str, start_date: str, end_date: str, payload: Any, params: Optional[Dict] = None,
+        failed: bool = False,
+    ):
+        """Stores a response; failed=True (empty/error stand-in) expires after failure_ttl even for settled windows."""
+        key = self.make_key(endpoint, query, start_date, end_date, params)
+        body = zlib.compress(json.dumps(payload).encode(), level=6)
+        expires_at = time.time() + self.failure_ttl.total_seconds() if failed else self._expires_at(end_date)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, normalize_query(query), start_date, end_date, time.time(), expires_at, body),
+            )
+            self.conn.commit()
+
+    def stats(self) -> str:
+        return f"cache hits: {self.hits}, misses: {self.misses}" + (" (offline)" if self.offline else "")
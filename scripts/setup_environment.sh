@@ -64,7 +64,7 @@ pip install unsloth[cu121] || echo "⚠ Unsloth installation failed (optional, c
 echo ""
 
 echo "Installing data/API libraries..."
-pip install requests pandas numpy beautifulsoup4 lxml aiohttp
+pip install requests pandas numpy pyarrow beautifulsoup4 lxml aiohttp
 echo "✓ Data libraries installed"
 echo ""
 
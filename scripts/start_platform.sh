@@ -26,11 +26,22 @@ source venv/bin/activate
 # Install missing backend dependencies if any
 pip install fastapi uvicorn supabase python-dotenv pydantic pydantic-settings requests pandas -q
 
-# Start FastAPI on port 8000
-PYTHONPATH=. uvicorn backend.main:app --host 0.0.0.0 --port 8000 > backend.log 2>&1 &
+# Model server: the only process that loads the model (MODEL_BACKEND=fake runs without a GPU)
+python backend/model_server.py > model_server.log 2>&1 &
+MODEL_PID=$!
+echo "Model server PID: $MODEL_PID"
+
+# Start FastAPI on port 8000; the workers send inference to the model server
+export MODEL_SERVING=server
+PYTHONPATH=. uvicorn backend.main:app --host 0.0.0.0 --port 8000 --workers ${API_WORKERS:-4} > backend.log 2>&1 &
 BACKEND_PID=$!
 echo "Backend PID: $BACKEND_PID"
 
+# Scanner worker: scheduled market scans in their own process (single instance)
+python backend/scanner_worker.py > scanner.log 2>&1 &
+SCANNER_PID=$!
+echo "Scanner PID: $SCANNER_PID"
+
 # Give backend a moment to start
 sleep 2
 
@@ -55,8 +66,8 @@ echo -e "Dashboard: ${NC}http://localhost:3000"
 echo -e "API Docs:  ${NC}http://localhost:8000/docs"
 echo -e "Landing:   ${NC}http://localhost:3000"
 echo -e "${BLUE}==========================================${NC}"
-echo "Press Ctrl+C to stop both servers."
+echo "Press Ctrl+C to stop all servers."
 
-# Trap Ctrl+C to kill both sub-processes
-trap "kill $BACKEND_PID $FRONTEND_PID; echo -e '\nServers stopped.'; exit" INT
+# Trap Ctrl+C to kill the sub-processes (the scanner finishes its current market first)
+trap "kill $BACKEND_PID $FRONTEND_PID $SCANNER_PID $MODEL_PID; echo -e '\nServers stopped.'; exit" INT
 wait
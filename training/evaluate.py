@@ -11,10 +11,16 @@ Tests:
 
 import json
 import os
+import time
 import torch
+from pretokenize import format_prompt
+from length_batching import token_budget_batches, fixed_size_batches, padding_ratio
 
 os.chdir("/home/ahmadb10/polymarketbot")
 
+MAX_NEW_TOKENS = 1024
+MAX_BATCH_TOKENS = 16384  # (prompt + MAX_NEW_TOKENS) * batch_size budget; 0 = one prompt at a time (baseline)
+
 print("=" * 60)
 print("POLYEDGE MODEL EVALUATION")
 print("=" * 60)
@@ -51,43 +57,53 @@ results = {
 print("\n[3/3] Running evaluation...")
 print("-" * 60)
 
-for i, example in enumerate(test_examples):
-    results["total"] += 1
-    
-    # Official Llama 3.1 Instruct Format
-    prompt = f"""<|begin_of_text|><|start_header_id|>user<|end_header_id|>
-
-{example['input']}
+# Official Llama 3.1 Instruct Format (shared with finetune.py via pretokenize)
+prompts = [format_prompt(example["input"]) for example in test_examples]
+prompt_lengths = [len(ids) for ids in tokenizer(prompts, add_special_tokens=False)["input_ids"]]
 
-RESPONSE FORMAT (JSON ONLY):
-- "market_probability", "fair_probability", "edge_percentage"
-- "action", "confidence", "edge_quality", "signal_agreement"
-- "reasoning", "key_signals", "ignored_signals", "risk_factors"
-<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+# Length-bucketed batches sized by a token budget instead of a fixed count
+budget_lengths = [length + MAX_NEW_TOKENS for length in prompt_lengths]
+if MAX_BATCH_TOKENS > 0:
+    batches = token_budget_batches(budget_lengths, MAX_BATCH_TOKENS, shuffle=False)
+else:
+    batches = fixed_size_batches(len(test_examples), 1)
+mean_batch = len(test_examples) / max(len(batches), 1)
+naive = fixed_size_batches(len(test_examples), max(1, round(mean_batch)))
+print(f"  Batches: {len(batches)} ({mean_batch:.1f} prompts/batch)")
+print(f"  Prompt padding ratio: fixed-size {padding_ratio(prompt_lengths, naive):.1%} -> bucketed {padding_ratio(prompt_lengths, batches):.1%}")
+
+tokenizer.padding_side = "left"
+if tokenizer.pad_token_id is None:
+    tokenizer.pad_token = tokenizer.eos_token
+
+responses = {}
+generated_tokens = 0
+generation_start = time.perf_counter()
+for batch in batches:
+    inputs = tokenizer(
+        [prompts[i] for i in batch], return_tensors="pt", padding=True, add_special_tokens=False
+    ).to(model.device)
 
-"""
-    
-    # Generate prediction
-    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-    
     with torch.no_grad():
         outputs = model.generate(
             **inputs,
-            max_new_tokens=1024,
+            max_new_tokens=MAX_NEW_TOKENS,
             temperature=0.1,  # Low temp for consistent outputs
             do_sample=True,
-            pad_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.pad_token_id,
         )
-    
-    # Decode and extract the model's response
-    full_output = tokenizer.decode(outputs[0], skip_special_tokens=False)
-    
+
+    new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+    generated_tokens += int((new_tokens != tokenizer.pad_token_id).sum())
+    for row, example_idx in enumerate(batch):
+        responses[example_idx] = tokenizer.decode(new_tokens[row], skip_special_tokens=False)
+generation_time = time.perf_counter() - generation_start
+
+for i, example in enumerate(test_examples):
+    results["total"] += 1
+
     # Extract assistant response
-    try:
-        model_response = full_output.split("<|start_header_id|>assistant<|end_header_id|>\n\n")[1]
-        model_response = model_response.split("<|eot_id|>")[0].strip()
-    except:
-        model_response = ""
+    model_response = responses[i].split("<|eot_id|>")[0].strip()
     
     # Robust cleanup for common LLM JSON errors
     if model_response:
@@ -127,7 +143,8 @@ RESPONSE FORMAT (JSON ONLY):
         if status == "✗":
             print("\n" + "!" * 40)
             print("FAILED PREDICTION DEBUG:")
-            print(f"Question: {example['input'].split('\n')[1]}")
+            question_line = example['input'].split('\n')[1]
+            print(f"Question: {question_line}")
             print(f"Model Reasoning: {pred.get('reasoning')}")
             print(f"Ground Truth Reasoning: {true.get('reasoning')}")
             print("!" * 40 + "\n")
@@ -157,6 +174,7 @@ Edge Direction:         {direction_rate:.1f}%       > 65%
 High Conf Accuracy:     {high_conf_rate:.1f}%       > 80%
 
 Total test examples:    {results['total']}
+Generation time:        {generation_time:.1f}s ({generated_tokens / max(generation_time, 1e-9):.1f} tokens/sec, {results['total'] / max(generation_time, 1e-9):.2f} examples/sec)
 Valid JSON outputs:     {results['valid_json']}
 Correct actions:        {results['action_correct']}
 High confidence calls:  {results['high_conf_total']}
@@ -7,14 +7,24 @@ Output: JSON with edge analysis (action, confidence, reasoning, etc.)
 """
 
 from unsloth import FastLanguageModel
-from trl import SFTTrainer
-from transformers import TrainingArguments
-from datasets import load_dataset
+from transformers import Trainer, TrainingArguments
+import json
 import os
 import torch
+from pretokenize import load_or_build_shard, PackedDataset, PackedCollator
+from length_batching import (
+    TokenBudgetBatchSampler, bucketed_trainer_class, fixed_size_batches, padding_ratio, throughput_callback,
+)
 
 os.chdir("/home/ahmadb10/polymarketbot")
 
+MAX_SEQ_LENGTH = 2048
+BATCHING = os.getenv("BATCHING", "packed")  # "packed" | "bucketed" (length-bucketed, token budget) | "single"
+MAX_BATCH_TOKENS = 8192  # Padded tokens per batch in "bucketed" mode
+EXAMPLES_PER_STEP = 16  # Effective batch in examples, whatever the batching mode
+# Real tokens/s per batching mode, appended per run for before/after comparison
+THROUGHPUT_LOG = "checkpoints/throughput.jsonl"
+
 print("=" * 60)
 print("POLYEDGE FINE-TUNING (16-BIT MODE)")
 print("=" * 60)
@@ -22,7 +32,7 @@ print("=" * 60)
 print("\n[1/5] Loading Llama 3.1 8B model (4-bit QLoRA) - OPTIMIZED...")
 model, tokenizer = FastLanguageModel.from_pretrained(
     "unsloth/meta-llama-3.1-8b-instruct-bnb-4bit",
-    max_seq_length=2048,  # LOWERED for stability on 12GB Card
+    max_seq_length=MAX_SEQ_LENGTH,  # LOWERED for stability on 12GB Card
     load_in_4bit=True,
     dtype=None,
 )
@@ -40,51 +50,54 @@ model = FastLanguageModel.get_peft_model(
     use_gradient_checkpointing="unsloth", 
 )
 
-print("\n[3/5] Loading GOD-TIER training data...")
-dataset = load_dataset("json", data_files={
-    "train": "data/training/train.jsonl",
-    "validation": "data/training/val.jsonl"
-})
-print(f"  Train: {len(dataset['train'])} examples")
-print(f"  Validation: {len(dataset['validation'])} examples")
-
-def format_for_training(example):
-    """
-    Official Llama 3.1 Instruct Format.
-    """
-    text = f"""<|begin_of_text|><|start_header_id|>user<|end_header_id|>
-
-{example['input']}
-
-RESPONSE FORMAT (JSON ONLY):
-- "market_probability", "fair_probability", "edge_percentage"
-- "action", "confidence", "edge_quality", "signal_agreement"
-- "reasoning", "key_signals", "ignored_signals", "risk_factors"
-<|eot_id|><|start_header_id|>assistant<|end_header_id|>
-
-{example['output']}<|eot_id|>"""
-    return {"text": text}
-
-print("\n[4/5] Formatting data for Gemma...")
-train_dataset = dataset["train"].map(format_for_training)
-val_dataset = dataset["validation"].map(format_for_training)
+print("\n[3/5] Loading GOD-TIER training data (pre-tokenized shards)...")
+# Shards are cached under data/training/cache/, keyed by tokenizer + template hash.
+# Loss is masked to the assistant JSON only.
+train_shard = load_or_build_shard("data/training/train.jsonl", tokenizer, MAX_SEQ_LENGTH)
+val_shard = load_or_build_shard("data/training/val.jsonl", tokenizer, MAX_SEQ_LENGTH)
+print(f"  Train: {len(train_shard)} examples ({train_shard.meta['tokens']:,} tokens)")
+print(f"  Validation: {len(val_shard)} examples ({val_shard.meta['tokens']:,} tokens)")
+
+print(f"\n[4/5] Batching sequences ({BATCHING})...")
+trainer_cls = Trainer
+if BATCHING == "packed":
+    train_dataset = PackedDataset(train_shard, MAX_SEQ_LENGTH)
+    val_dataset = PackedDataset(val_shard, MAX_SEQ_LENGTH)
+    examples_per_batch = train_dataset.examples_per_pack
+    print(f"  Train: {len(train_dataset)} packed rows ({examples_per_batch:.1f} examples/row)")
+elif BATCHING == "bucketed":
+    train_dataset, val_dataset = train_shard, val_shard
+    sampler = TokenBudgetBatchSampler(train_shard.lengths, MAX_BATCH_TOKENS)
+    examples_per_batch = sampler.mean_batch_size
+    naive = fixed_size_batches(len(train_shard), max(1, round(examples_per_batch)))
+    print(f"  Train: {len(sampler)} batches under {MAX_BATCH_TOKENS} tokens ({examples_per_batch:.1f} examples/batch)")
+    print(f"  Padding ratio: fixed-size {padding_ratio(train_shard.lengths, naive):.1%} -> bucketed {sampler.padding_ratio:.1%}")
+    trainer_cls = bucketed_trainer_class(Trainer, MAX_BATCH_TOKENS)
+else:
+    train_dataset, val_dataset = train_shard, val_shard
+    examples_per_batch = 1.0
+gradient_accumulation_steps = max(1, round(EXAMPLES_PER_STEP / examples_per_batch))
+
 print("\n[5/5] Starting training...")
 print("  - 3 epochs (forced generalization)")
-print("  - Batch size: 2 (x4 accumulation = effective 8)")
+print(f"  - Batch: ~{examples_per_batch:.1f} examples (x{gradient_accumulation_steps} accumulation = ~{EXAMPLES_PER_STEP} examples)")
 print("  - Learning rate: 2e-4")
 print("  - Estimated time: 1-2 hours on RTX 3060")
 
-trainer = SFTTrainer(
+throughput = throughput_callback(train_shard.meta["tokens"], BATCHING)
+trainer = trainer_cls(
     model=model,
-    tokenizer=tokenizer,
+    callbacks=[throughput],
     train_dataset=train_dataset,
     eval_dataset=val_dataset,
-    dataset_text_field="text",
-    max_seq_length=2048,
+    data_collator=PackedCollator(
+        tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id,
+        mask_dtype=torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16,
+    ),
     args=TrainingArguments(
         output_dir="./checkpoints",
         per_device_train_batch_size=1, 
-        gradient_accumulation_steps=16, # Increased for stability
+        gradient_accumulation_steps=gradient_accumulation_steps,
         warmup_steps=5,
         max_steps=-1,              
         num_train_epochs=3,        # REDUCED: Force model to learn rules, not memorization
@@ -99,11 +112,24 @@ trainer = SFTTrainer(
         weight_decay=0.1,          # INCREASED: Strong regularization for generalization
         lr_scheduler_type="cosine",
         report_to="none",  
+        remove_unused_columns=False,  # Keep position_ids for packed rows
     ),
 )
 
 trainer.train()
 
+print(f"\nThroughput ({BATCHING}): {throughput.mean_rate:,.0f} real tokens/s")
+os.makedirs(os.path.dirname(THROUGHPUT_LOG), exist_ok=True)
+previous = {}
+if os.path.exists(THROUGHPUT_LOG):
+    with open(THROUGHPUT_LOG) as f:
+        previous = {r["batching"]: r["tokens_per_s"] for r in map(json.loads, f) if r["batching"] != BATCHING}
+for mode, rate in previous.items():
+    if rate:
+        print(f"  vs last {mode} run: {rate:,.0f} tokens/s ({throughput.mean_rate / rate:.2f}x)")
+with open(THROUGHPUT_LOG, "a") as f:
+    f.write(json.dumps({"batching": BATCHING, "tokens_per_s": round(throughput.mean_rate, 1)}) + "\n")
+
 print("\n" + "=" * 60)
 print("SAVING MODEL")
 print("=" * 60)
@@ -115,6 +141,12 @@ print("\nSaving merged model (LoRA + base)...")
 model.save_pretrained_merged("./polyedge-model-merged", tokenizer, save_method="merged_16bit")
 print(f"Merged model saved to: ./polyedge-model-merged")
 
+# Quantized export for CPU serving (MODEL_BACKEND=llama_cpp in the backend)
+GGUF_QUANT = os.getenv("GGUF_QUANT", "q4_k_m")
+print(f"\nExporting GGUF ({GGUF_QUANT}) for llama.cpp...")
+model.save_pretrained_gguf("./polyedge-model-gguf", tokenizer, quantization_method=GGUF_QUANT)
+print(f"GGUF export saved to: ./polyedge-model-gguf")
+
 print("\n" + "=" * 60)
 print("TRAINING COMPLETE!")
 print("Next: python training/evaluate.py")
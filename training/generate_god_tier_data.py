@@ -1,13 +1,17 @@
 import json
 import os
+import sys
 import time
 import random
-import pandas as pd
+from pathlib import Path
 from typing import List, Dict
 from anthropic import Anthropic
 from dotenv import load_dotenv
 from tqdm import tqdm
 
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+from datastore import resolution_map as load_resolution_map
+
 load_dotenv()
 
 # Configuration
@@ -83,13 +87,7 @@ def main():
     
     # Load Ground Truth for Hindsight
     print("📊 Loading PolyMarket Ground Truth for Hindsight...")
-    markets_df = pd.read_csv("data/raw/polymarket_markets.csv", low_memory=False)
-    resolution_map = {}
-    for _, row in markets_df.iterrows():
-        q = str(row['question'])
-        prices = str(row['outcomePrices'])
-        if q and prices != 'nan':
-            resolution_map[q] = prices
+    resolution_map = load_resolution_map(Path("data/raw/polymarket_markets.csv"))
 
     for file in INPUT_FILES:
         if os.path.exists(file):
@@ -41,7 +41,8 @@ RESPONSE FORMAT (JSON ONLY):
 """
 
 print("\n[2/2] Generating prediction...")
-inputs = tokenizer(prompt, return_tensors="pt").to("cuda")
+# The prompt already starts with <|begin_of_text|>; don't add a second BOS
+inputs = tokenizer(prompt, return_tensors="pt", add_special_tokens=False).to("cuda")
 
 with torch.no_grad():
     outputs = model.generate(
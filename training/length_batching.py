@@ -0,0 +1,198 @@
+"""
+Length-bucketed dynamic batching for PolyEdge training and evaluation.
+
+Prompt lengths vary a lot (empty tier sections vs. dozens of tweets), so
+fixed-count batches waste most of their compute on padding. The sampler
+below groups examples of similar token length and sizes each batch by a
+token budget (batch_size * longest_sequence <= max_tokens) instead of a
+fixed example count.
+"""
+
+import random
+import time
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+from torch.utils.data import DataLoader, Sampler
+
+
+def token_budget_batches(
+    lengths: Sequence[int],
+    max_tokens: int,
+    bucket_size: int = 512,
+    max_batch_size: Optional[int] = None,
+    shuffle: bool = True,
+    seed: int = 42,
+) -> List[List[int]]:
+    """
+    Splits example indices into batches whose padded size stays under max_tokens.
+
+    Indices are shuffled, cut into buckets of bucket_size, and sorted by length
+    inside each bucket, so batches hold similar lengths while keeping some
+    randomness across the dataset. With shuffle=False examples are simply
+    sorted by length (best for evaluation).
+    """
+    lengths = np.asarray(lengths)
+    indices = np.arange(len(lengths))
+    if shuffle:
+        np.random.default_rng(seed).shuffle(indices)
+    else:
+        bucket_size = len(indices) or 1
+
+    batches: List[List[int]] = []
+    for start in range(0, len(indices), bucket_size):
+        bucket = indices[start:start + bucket_size]
+        bucket = bucket[np.argsort(lengths[bucket], kind="stable")]
+
+        batch: List[int] = []
+        longest = 0
+        for idx in bucket:
+            length = int(lengths[idx])
+            new_longest = max(longest, length)
+            full = max_batch_size is not None and len(batch) >= max_batch_size
+            if batch and (new_longest * (len(batch) + 1) > max_tokens or full):
+                batches.append(batch)
+                batch, new_longest = [], length
+            batch.append(int(idx))
+            longest = new_longest
+        if batch:
+            batches.append(batch)
+    return batches
+
+
+def fixed_size_batches(num_examples: int, batch_size: int) -> List[List[int]]:
+    """Plain fixed-count batches in dataset order, for before/after comparisons."""
+    return [list(range(i, min(i + batch_size, num_examples))) for i in range(0, num_examples, batch_size)]
+
+
+def padding_ratio(lengths: Sequence[int], batches: List[List[int]]) -> float:
+    """Fraction of tokens in the padded batches that are padding."""
+    lengths = np.asarray(lengths)
+    real = padded = 0
+    for batch in batches:
+        batch_lengths = lengths[batch]
+        real += int(batch_lengths.sum())
+        padded += int(batch_lengths.max()) * len(batch)
+    return 1 - real / padded if padded else 0.0
+
+
+class TokenBudgetBatchSampler(Sampler[List[int]]):
+    """
+    Batch sampler over token_budget_batches. Batch composition is fixed once so
+    len() is stable for the Trainer's step math; only batch order is reshuffled
+    every epoch.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        max_tokens: int,
+        bucket_size: int = 512,
+        max_batch_size: Optional[int] = None,
+        shuffle: bool = True,
+        seed: int = 42,
+    ):
+        self.batches = token_budget_batches(lengths, max_tokens, bucket_size, max_batch_size, shuffle, seed)
+        self.lengths = lengths
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        return len(self.batches)
+
+    def __iter__(self) -> Iterator[List[int]]:
+        order = list(range(len(self.batches)))
+        if self.shuffle:
+            random.Random(self.seed + self.epoch).shuffle(order)
+        for i in order:
+            yield self.batches[i]
+
+    @property
+    def mean_batch_size(self) -> float:
+        return sum(len(b) for b in self.batches) / max(len(self.batches), 1)
+
+    @property
+    def padding_ratio(self) -> float:
+        return padding_ratio(self.lengths, self.batches)
+
+
+def bucketed_trainer_class(trainer_cls, max_tokens: int, bucket_size: int = 512, seed: int = 42):
+    """
+    Returns a subclass of trainer_cls (transformers.Trainer or a subclass)
+    whose train/eval dataloaders use TokenBudgetBatchSampler. Datasets must
+    expose a `lengths` array, as TokenizedShard does.
+    """
+
+    from transformers import TrainerCallback
+
+    class SamplerEpochCallback(TrainerCallback):
+        # The prepared DataLoader may wrap the batch sampler, so the trainer keeps a direct handle
+        def __init__(self, trainer):
+            self.trainer = trainer
+
+        def on_epoch_begin(self, args, state, control, **kwargs):
+            if self.trainer.train_sampler is not None:
+                self.trainer.train_sampler.set_epoch(int(state.epoch or 0))
+
+    class BucketedTrainer(trainer_cls):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.train_sampler: Optional[TokenBudgetBatchSampler] = None
+            self.add_callback(SamplerEpochCallback(self))
+
+        def _bucketed_dataloader(self, dataset, shuffle: bool) -> DataLoader:
+            sampler = TokenBudgetBatchSampler(dataset.lengths, max_tokens, bucket_size, shuffle=shuffle, seed=seed)
+            if shuffle:
+                self.train_sampler = sampler
+            loader = DataLoader(
+                dataset,
+                batch_sampler=sampler,
+                collate_fn=self.data_collator,
+                num_workers=self.args.dataloader_num_workers,
+                pin_memory=self.args.dataloader_pin_memory,
+            )
+            return self.accelerator.prepare(loader)
+
+        def get_train_dataloader(self) -> DataLoader:
+            return self._bucketed_dataloader(self.train_dataset, shuffle=True)
+
+        def get_eval_dataloader(self, eval_dataset=None) -> DataLoader:
+            if isinstance(eval_dataset, str):
+                eval_dataset = self.eval_dataset[eval_dataset]
+            return self._bucketed_dataloader(eval_dataset if eval_dataset is not None else self.eval_dataset, shuffle=False)
+
+    return BucketedTrainer
+
+
+def throughput_callback(tokens_per_epoch: int, label: str):
+    """
+    TrainerCallback printing real (non-padding) training tokens/s per epoch,
+    so runs with different batching modes can be compared directly. Epoch
+    time includes the periodic evaluations.
+    """
+    from transformers import TrainerCallback
+
+    class ThroughputCallback(TrainerCallback):
+        def __init__(self):
+            self.epoch_start = None
+            self.rates: List[float] = []
+
+        def on_epoch_begin(self, args, state, control, **kwargs):
+            self.epoch_start = time.perf_counter()
+
+        def on_epoch_end(self, args, state, control, **kwargs):
+            if self.epoch_start is None:
+                return
+            elapsed = time.perf_counter() - self.epoch_start
+            self.rates.append(tokens_per_epoch / elapsed if elapsed else 0.0)
+            print(f"  [{label}] epoch {len(self.rates)}: {self.rates[-1]:,.0f} tok/s")
+
+        @property
+        def mean_rate(self) -> float:
+            return sum(self.rates) / len(self.rates) if self.rates else 0.0
+
+    return ThroughputCallback()
@@ -0,0 +1,361 @@
+"""
+Pre-tokenization stage for PolyEdge fine-tuning.
+
+Formats and tokenizes a JSONL split once, then stores token IDs, loss masks
+and per-example offsets as memory-mapped NumPy shards under
+data/training/cache/. Shards are keyed by tokenizer, prompt template, data
+file contents and max_seq_length, so reruns of finetune.py load them in
+milliseconds instead of re-running datasets.map.
+
+Loss is masked to the assistant JSON (plus the closing <|eot_id|>). Examples
+can be packed into rows of up to max_seq_length tokens; PackedCollator builds
+a block-diagonal causal mask and resets position_ids at every example
+boundary so packed examples never attend to each other.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+# Official Llama 3.1 Instruct format (must match ModelService._generate, which also tokenizes without adding a BOS)
+PROMPT_TEMPLATE = """<|begin_of_text|><|start_header_id|>user<|end_header_id|>
+
+{input}
+
+RESPONSE FORMAT (JSON ONLY):
+- "market_probability", "fair_probability", "edge_percentage"
+- "action", "confidence", "edge_quality", "signal_agreement"
+- "reasoning", "key_signals", "ignored_signals", "risk_factors"
+<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+
+"""
+RESPONSE_TEMPLATE = "{output}<|eot_id|>"
+
+CACHE_DIR = Path("data/training/cache")
+SHARD_VERSION = 1
+IGNORE_INDEX = -100
+
+
+def format_prompt(input_text: str) -> str:
+    return PROMPT_TEMPLATE.format(input=input_text)
+
+
+def format_response(output_text: str) -> str:
+    return RESPONSE_TEMPLATE.format(output=output_text)
+
+
+def template_hash() -> str:
+    """Hash of the prompt/response templates; any edit invalidates old shards."""
+    payload = f"{SHARD_VERSION}\n{PROMPT_TEMPLATE}\n{RESPONSE_TEMPLATE}"
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Identifies a tokenizer by name, vocab size and how it encodes the template."""
+    probe = tokenizer(format_prompt("probe") + format_response("{}"), add_special_tokens=False)["input_ids"]
+    payload = f"{getattr(tokenizer, 'name_or_path', '')}|{len(tokenizer)}|{probe}"
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def shard_key(data_file: Path, tokenizer, max_seq_length: int) -> str:
+    parts = [tokenizer_fingerprint(tokenizer), template_hash(), file_digest(data_file), str(max_seq_length)]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+
+def _tokenize_examples(examples: List[Dict], tokenizer, max_seq_length: int):
+    prompts = [format_prompt(ex["input"]) for ex in examples]
+    responses = [format_response(ex["output"]) for ex in examples]
+    # The template already carries <|begin_of_text|>, so never let the tokenizer add a second BOS
+    prompt_ids = tokenizer(prompts, add_special_tokens=False)["input_ids"]
+    response_ids = tokenizer(responses, add_special_tokens=False)["input_ids"]
+
+    for p_ids, r_ids in zip(prompt_ids, response_ids):
+        ids = p_ids + r_ids
+        mask = [0] * len(p_ids) + [1] * len(r_ids)
+        truncated = len(ids) > max_seq_length
+        yield ids[:max_seq_length], mask[:max_seq_length], truncated
+
+
+def build_shard(data_file: Path, tokenizer, shard_dir: Path, max_seq_length: int, chunk_size: int = 256) -> Path:
+    """Tokenizes a JSONL split into input_ids.npy / loss_mask.npy / offsets.npy."""
+    with open(data_file) as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+
+    all_ids: List[int] = []
+    all_mask: List[int] = []
+    offsets = [0]
+    truncated = 0
+    for start in range(0, len(examples), chunk_size):
+        for ids, mask, was_truncated in _tokenize_examples(examples[start:start + chunk_size], tokenizer, max_seq_length):
+            all_ids.extend(ids)
+            all_mask.extend(mask)
+            offsets.append(len(all_ids))
+            truncated += was_truncated
+
+    # Write into a temp dir and rename so a crashed build never looks like a valid shard
+    tmp_dir = shard_dir.with_name(shard_dir.name + f".tmp{os.getpid()}")
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    np.save(tmp_dir / "input_ids.npy", np.asarray(all_ids, dtype=np.int32))
+    np.save(tmp_dir / "loss_mask.npy", np.asarray(all_mask, dtype=np.uint8))
+    np.save(tmp_dir / "offsets.npy", np.asarray(offsets, dtype=np.int64))
+    meta = {
+        "source": str(data_file),
+        "examples": len(examples),
+        "tokens": len(all_ids),
+        "truncated": truncated,
+        "max_seq_length": max_seq_length,
+        "tokenizer": getattr(tokenizer, "name_or_path", ""),
+        "template_hash": template_hash(),
+        "created_at": time.time(),
+    }
+    with open(tmp_dir / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    # A leftover shard dir without meta.json (crashed copy, manual edits) is replaced
+    if shard_dir.exists():
+        shutil.rmtree(shard_dir)
+    try:
+        os.replace(tmp_dir, shard_dir)
+    except OSError:
+        # Another process finished the same shard first; keep theirs
+        if not (shard_dir / "meta.json").exists():
+            raise
+        shutil.rmtree(tmp_dir)
+    return shard_dir
+
+
+class TokenizedShard(Dataset):
+    """Memory-mapped view over a pre-tokenized split. One item per example, unpadded."""
+
+    def __init__(self, shard_dir: Path):
+        self.shard_dir = Path(shard_dir)
+        self.input_ids = np.load(self.shard_dir / "input_ids.npy", mmap_mode="r")
+        self.loss_mask = np.load(self.shard_dir / "loss_mask.npy", mmap_mode="r")
+        self.offsets = np.load(self.shard_dir / "offsets.npy", mmap_mode="r")
+        with open(self.shard_dir / "meta.json") as f:
+            self.meta = json.load(f)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def example(self, idx: int):
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        return self.input_ids[start:end], self.loss_mask[start:end]
+
+    def __getitem__(self, idx: int) -> Dict[str, List[int]]:
+        ids, mask = self.example(idx)
+        labels = np.where(mask == 1, ids, IGNORE_INDEX)
+        return {
+            "input_ids": ids.tolist(),
+            "labels": labels.tolist(),
+            "position_ids": list(range(len(ids))),
+        }
+
+
+def load_or_build_shard(data_file, tokenizer, max_seq_length: int, cache_dir: Path = CACHE_DIR) -> TokenizedShard:
+    """Returns the cached shard for this (tokenizer, template, data, max_seq_length), building it on a miss."""
+    data_file = Path(data_file)
+    shard_dir = Path(cache_dir) / f"{data_file.stem}-{shard_key(data_file, tokenizer, max_seq_length)}"
+    if (shard_dir / "meta.json").exists():
+        print(f"  Cache hit: {shard_dir}")
+    else:
+        print(f"  Tokenizing {data_file} -> {shard_dir}")
+        build_shard(data_file, tokenizer, shard_dir, max_seq_length)
+    return TokenizedShard(shard_dir)
+
+
+def pack_examples(lengths: Sequence[int], max_seq_length: int) -> List[List[int]]:
+    """First-fit-decreasing bin packing of example indices into rows of <= max_seq_length tokens."""
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    bins: List[List[int]] = []
+    remaining: List[int] = []
+    for idx in order:
+        length = int(lengths[idx])
+        for b, space in enumerate(remaining):
+            if length <= space:
+                bins[b].append(int(idx))
+                remaining[b] -= length
+                break
+        else:
+            bins.append([int(idx)])
+            remaining.append(max_seq_length - length)
+    return bins
+
+
+class PackedDataset(Dataset):
+    """Packs several tokenized examples into each row; position_ids restart at every boundary."""
+
+    def __init__(self, shard: TokenizedShard, max_seq_length: int):
+        self.shard = shard
+        self.packs = pack_examples(shard.lengths, max_seq_length)
+
+    def __len__(self) -> int:
+        return len(self.packs)
+
+    @property
+    def examples_per_pack(self) -> float:
+        return len(self.shard) / max(len(self.packs), 1)
+
+    def __getitem__(self, idx: int) -> Dict[str, List[int]]:
+        input_ids: List[int] = []
+        labels: List[int] = []
+        position_ids: List[int] = []
+        for example_idx in self.packs[idx]:
+            item = self.shard[example_idx]
+            input_ids.extend(item["input_ids"])
+            labels.extend(item["labels"])
+            position_ids.extend(item["position_ids"])
+        return {"input_ids": input_ids, "labels": labels, "position_ids": position_ids}
+
+
+class PackedCollator:
+    """
+    Right-pads a batch and builds a 4D additive attention mask that is causal
+    within each packed example and blocks attention across examples and padding.
+    Works for packed and unpacked rows alike (an unpacked row is one segment).
+    """
+
+    def __init__(self, pad_token_id: int, mask_dtype: torch.dtype = torch.float32):
+        self.pad_token_id = pad_token_id
+        self.mask_dtype = mask_dtype
+
+    def __call__(self, features: List[Dict[str, List[int]]]) -> Dict[str, torch.Tensor]:
+        batch_size = len(features)
+        max_len = max(len(f["input_ids"]) for f in features)
+
+        input_ids = torch.full((batch_size, max_len), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((batch_size, max_len), IGNORE_INDEX, dtype=torch.long)
+        position_ids = torch.zeros((batch_size, max_len), dtype=torch.long)
+        segments = torch.full((batch_size, max_len), -1, dtype=torch.long)
+
+        for i, f in enumerate(features):
+            n = len(f["input_ids"])
+            input_ids[i, :n] = torch.tensor(f["input_ids"])
+            labels[i, :n] = torch.tensor(f["labels"])
+            pos = torch.tensor(f["position_ids"])
+            position_ids[i, :n] = pos
+            segments[i, :n] = torch.cumsum((pos == 0).long(), dim=0) - 1
+
+        causal = torch.tril(torch.ones(max_len, max_len, dtype=torch.bool))
+        same_segment = (segments[:, :, None] == segments[:, None, :]) & (segments[:, :, None] >= 0)
+        allowed = same_segment & causal
+        # Padding rows attend to themselves so softmax never sees an all-masked row
+        allowed |= torch.eye(max_len, dtype=torch.bool)
+
+        attention_mask = torch.zeros((batch_size, 1, max_len, max_len), dtype=self.mask_dtype)
+        attention_mask.masked_fill_(~allowed[:, None], torch.finfo(self.mask_dtype).min)
+
+        return {
+            "input_ids": input_ids,
+            "labels": labels,
+            "position_ids": position_ids,
+            "attention_mask": attention_mask,
+        }
+
+
+def benchmark(tokenizer_name: str, data_file: str, max_seq_length: int = 2048, steps: int = 10):
+    """
+    Compares the old path (format + tokenize every run, batch size 1) against
+    cached shards with packing, on a tiny randomly initialised Llama on CPU.
+    Reports startup time and real (non-padding) tokens/sec per training step.
+    """
+    from transformers import AutoTokenizer, LlamaConfig, LlamaForCausalLM
+
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    if tokenizer.pad_token_id is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    config = LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+        max_position_embeddings=max_seq_length,
+    )
+    torch.manual_seed(0)
+    model = LlamaForCausalLM(config)
+    model.config._attn_implementation = "sdpa"
+    optimizer = torch.optim.SGD(model.parameters(), lr=1e-3)
+    collator = PackedCollator(tokenizer.pad_token_id)
+
+    def run_steps(rows) -> float:
+        tokens, elapsed = 0, 0.0
+        for row in rows:
+            batch = collator([row])
+            start = time.perf_counter()
+            loss = model(**batch).loss
+            loss.backward()
+            optimizer.step()
+            optimizer.zero_grad()
+            elapsed += time.perf_counter() - start
+            tokens += batch["input_ids"].numel()
+        return tokens / elapsed if elapsed else 0.0
+
+    start = time.perf_counter()
+    with open(data_file) as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+    baseline_rows = [
+        {"input_ids": ids, "labels": [t if m else IGNORE_INDEX for t, m in zip(ids, mask)], "position_ids": list(range(len(ids)))}
+        for ids, mask, _ in _tokenize_examples(examples, tokenizer, max_seq_length)
+    ]
+    baseline_startup = time.perf_counter() - start
+
+    cache_dir = Path(data_file).parent / "cache"
+    load_or_build_shard(data_file, tokenizer, max_seq_length, cache_dir)
+    start = time.perf_counter()
+    shard = load_or_build_shard(data_file, tokenizer, max_seq_length, cache_dir)
+    packed = PackedDataset(shard, max_seq_length)
+    cached_startup = time.perf_counter() - start
+
+    # Train both paths on exactly the same examples: the first `steps` packs
+    pack_ids = list(range(min(steps, len(packed))))
+    packed_tps = run_steps([packed[i] for i in pack_ids])
+    baseline_tps = run_steps([baseline_rows[j] for i in pack_ids for j in packed.packs[i]])
+
+    print(f"Examples: {len(shard)} | Packs: {len(packed)} ({packed.examples_per_pack:.1f} examples/pack)")
+    print(f"Startup   : retokenize {baseline_startup * 1000:.0f} ms -> cached shard {cached_startup * 1000:.0f} ms")
+    print(f"Throughput: batch=1 {baseline_tps:,.0f} tok/s -> packed {packed_tps:,.0f} tok/s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-tokenize PolyEdge training data into cached shards")
+    parser.add_argument("--tokenizer", type=str, default="unsloth/meta-llama-3.1-8b-instruct-bnb-4bit")
+    parser.add_argument("--max-seq-length", type=int, default=2048)
+    parser.add_argument("--files", nargs="+", default=["data/training/train.jsonl", "data/training/val.jsonl"])
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark against per-run tokenization on a tiny CPU model")
+    parser.add_argument("--steps", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.tokenizer, args.files[0], args.max_seq_length, args.steps)
+    else:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+        for data_file in args.files:
+            shard = load_or_build_shard(data_file, tokenizer, args.max_seq_length)
+            print(f"  {data_file}: {shard.meta['examples']} examples, {shard.meta['tokens']:,} tokens, "
+                  f"{shard.meta['truncated']} truncated")